@@ -0,0 +1,117 @@
+"""
+Before/after numbers for template boilerplate removal (stage 2) and
+leaf-level extraction (stage 1): total characters, chunk count and the time
+to embed the chunks.
+
+  crawl    data/iti_full_website_data.parquet cleaned as before vs with
+           boilerplate.BoilerplateFilter applied first
+  fixture  a generated site with a shared header/footer/sidebar and nested
+           divs, extracted with the old per-tag get_text() vs the leaf-level
+           crawl_engine.extract_page (+ boilerplate removal)
+
+Embedding time needs sentence-transformers (skipped otherwise).
+
+Run: python benchmarks/boilerplate_eval.py
+     python benchmarks/boilerplate_eval.py --fixture-pages 200 --no-embed
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+from bs4 import BeautifulSoup
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "scraper"))
+from boilerplate import BoilerplateFilter  # noqa: E402
+from crawl_engine import HTML_PARSER, TEXT_TAGS, extract_page  # noqa: E402
+from text_cleaner import clean_many  # noqa: E402
+
+# same settings as 03_chuncker.py
+SPLITTER = RecursiveCharacterTextSplitter(separators=["\n\n", "\n", ". ", " ", ""], chunk_size=600,
+                                          chunk_overlap=50, length_function=len)
+
+
+def legacy_extract_text(html: str) -> str:
+    """Stage 1 text extraction before leaf-level blocks: every tag's full text, nested tags repeat it."""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    return " ".join(t for t in (tag.get_text(strip=True) for tag in soup.find_all(TEXT_TAGS)) if t)
+
+
+def fixture_pages(n: int) -> list:
+    header = ("<header><div><ul>" + "".join(f"<li><a href='/{w.lower()}'>{w}</a></li>" for w in
+              ["Home", "About ITI", "Services", "Branches", "News", "Programs"]) + "</ul></div></header>")
+    sidebar = "".join(f"<div><div><h3>News {i}</h3><p>ITI news item {i} about the summit and new tracks.</p>"
+                      f"</div></div>" for i in range(4))
+    footer = ("<footer><div><div><p>Over 30 years, ITI has kept updating its training portfolio.</p>"
+              "<p>QUICK LINKS</p><p>KEEP IN TOUCH 17002 info@iti.gov.eg</p>"
+              "<p>Copyright ©2022 All Rights Reserved.</p></div></div></footer>")
+    pages = []
+    for i in range(n):
+        body = (f"<div><div><div><h1>Track {i}</h1>"
+                f"<p>The track {i} trains graduates in area {i % 7} for {3 + i % 6} months.</p>"
+                f"<div><p>Applicants for track {i} take an exam and interview {i}.</p></div></div></div></div>")
+        pages.append(f"<html><body>{header}<div class='main'>{body}<aside>{sidebar}</aside></div>"
+                     f"{footer}</body></html>")
+    return pages
+
+
+def chunk(texts) -> list:
+    return [c.page_content for t in texts if isinstance(t, str) and len(t) > 10
+            for c in SPLITTER.create_documents([t])]
+
+
+def embed_seconds(model, chunks):
+    if model is None:
+        return None
+    start = time.perf_counter()
+    model.encode(chunks, batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+    return time.perf_counter() - start
+
+
+def report(name, variants, model):
+    print(f"\n{name}")
+    print(f"{'variant':<22}{'raw chars':>11}{'clean chars':>13}{'chunks':>8}{'embed s':>9}")
+    for label, raw in variants:
+        clean = clean_many(raw)
+        chunks = chunk(clean)
+        seconds = embed_seconds(model, chunks)
+        embed = f"{seconds:>9.2f}" if seconds is not None else f"{'-':>9}"
+        print(f"{label:<22}{sum(map(len, raw)):>11}{sum(map(len, clean)):>13}{len(chunks):>8}{embed}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=os.path.join(ROOT, "data", "iti_full_website_data.parquet"))
+    parser.add_argument("--fixture-pages", type=int, default=100)
+    parser.add_argument("--no-embed", action="store_true", help="skip embedding time")
+    args = parser.parse_args()
+
+    model = None
+    if not args.no_embed:
+        try:
+            from sentence_transformers import SentenceTransformer
+            from retrieval import EMBEDDING_CONFIG
+            model = SentenceTransformer(EMBEDDING_CONFIG["model"])
+        except ImportError:
+            print("sentence-transformers not installed: embedding time skipped")
+
+    content = pd.read_parquet(args.data).dropna(subset=["content"])["content"].tolist()
+    boilerplate = BoilerplateFilter.fit(content)
+    report(f"crawl ({len(content)} pages, {len(boilerplate.frequent)} template blocks)",
+           [("before", content), ("boilerplate removed", [boilerplate.apply(t) for t in content])], model)
+
+    html = fixture_pages(args.fixture_pages)
+    legacy = [legacy_extract_text(h) for h in html]
+    leaf = [extract_page(h)[0] for h in html]
+    leaf_filter = BoilerplateFilter.fit(leaf)
+    report(f"fixture ({len(html)} pages)",
+           [("get_text per tag", legacy), ("leaf-level", leaf),
+            ("leaf + boilerplate", [leaf_filter.apply(t) for t in leaf])], model)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark: stage 3 chunking throughput (docs/sec) and peak memory as the
+corpus grows, for the old chunker (iterrows + list of dicts + one CSV write,
+character lengths) vs the streaming token-aware chunker (chunking.py).
+
+The cleaned corpus is replicated --scales times; every run is a fresh
+subprocess so its peak RSS is measured on its own.
+
+Run: python benchmarks/chunker_throughput.py --scales 1 4 16 --workers 4
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "scraper"))
+from chunking import POOL_MIN_DOCS, peak_rss_mb  # noqa: E402
+
+
+def run_legacy(input_path: str, output_path: str) -> int:
+    """03_chuncker.py before streaming: whole corpus in memory, 600 characters per chunk."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    df = pd.read_csv(input_path)
+    splitter = RecursiveCharacterTextSplitter(separators=["\n\n", "\n", ". ", " ", ""], chunk_size=600,
+                                              chunk_overlap=50, length_function=len)
+    all_chunks = []
+    for index, row in df.iterrows():
+        for chunk in splitter.create_documents([row["clean"]]):
+            all_chunks.append({"url": row["url"], "chunk": chunk.page_content, "source_doc_index": index})
+    pd.DataFrame(all_chunks).to_csv(output_path, index=False)
+    return len(df)
+
+
+def run_streaming(input_path: str, output_path: str, workers: int, batch_docs: int, pool_min_docs: int) -> int:
+    from chunking import iter_chunks, read_batches, write_chunks
+    docs = [0]
+
+    def counted(results):
+        for record_batch, n_docs, _ in results:
+            docs[0] += n_docs
+            yield record_batch
+    write_chunks(counted(iter_chunks(read_batches(input_path, batch_docs), workers, pool_min_docs=pool_min_docs)),
+                 output_path)
+    return docs[0]
+
+
+def child(args):
+    start = time.perf_counter()
+    if args.run == "legacy":
+        docs = run_legacy(args.input, args.output)
+    else:
+        docs = run_streaming(args.input, args.output, args.workers, args.batch_docs, args.pool_min_docs)
+    seconds = time.perf_counter() - start
+    print(json.dumps({"docs": docs, "seconds": seconds, "peak_rss_mb": peak_rss_mb()}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=os.path.join(ROOT, "data", "iti_sample_clean.parquet"))
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-docs", type=int, default=32)
+    parser.add_argument("--pool-min-docs", type=int, default=POOL_MIN_DOCS,
+                        help="streaming: split in-process below this many documents (0 = always use the pool)")
+    parser.add_argument("--run", choices=["legacy", "streaming"], help=argparse.SUPPRESS)   # child process
+    parser.add_argument("--input", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        return child(args)
+
+    base = pd.read_parquet(args.data, columns=["url", "clean"])
+    print(f"{'scale':>6}{'docs':>8}{'chunker':>12}{'seconds':>9}{'docs/s':>9}{'peak RSS MB':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in args.scales:
+            corpus = os.path.join(tmp, f"clean_x{scale}.csv")
+            pd.concat([base] * scale, ignore_index=True).to_csv(corpus, index=False)
+            for name in ("legacy", "streaming"):
+                out = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--run", name, "--input", corpus,
+                     "--output", os.path.join(tmp, f"chunks_{name}"), "--workers", str(args.workers),
+                     "--batch-docs", str(args.batch_docs), "--pool-min-docs", str(args.pool_min_docs)],
+                    capture_output=True, text=True, check=True).stdout.strip().splitlines()[-1]
+                r = json.loads(out)
+                print(f"{scale:>6}{r['docs']:>8}{name:>12}{r['seconds']:>9.2f}{r['docs'] / r['seconds']:>9.1f}"
+                      f"{r['peak_rss_mb']:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
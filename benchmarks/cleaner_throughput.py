@@ -0,0 +1,112 @@
+"""
+Benchmark: stage 2 cleaning throughput (MB/s) of the original per-call
+re.sub cleaner vs text_cleaner.clean_text, serial and with a process pool,
+plus a golden check that every document cleans to exactly the same text.
+
+Run: python benchmarks/cleaner_throughput.py
+     python benchmarks/cleaner_throughput.py --workers 4 --repeat 5 --skip-legacy
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "scraper"))
+from text_cleaner import clean_many, clean_text  # noqa: E402
+
+
+def legacy_clean_text(text):
+    """02_cleaner.clean_text as it was before text_cleaner (kept verbatim as the golden reference)."""
+    if not isinstance(text, str):
+        return ""
+
+    t = text
+
+    t = re.sub(r".*@iti\.gov\.eg.*(Home|About|Services|News)", " ", t, flags=re.IGNORECASE)    # 1) delete links
+    t = re.sub(r"http\S+|www\.\S+", " ", t)
+
+    # 2) delete HTML if exists
+    t = re.sub(r"<[^>]+>", " ", t)
+
+    # 3) delete noise (not information!)
+    nav_patterns = [
+        r"Home\b", r"About ITI\b", r"Services\b", r"Branches\b", r"News\b",
+        r"Programs\b", r"Post Graduates\b", r"Under Graduates\b",
+        r"Tech-Business\b", r"Tech Ambassadors\b", r"Juniors\b",
+        r"KEEP IN TOUCH", r"QUICK LINKS", r"Follow us",
+        r"Terms of Use", r"Privacy Policy",
+        r"Subscribe", r"Read more",
+        r"Previous News", r"Next News",
+        r"All rights reserved", r"©.*?\d{4}"
+    ]
+    for pat in nav_patterns:
+        t = re.sub(pat, " ", t, flags=re.IGNORECASE)
+
+    # 4) remove weird symbols
+    t = re.sub(r"[•\u2022\u25CF\u25A0]", " ", t)
+
+    # 5) remove spaces repetitions
+    t = re.sub(r"\s{2,}", " ", t).strip()
+
+    return t
+
+
+# lines that hit the corner cases of the contact-line rule
+EDGE_CASES = [
+    "mail info@iti.gov.eg Home About Services News\nsecond line",
+    "News before info@ITI.GOV.EG and nothing after",
+    "x@iti.gov.eg ServiceServices tail",
+    "a@iti.gov.eg b@iti.gov.eg news\nc@iti.gov.eg\nHome d@iti.gov.eg about us",
+    "no contact Home Previous News © ITI 2024 • www.iti.gov.eg <b>x</b>",
+    None,
+]
+
+
+def time_run(fn, texts, repeat: int):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(texts)
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=os.path.join(ROOT, "data", "iti_full_website_data.parquet"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per variant (best is reported)")
+    parser.add_argument("--skip-legacy", action="store_true", help="skip the (slow) original cleaner")
+    args = parser.parse_args()
+
+    texts = pd.read_parquet(args.data).dropna(subset=["content"])["content"].tolist()
+    mb = sum(len(t.encode("utf-8")) for t in texts) / 1e6
+    print(f"{len(texts)} documents, {mb:.2f} MB")
+
+    variants = [
+        ("compiled", lambda ts: [clean_text(t) for t in ts], args.repeat),
+        (f"pool x{args.workers}", lambda ts: clean_many(ts, workers=args.workers), args.repeat),
+    ]
+    if not args.skip_legacy:
+        variants.insert(0, ("legacy", lambda ts: [legacy_clean_text(t) for t in ts], 1))
+
+    golden = [legacy_clean_text(t) for t in EDGE_CASES]
+    edge_ok = [clean_text(t) for t in EDGE_CASES] == golden
+    reference = None
+    print(f"{'cleaner':<12}{'seconds':>9}{'MB/s':>9}{'docs/s':>9}{'diffs':>7}")
+    for name, fn, repeat in variants:
+        seconds, out = time_run(fn, texts, repeat)
+        if reference is None:
+            reference = out if not args.skip_legacy else [legacy_clean_text(t) for t in texts]
+        diffs = sum(a != b for a, b in zip(out, reference))
+        print(f"{name:<12}{seconds:>9.3f}{mb / seconds:>9.2f}{len(texts) / seconds:>9.0f}{diffs:>7}")
+    print(f"edge cases identical: {edge_ok}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: cold start of the app process, eager vs background loading.
+
+  eager       rag.load_pipeline(): nothing can be served until every component
+              (MiniLM, FAISS + metadata + BM25, Qwen) is loaded
+  background  warmup.AppLoader: the UI / API is up as soon as start() returns,
+              retrieval-only answers once retrieval is loaded, full answers
+              once Qwen is loaded
+
+Each mode runs in a fresh process. Reported: seconds until the first response
+can be served, until the first answer (retrieval-only or generated), until
+fully loaded, and the per-component load time / memory from readiness().
+
+Run: python benchmarks/cold_start.py
+     python benchmarks/cold_start.py --modes background --no-llm
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+WEB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "web")
+QUERY = "What tracks does the ITI professional training program offer?"
+
+
+def child(mode: str, no_llm: bool) -> dict:
+    start = time.perf_counter()
+    sys.path.insert(0, WEB_DIR)
+    if mode == "eager":
+        from rag import load_pipeline
+        pipeline = load_pipeline()
+        loaded = time.perf_counter() - start
+        pipeline.answer(QUERY)
+        return {"serving_s": loaded, "first_answer_s": time.perf_counter() - start, "ready_s": loaded}
+
+    from warmup import AppLoader
+    loader = AppLoader(load_generation=not no_llm).start()
+    serving = time.perf_counter() - start
+    first_answer = None
+    if loader.wait("retrieval"):
+        loader.answer(QUERY)   # retrieval-only unless Qwen finished first
+        first_answer = time.perf_counter() - start
+    if not no_llm:
+        loader.wait("generation")
+    return {"serving_s": serving, "first_answer_s": first_answer, "ready_s": time.perf_counter() - start,
+            "components": loader.readiness()["components"]}
+
+
+def fmt(seconds) -> str:
+    return f"{seconds:>12.2f}" if seconds is not None else f"{'-':>12}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", nargs="+", choices=["eager", "background"], default=["eager", "background"])
+    parser.add_argument("--no-llm", action="store_true", help="background mode without Qwen")
+    parser.add_argument("--run", choices=["eager", "background"], help=argparse.SUPPRESS)   # child process
+    args = parser.parse_args()
+    if args.run:
+        print(json.dumps(child(args.run, args.no_llm)))
+        return
+
+    print(f"{'mode':<12}{'serving s':>12}{'1st answer s':>14}{'ready s':>12}")
+    for mode in args.modes:
+        cmd = [sys.executable, os.path.abspath(__file__), "--run", mode] + (["--no-llm"] if args.no_llm else [])
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{mode:<12} failed: {proc.stderr.strip().splitlines()[-1]}")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{mode:<12}{fmt(r['serving_s'])}{fmt(r['first_answer_s']):>14}{fmt(r['ready_s'])}")
+        for name, c in r.get("components", {}).items():
+            seconds = f"{c['seconds']:.2f}s" if c["seconds"] is not None else "-"
+            rss = f"+{c['rss_added_mb']:.0f} MB" if c["rss_added_mb"] is not None else "-"
+            print(f"  {name:<12}{c['status']:<10}{seconds:>8}{rss:>10}" + (f"  {c['error']}" if c["error"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Eval: token-budgeted context packing (web/context_packer.py) vs the old
+retrieve_context (top 2 chunks joined and cut at 450 characters), on the
+labelled questions in benchmarks/data/iti_questions.csv.
+
+Per variant (legacy, then one row per --budgets value):
+  evidence   share of questions whose evidence text is in the context
+  url        share of questions with an expected page among the context sources
+  tokens     mean context size in prompt tokens (Qwen tokenizer; approximate if unavailable)
+  cut        share of contexts ending mid-word
+With --generate (needs torch + Qwen), also:
+  answer     mean share of evidence words found in the generated answer
+  prefill    p50 time to first token (prompt prefill) in ms, and prompt tokens
+
+--mode sparse (BM25 only) runs without the embedding model.
+
+Run: python benchmarks/context_packing_eval.py --budgets 64 128 256 384 512
+     python benchmarks/context_packing_eval.py --generate --out packing.json
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "scraper"))
+sys.path.insert(0, os.path.join(ROOT, "web"))
+from chunking import token_length_function  # noqa: E402
+from context_packer import ContextPacker  # noqa: E402
+from retrieval import SEARCH_MODES, Retriever, load_retriever  # noqa: E402
+
+QUESTIONS_PATH = os.path.join(ROOT, "benchmarks", "data", "iti_questions.csv")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+QWEN_TOKENIZER = "Qwen/Qwen2.5-1.5B-Instruct"
+_WORDS = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(str(text).split()).lower()
+
+
+def legacy_context(hits, max_context_chars: int = 450):
+    """retrieve_context before context packing."""
+    text = " ".join(r["chunk"] for r in hits[:2])
+    mid_word = len(text) > max_context_chars and text[max_context_chars - 1].isalnum() \
+        and text[max_context_chars].isalnum()
+    if len(text) > max_context_chars:
+        text = text[:max_context_chars] + "..."
+    urls = [r["url"] for r in hits[:2] if r.get("url")]
+    return text.strip(), [[u] for u in urls[:1]], mid_word
+
+
+def word_recall(evidence: str, answer: str) -> float:
+    wanted = set(_WORDS.findall(evidence.lower()))
+    return len(wanted & set(_WORDS.findall(answer.lower()))) / len(wanted) if wanted else 0.0
+
+
+def run_variant(name, contexts, questions, count_tokens, llm):
+    rows = []
+    for q, (text, sources, mid_word) in zip(questions.itertuples(), contexts):
+        expected = set(q.url.split(";"))
+        row = {"question": q.question, "evidence_hit": normalize_text(q.evidence) in normalize_text(text),
+               "url_hit": any(expected.intersection(urls) for urls in sources),
+               "tokens": count_tokens(text), "cut_mid_word": mid_word}
+        if llm is not None:
+            from generation import GenerationStats, build_prompt, finalize_answer, stream_generate
+            stats = GenerationStats()
+            generated = "".join(stream_generate(llm.tokenizer, llm.model, llm.device, build_prompt(text, q.question),
+                                                200, stats, do_sample=False))
+            row.update(answer=finalize_answer(generated), answer_recall=word_recall(q.evidence, generated),
+                       prefill_ms=(stats.ttft or 0) * 1000, prompt_tokens=stats.prompt_tokens)
+        rows.append(row)
+    summary = {"variant": name,
+               "evidence": float(np.mean([r["evidence_hit"] for r in rows])),
+               "url": float(np.mean([r["url_hit"] for r in rows])),
+               "tokens": float(np.mean([r["tokens"] for r in rows])),
+               "cut": float(np.mean([r["cut_mid_word"] for r in rows]))}
+    if llm is not None:
+        summary.update(answer=float(np.mean([r["answer_recall"] for r in rows])),
+                       prefill_ms_p50=float(np.percentile([r["prefill_ms"] for r in rows], 50)),
+                       prompt_tokens=float(np.mean([r["prompt_tokens"] for r in rows])))
+    return summary, rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--mode", choices=SEARCH_MODES, default="hybrid")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[64, 128, 256, 384, 512])
+    parser.add_argument("--candidates", type=int, default=8, help="ranked chunks the packer considers")
+    parser.add_argument("--generate", action="store_true", help="also generate answers with Qwen")
+    parser.add_argument("--out", help="JSON result path (default: benchmarks/results/packing-<time>.json)")
+    args = parser.parse_args()
+
+    retriever = Retriever(model=None) if args.mode == "sparse" else load_retriever()
+    llm = None
+    if args.generate:
+        from llm_backends import load_backend
+        llm = load_backend(os.environ.get("ITI_LLM_BACKEND", "auto"))
+        count_tokens, exact = (lambda t: len(llm.tokenizer(t, add_special_tokens=False)["input_ids"])), True
+    else:
+        count_tokens, exact = token_length_function(QWEN_TOKENIZER)
+
+    questions = pd.read_csv(args.questions)
+    hits = [retriever.search(q, args.candidates, mode=args.mode) for q in questions["question"]]
+
+    results = [run_variant("legacy 2 x 450 chars", [legacy_context(h) for h in hits], questions, count_tokens, llm)]
+    for budget in args.budgets:
+        packer = ContextPacker(count_tokens, budget, args.candidates)
+        contexts = []
+        for h in hits:
+            packed = packer.pack(h)
+            # the packer only ever cuts at sentence / word boundaries
+            contexts.append((packed.text, [p["urls"] for p in packed.sources()], False))
+        results.append(run_variant(f"packed {budget} tokens", contexts, questions, count_tokens, llm))
+
+    print(f"\n{len(questions)} questions, mode={args.mode}, tokens {'exact' if exact else 'approximate'}")
+    header = f"{'variant':<24}{'evidence':>9}{'url':>7}{'tokens':>8}{'cut':>6}"
+    if llm is not None:
+        header += f"{'answer':>8}{'prefill ms':>11}"
+    print(header)
+    for summary, _ in results:
+        line = (f"{summary['variant']:<24}{summary['evidence']:>9.3f}{summary['url']:>7.3f}"
+                f"{summary['tokens']:>8.1f}{summary['cut']:>6.2f}")
+        if llm is not None:
+            line += f"{summary['answer']:>8.3f}{summary['prefill_ms_p50']:>11.1f}"
+        print(line)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"packing-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": datetime.now().isoformat(timespec="seconds"), "mode": args.mode,
+                   "exact_tokens": exact, "questions": len(questions),
+                   "variants": [{**summary, "per_question": rows} for summary, rows in results]},
+                  f, indent=2, ensure_ascii=False)
+    print(f"\n✅ Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
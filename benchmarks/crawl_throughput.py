@@ -0,0 +1,70 @@
+"""
+Benchmark: crawl engine throughput (pages/sec) against a local fixture site.
+Run: python benchmarks/crawl_throughput.py --pages 500 --workers 16
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraper"))
+from crawl_engine import CrawlConfig, run_crawl  # noqa: E402
+
+FILLER = ("The Information Technology Institute offers professional training programs "
+          "in software development, data science, cloud and embedded systems. ") * 6
+
+
+def build_fixture_site(root: str, n_pages: int, fanout: int = 5):
+    """Write n_pages static HTML pages that link to each other like a small site."""
+    for i in range(n_pages):
+        links = "".join(
+            f'<li><a href="/page{(i * fanout + j + 1) % n_pages}.html">Page {j}</a></li>'
+            for j in range(fanout)
+        )
+        html = (f"<html><body><nav><ul>{links}</ul></nav>"
+                f"<div><h1>Track {i}</h1><p>{FILLER}</p></div>"
+                f'<a href="mailto:info@example.com">mail</a></body></html>')
+        with open(os.path.join(root, f"page{i}.html"), "w", encoding="utf-8") as f:
+            f.write(html)
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=0.0, help="per-host requests/sec (0 = unlimited)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        build_fixture_site(root, args.pages)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_QuietHandler, directory=root))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host = f"127.0.0.1:{server.server_port}"
+
+        config = CrawlConfig(
+            allowed_domain=host,
+            base_url=f"http://{host}",
+            max_depth=args.pages,   # depth is not the limit here, the site size is
+            workers=args.workers,
+            per_host_rate=args.rate,
+            use_browser=False,
+        )
+        data, stats = run_crawl([f"http://{host}/page0.html"], config)
+        server.shutdown()
+
+    print(f"Fixture pages: {args.pages}, crawled: {len(data)}")
+    print(f"Workers: {args.workers}, per-host rate: {args.rate or 'unlimited'}")
+    print(f"Throughput: {stats.pages_per_sec:.1f} pages/sec ({stats})")
+
+
+if __name__ == "__main__":
+    main()
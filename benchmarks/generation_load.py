@@ -0,0 +1,130 @@
+"""
+Load test: Qwen generation under concurrent users, one generate() per request
+(serialised behind a lock, as before) vs the continuous-batching scheduler.
+Reports aggregate tokens/sec and p50/p95 request latency per concurrency level.
+
+Run: python benchmarks/generation_load.py --users 1 8 32 --requests 64 --tokens 48
+     python benchmarks/generation_load.py --check   # greedy outputs: batched == sequential
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "web"))
+from llm_backends import load_backend  # noqa: E402
+from generation import GenerationStats, build_prompt, generate_text, stream_generate  # noqa: E402
+from gen_scheduler import GenerationScheduler  # noqa: E402
+
+CONTEXTS = [
+    "The Information Technology Institute (ITI) offers a 9-month Professional Training Program for graduates.",
+    "ITI's Intensive Code Camps are short bootcamps in web, mobile and cloud development.",
+    "Applicants to ITI programs must pass an online exam, a technical interview and an HR interview.",
+    "ITI has branches in Smart Village, Alexandria, Assiut, Mansoura, Menofia and other governorates.",
+]
+QUESTIONS = [
+    "How long is the Professional Training Program?",
+    "What are the Intensive Code Camps?",
+    "What are the admission steps?",
+    "Where are ITI branches located?",
+]
+# each simulated user has its own sampling settings, like different clients of the API
+USER_SAMPLING = [
+    dict(temperature=0.7, top_k=50, top_p=0.95),
+    dict(temperature=0.3, top_k=20, top_p=0.9),
+    dict(temperature=1.0, top_k=0, top_p=0.8),
+    dict(do_sample=False),
+]
+
+
+def make_prompts(n: int):
+    rng = random.Random(0)
+    return [build_prompt(rng.choice(CONTEXTS), rng.choice(QUESTIONS)) for _ in range(n)]
+
+
+def run_load(generate_fn, prompts, users: int, tokens: int) -> dict:
+    """`users` threads issue the prompts back to back; returns throughput and latency."""
+    latencies, generated = [], []
+    lock = threading.Lock()
+
+    def one(i):
+        stats = GenerationStats()
+        for _ in generate_fn(prompts[i], tokens, stats, **USER_SAMPLING[i % len(USER_SAMPLING)]):
+            pass
+        with lock:
+            latencies.append(stats.finished_at - stats.started)
+            generated.append(stats.generated_tokens)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(one, range(len(prompts))))
+    wall = time.perf_counter() - start
+    return {
+        "tokens_per_sec": sum(generated) / wall,
+        "p50_s": float(np.percentile(latencies, 50)),
+        "p95_s": float(np.percentile(latencies, 95)),
+        "wall_s": wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="auto")
+    parser.add_argument("--model", default="Qwen/Qwen2.5-1.5B-Instruct")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=64, help="requests per concurrency level")
+    parser.add_argument("--tokens", type=int, default=48, help="max_new_tokens per request")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--check", action="store_true", help="compare greedy outputs instead of timing")
+    args = parser.parse_args()
+
+    llm = load_backend(args.backend, args.model)
+    scheduler = GenerationScheduler(llm.tokenizer, llm.model, max_batch=args.max_batch)
+    lock = threading.Lock()
+
+    def sequential(prompt, tokens, stats, **sampling):
+        with lock:   # old behaviour: one generate() at a time
+            yield from stream_generate(llm.tokenizer, llm.model, llm.device, prompt, tokens, stats,
+                                       stop_at_first_sentence=False, **sampling)
+
+    def batched(prompt, tokens, stats, **sampling):
+        yield from scheduler.stream(prompt, tokens, stats, stop_at_first_sentence=False, **sampling)
+
+    if args.check:
+        prompts = make_prompts(8)
+        with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+            got = list(pool.map(lambda p: scheduler.generate(p, args.tokens, stop_at_first_sentence=False,
+                                                             do_sample=False)[0], prompts))
+        same = 0
+        for prompt, text in zip(prompts, got):
+            want, _ = generate_text(llm.tokenizer, llm.model, llm.device, prompt, args.tokens,
+                                    stop_at_first_sentence=False, do_sample=False)
+            same += want.strip() == text.strip()
+        print(f"greedy outputs identical: {same}/{len(prompts)}")
+        scheduler.close()
+        return
+
+    # warm-up
+    for fn in (sequential, batched):
+        run_load(fn, make_prompts(2), 2, 8)
+
+    print(f"backend={llm.name}  tokens/request<={args.tokens}  requests/level={args.requests}")
+    print(f"{'users':>6}{'mode':>12}{'tok/s':>9}{'p50 s':>9}{'p95 s':>9}{'wall s':>9}")
+    for users in args.users:
+        prompts = make_prompts(max(args.requests, users))
+        for name, fn in (("sequential", sequential), ("batched", batched)):
+            r = run_load(fn, prompts, users, args.tokens)
+            print(f"{users:>6}{name:>12}{r['tokens_per_sec']:>9.1f}{r['p50_s']:>9.2f}{r['p95_s']:>9.2f}"
+                  f"{r['wall_s']:>9.1f}")
+    print("scheduler:", scheduler.metrics.snapshot())
+    scheduler.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Eval: retrieval hit rate of the old dense + news-keyword re-sort vs dense only
+vs hybrid dense + BM25 (reciprocal rank fusion).
+
+A query is a hit@k if one of the top k chunks comes from the expected URL.
+Queries come from --questions (CSV with `question,url` columns, several
+acceptable URLs separated by ';', e.g. benchmarks/data/iti_questions.csv) or are
+generated from the indexed chunks with a fixed seed:
+  phrase  a random 6-word span of a chunk (paraphrase-free known-item query)
+  terms   the 2 rarest terms of a chunk (track names, codes, Arabic keywords)
+
+Run: python benchmarks/hybrid_eval.py --queries 300
+     python benchmarks/hybrid_eval.py --questions benchmarks/data/iti_questions.csv
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraper"))
+from retrieval import encode, load_retriever  # noqa: E402
+from sparse_index import tokenize  # noqa: E402
+
+# what web/rag.py did before hybrid search
+NEWS_KEYWORDS = ["news", "latest", "new", "update", "أخبار", "جديد", "أحدث"]
+NEWS_CANDIDATES = 20
+KS = (1, 2, 5)
+
+
+def dense_plus_keyword(retriever, query, emb, k):
+    is_news = any(kw in query.lower() for kw in NEWS_KEYWORDS)
+    rows = retriever.search(query, NEWS_CANDIDATES if is_news else k, emb, mode="dense")
+    if is_news:
+        rows = sorted(rows, key=lambda r: not any(kw in str(r["chunk"]).lower() for kw in NEWS_KEYWORDS))
+    return rows[:k]
+
+
+def generated_queries(retriever, n: int, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    meta = retriever.metadata
+    doc_freq = {}
+    chunks = meta.column("chunk").to_pylist()
+    for text in chunks:
+        for t in set(tokenize(text)):
+            doc_freq[t] = doc_freq.get(t, 0) + 1
+    urls = meta.column("urls").to_pylist()
+    out = []
+    for pos in rng.sample(range(len(chunks)), min(n, len(chunks))):
+        words = str(chunks[pos]).split()
+        if len(words) < 8:
+            continue
+        start = rng.randrange(len(words) - 6)
+        out.append(("phrase", " ".join(words[start:start + 6]), urls[pos]))
+        rare = sorted({t for t in tokenize(chunks[pos]) if len(t) > 2}, key=lambda t: (doc_freq[t], t))[:2]
+        if rare:
+            out.append(("terms", " ".join(rare), urls[pos]))
+    return pd.DataFrame(out, columns=["kind", "question", "url"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", help="CSV with question,url columns")
+    parser.add_argument("--queries", type=int, default=300, help="chunks to draw generated queries from")
+    args = parser.parse_args()
+
+    retriever = load_retriever()
+    if retriever.sparse is None:
+        print("No BM25 index found: run python scraper/04_embedding.py first.")
+        return
+    if args.questions:
+        queries = pd.read_csv(args.questions)
+        queries["kind"] = "labelled"
+    else:
+        queries = generated_queries(retriever, args.queries)
+    embeddings = encode(retriever.model, queries["question"].tolist(), retriever.cache)
+
+    methods = {
+        "dense+keyword": lambda q, e, k: dense_plus_keyword(retriever, q, e, k),
+        "dense": lambda q, e, k: retriever.search(q, k, e, mode="dense"),
+        "hybrid": lambda q, e, k: retriever.search(q, k, e, mode="hybrid"),
+    }
+    print(f"{len(queries)} queries ({queries['kind'].value_counts().to_dict()})\n")
+    print(f"{'method':<15}{'kind':<10}" + "".join(f"{'hit@' + str(k):>8}" for k in KS) + f"{'ms/query':>10}")
+    for name, fn in methods.items():
+        for kind, group in [("all", queries)] + list(queries.groupby("kind")):
+            hits = {k: 0 for k in KS}
+            start = time.perf_counter()
+            for i, row in group.iterrows():
+                urls = [set(r["urls"].split(";")) for r in fn(row["question"], embeddings[i:i + 1], max(KS))]
+                expected = set(row["url"].split(";"))
+                for k in KS:
+                    hits[k] += any(expected & u for u in urls[:k])
+            ms = (time.perf_counter() - start) * 1000 / max(len(group), 1)
+            print(f"{name:<15}{kind:<10}" + "".join(f"{hits[k] / len(group):>8.3f}" for k in KS) + f"{ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: FAISS index modes (flat / hnsw / ivf_flat / ivf_pq).
+Reports recall@k against the flat baseline, p50/p99 single-query latency,
+build time and index memory for each mode.
+
+Run: python benchmarks/index_modes.py --scale 50 --k 20
+     (--scale N grows the corpus to N x the current index with jittered copies,
+      to see how the modes behave once more sites / archived news are added)
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraper"))
+from index_factory import INDEX_TYPES, build_index  # noqa: E402
+from retrieval import faiss_metric  # noqa: E402
+
+
+def load_vectors(index_path: str) -> np.ndarray:
+    """All vectors stored in a saved flat index (plain or ID-mapped)."""
+    index = faiss.read_index(index_path)
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def normalize(x: np.ndarray) -> np.ndarray:
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype("float32")
+
+
+def make_corpus(base: np.ndarray, scale: int, noise: float, rng) -> np.ndarray:
+    if scale <= 1:
+        return normalize(base)
+    copies = [base] + [base + rng.normal(0, noise, base.shape) for _ in range(scale - 1)]
+    return normalize(np.vstack(copies))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index", default="data/iti_faiss_index.bin")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--modes", nargs="+", default=INDEX_TYPES, choices=INDEX_TYPES)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    corpus = make_corpus(load_vectors(args.index), args.scale, args.noise, rng)
+    picks = rng.choice(len(corpus), size=args.queries, replace=len(corpus) < args.queries)
+    queries = normalize(corpus[picks] + rng.normal(0, args.noise, (args.queries, corpus.shape[1])))
+    ids = np.arange(len(corpus), dtype="int64")
+    print(f"Corpus: {len(corpus)} vectors x {corpus.shape[1]} dims, {args.queries} queries, k={args.k}\n")
+
+    truth = None
+    print(f"{'mode':<10}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}{'build s':>10}{'memory MB':>12}")
+    for mode in ["flat"] + [m for m in args.modes if m != "flat"]:
+        start = time.perf_counter()
+        index, _ = build_index(mode, corpus, metric=faiss_metric())
+        index.add_with_ids(corpus, ids)
+        build_s = time.perf_counter() - start
+
+        latencies, results = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            _, labels = index.search(q.reshape(1, -1), args.k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            results.append(labels[0])
+        results = np.array(results)
+        if truth is None:
+            truth = results
+        recall = np.mean([len(set(r) & set(t)) / args.k for r, t in zip(results, truth)])
+        memory_mb = len(faiss.serialize_index(index)) / 1e6
+
+        print(f"{mode:<10}{recall:>10.3f}{np.percentile(latencies, 50):>10.3f}"
+              f"{np.percentile(latencies, 99):>10.3f}{build_s:>10.2f}{memory_mb:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
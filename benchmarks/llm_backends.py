@@ -0,0 +1,89 @@
+"""
+Benchmark: Qwen generation backends (load time, resident memory, latency per token).
+Each backend runs in its own process so memory numbers don't mix.
+
+Run: python benchmarks/llm_backends.py --backends cpu_fp32 cpu_bf16 cpu_int8 --tokens 64
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+WEB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "web")
+
+PROMPT_CONTEXT = ("The Information Technology Institute (ITI) offers a 9-month Professional Training Program "
+                  "for graduates, with tracks such as AI and Machine Learning, Cloud Architecture and "
+                  "Embedded Systems. Applicants must pass an exam and an interview.")
+PROMPT_QUERY = "How long is the Professional Training Program and who can apply?"
+
+
+def run_one(backend: str, model_name: str, tokens: int, runs: int) -> dict:
+    import psutil
+    sys.path.insert(0, WEB_DIR)
+    from llm_backends import load_backend
+    from generation import GenerationStats, build_prompt, stream_generate
+
+    proc = psutil.Process()
+    rss_before = proc.memory_info().rss
+    llm = load_backend(backend, model_name)
+    rss_after = proc.memory_info().rss
+
+    prompt = build_prompt(PROMPT_CONTEXT, PROMPT_QUERY)
+    results = []
+    for i in range(runs + 1):   # first run is warm-up
+        stats = GenerationStats()
+        for _ in stream_generate(llm.tokenizer, llm.model, llm.device, prompt, tokens, stats,
+                                 stop_at_first_sentence=False, do_sample=False):
+            pass
+        if i > 0:
+            results.append(stats)
+
+    def mean(values):
+        values = [v for v in values if v is not None]
+        return sum(values) / len(values) if values else None
+
+    tps = mean([s.tokens_per_sec for s in results])
+    return {
+        "backend": llm.name,
+        "threads": llm.num_threads,
+        "load_s": llm.load_seconds,
+        "rss_mb": (rss_after - rss_before) / 1e6,
+        "ttft_s": mean([s.ttft for s in results]),
+        "ms_per_token": 1000 / tps if tps else None,
+        "tokens_per_sec": tps,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=["cpu_fp32", "cpu_bf16", "cpu_int8"])
+    parser.add_argument("--model", default="Qwen/Qwen2.5-1.5B-Instruct")
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_one(args.worker, args.model, args.tokens, args.runs)))
+        return
+
+    print(f"{'backend':<11}{'threads':>8}{'load s':>9}{'RSS MB':>9}{'TTFT s':>9}{'ms/token':>10}{'tok/s':>8}")
+    for backend in args.backends:
+        out = subprocess.run(
+            [sys.executable, __file__, "--worker", backend, "--model", args.model,
+             "--tokens", str(args.tokens), "--runs", str(args.runs)],
+            capture_output=True, text=True,
+        )
+        if out.returncode != 0:
+            print(f"{backend:<11} failed: {out.stderr.strip().splitlines()[-1] if out.stderr else ''}")
+            continue
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        fmt = lambda v, spec: format(v, spec) if v is not None else "-"  # noqa: E731
+        print(f"{r['backend']:<11}{fmt(r['threads'], '>8')}{r['load_s']:>9.1f}{r['rss_mb']:>9.0f}"
+              f"{fmt(r['ttft_s'], '>9.2f')}{fmt(r['ms_per_token'], '>10.1f')}{fmt(r['tokens_per_sec'], '>8.1f')}")
+
+
+if __name__ == "__main__":
+    main()
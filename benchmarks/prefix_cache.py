@@ -0,0 +1,83 @@
+"""
+Benchmark: time to first token with and without reusing the KV cache of the
+fixed instruction prefix (generation.PrefixCache), for plain generate() and
+for the batching scheduler. Greedy outputs are compared as a sanity check.
+
+Run: python benchmarks/prefix_cache.py --backend cpu_int8 --runs 10
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "web"))
+from llm_backends import load_backend  # noqa: E402
+from generation import GenerationStats, PrefixCache, build_prompt, stream_generate  # noqa: E402
+from gen_scheduler import GenerationScheduler  # noqa: E402
+
+# short contexts (~450 chars, what retrieve_context sent before token-budgeted packing)
+CONTEXTS = [
+    ("The Information Technology Institute (ITI) offers a 9-month Professional Training Program for fresh "
+     "graduates, with tracks such as AI and Machine Learning, Cloud Architecture, Embedded Systems and "
+     "Full Stack Web Development. Trainees receive a monthly stipend and hands-on projects with industry "
+     "partners. Applicants must pass an online exam, a technical interview and an HR interview..."),
+    ("ITI Intensive Code Camps are 4-month bootcamps that prepare participants for freelancing and junior "
+     "roles in web, mobile and cloud development, delivered at branches across Egypt including Smart "
+     "Village, Alexandria, Assiut and Mansoura, with both onsite and online study options..."),
+]
+QUESTIONS = ["Who can apply and how long is the program?", "Where are the code camps delivered?"]
+
+
+def time_to_first_token(run_fn, prompts, runs: int):
+    ttfts, texts = [], []
+    for i in range(runs):
+        stats = GenerationStats()
+        texts.append("".join(run_fn(prompts[i % len(prompts)], stats)))
+        ttfts.append(stats.ttft)
+    return np.array(ttfts), texts, stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="auto")
+    parser.add_argument("--model", default="Qwen/Qwen2.5-1.5B-Instruct")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--tokens", type=int, default=16)
+    args = parser.parse_args()
+
+    llm = load_backend(args.backend, args.model)
+    prefix = PrefixCache(llm.tokenizer, llm.model)
+    prompts = [build_prompt(c, q) for c, q in zip(CONTEXTS, QUESTIONS)]
+    greedy = dict(stop_at_first_sentence=False, do_sample=False)
+
+    def plain(cache):
+        return lambda prompt, stats: stream_generate(llm.tokenizer, llm.model, llm.device, prompt, args.tokens,
+                                                     stats, prefix_cache=cache, **greedy)
+
+    sched_plain = GenerationScheduler(llm.tokenizer, llm.model, max_batch=1)
+    sched_prefix = GenerationScheduler(llm.tokenizer, llm.model, max_batch=1, prefix_cache=prefix)
+
+    def batched(scheduler):
+        return lambda prompt, stats: scheduler.stream(prompt, args.tokens, stats, **greedy)
+
+    modes = [
+        ("generate", plain(None), plain(prefix)),
+        ("scheduler", batched(sched_plain), batched(sched_prefix)),
+    ]
+    print(f"backend={llm.name}  prefix={len(prefix)} tokens  runs={args.runs}")
+    print(f"{'mode':<11}{'prompt tok':>11}{'TTFT full':>11}{'TTFT reuse':>12}{'speedup':>9}{'same text':>11}")
+    for name, without, with_prefix in modes:
+        time_to_first_token(without, prompts, 2)   # warm-up
+        base, base_texts, stats = time_to_first_token(without, prompts, args.runs)
+        fast, fast_texts, _ = time_to_first_token(with_prefix, prompts, args.runs)
+        same = sum(a == b for a, b in zip(base_texts, fast_texts))
+        print(f"{name:<11}{stats.prompt_tokens:>11}{np.median(base):>10.3f}s{np.median(fast):>11.3f}s"
+              f"{np.median(base) / np.median(fast):>8.2f}x{same:>6}/{args.runs}")
+    sched_plain.close()
+    sched_prefix.close()
+
+
+if __name__ == "__main__":
+    main()
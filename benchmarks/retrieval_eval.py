@@ -0,0 +1,196 @@
+"""
+Offline retrieval evaluation + per-stage latency for retrieve_context.
+
+Uses the labelled set in benchmarks/data/iti_questions.csv:
+  question   user question (English or Arabic)
+  url        page(s) that answer it, ';'-separated when several do
+  evidence   text the answering chunk must contain (survives re-chunking)
+
+Reports recall@k and MRR at URL level (any hit from an expected page) and at
+chunk level (a hit containing the evidence), plus p50/p95/mean latency of each
+stage: encode, search, lookup (metadata fetch), context (full retrieve_context)
+and, with --generate, generate. Results are written as JSON so two runs (e.g.
+before/after changing chunk size, embedding model or index type) can be compared:
+
+Run: python benchmarks/retrieval_eval.py
+     python benchmarks/retrieval_eval.py --mode dense --out before.json
+     python benchmarks/retrieval_eval.py --baseline before.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "scraper"))
+sys.path.insert(0, os.path.join(ROOT, "web"))
+from retrieval import SEARCH_MODES, load_retriever  # noqa: E402
+from index_store import load_info  # noqa: E402
+
+QUESTIONS_PATH = os.path.join(ROOT, "benchmarks", "data", "iti_questions.csv")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+KS = (1, 3, 5, 10)
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(str(text).split()).lower()
+
+
+def first_rank(flags):
+    """1-based rank of the first True, or None."""
+    for i, ok in enumerate(flags, 1):
+        if ok:
+            return i
+    return None
+
+
+def summarize(values) -> dict:
+    values = np.asarray(values, dtype="float64")
+    return {"p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95)),
+            "mean": float(values.mean())}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def evaluate(retriever, pipeline, questions: pd.DataFrame, mode: str, context_k: int, generate: bool):
+    depth = max(KS)
+    timings = {stage: [] for stage in ("encode", "search", "lookup", "context")}
+    if generate:
+        timings["generate"] = []
+    per_question = []
+    for q in questions.itertuples():
+        expected = set(q.url.split(";"))
+        evidence = normalize_text(q.evidence)
+
+        t0 = time.perf_counter()
+        emb = retriever.encode_query(q.question)
+        t1 = time.perf_counter()
+        ids, scores = retriever.rank(q.question, depth, emb, mode)
+        t2 = time.perf_counter()
+        hits = retriever.hits(ids, scores)
+        t3 = time.perf_counter()
+        ctx, src = pipeline.retrieve_context(q.question, top_k=context_k, query_embedding=emb, mode=mode)
+        t4 = time.perf_counter()
+        timings["encode"].append((t1 - t0) * 1000)
+        timings["search"].append((t2 - t1) * 1000)
+        timings["lookup"].append((t3 - t2) * 1000)
+        timings["context"].append((t4 - t3) * 1000 + (t1 - t0) * 1000)   # as the app runs it: encode + retrieve
+        if generate:
+            t5 = time.perf_counter()
+            pipeline.generate_final_answer(ctx, q.question)
+            timings["generate"].append((time.perf_counter() - t5) * 1000)
+
+        per_question.append({
+            "question": q.question,
+            "url_rank": first_rank(bool(expected.intersection(h["urls"].split(";"))) for h in hits),
+            "chunk_rank": first_rank(evidence in normalize_text(h["chunk"]) for h in hits),
+            "top_urls": [h["url"] for h in hits[:3]],
+            "source": src,
+        })
+
+    metrics = {}
+    for level in ("url", "chunk"):
+        ranks = [r[f"{level}_rank"] for r in per_question]
+        for k in KS:
+            metrics[f"{level}_recall@{k}"] = float(np.mean([r is not None and r <= k for r in ranks]))
+        metrics[f"{level}_mrr"] = float(np.mean([1 / r if r else 0.0 for r in ranks]))
+    latency = {stage: summarize(values) for stage, values in timings.items()}
+    return metrics, latency, per_question
+
+
+def print_report(result: dict, baseline: dict = None):
+    def delta(section, key, sub=None):
+        if baseline is None:
+            return ""
+        old = baseline.get(section, {}).get(key)
+        if old is None:
+            return ""
+        new = result[section][key]
+        old, new = (old[sub], new[sub]) if sub else (old, new)
+        return f"  ({new - old:+.3f})"
+
+    print(f"\n{result['questions']} questions, mode={result['config']['mode']}, "
+          f"index={result['config']['index_type']} ({result['config']['chunks']} chunks)")
+    for key, value in result["metrics"].items():
+        print(f"  {key:<18}{value:.3f}{delta('metrics', key)}")
+    print("  latency ms          p50      p95     mean")
+    for stage, s in result["latency_ms"].items():
+        print(f"  {stage:<16}{s['p50']:>8.2f} {s['p95']:>8.2f} {s['mean']:>8.2f}{delta('latency_ms', stage, 'p50')}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--mode", choices=SEARCH_MODES, default="hybrid")
+    parser.add_argument("--context-k", type=int, default=2, help="chunks retrieve_context joins (app: 2)")
+    parser.add_argument("--use-cache", action="store_true",
+                        help="use the on-disk embedding cache (encode latency then measures cache hits)")
+    parser.add_argument("--generate", action="store_true", help="also time answer generation with Qwen")
+    parser.add_argument("--out", help="JSON result path (default: benchmarks/results/retrieval-<time>.json)")
+    parser.add_argument("--baseline", help="earlier JSON result to print deltas against")
+    args = parser.parse_args()
+
+    from rag import RAGPipeline   # imported late: pulls in the generation stack
+
+    retriever = load_retriever(use_cache=args.use_cache)
+    llm = None
+    if args.generate:
+        from llm_backends import load_backend
+        llm = load_backend(os.environ.get("ITI_LLM_BACKEND", "auto"))
+    pipeline = RAGPipeline(retriever, llm)
+
+    questions = pd.read_csv(args.questions)
+    retriever.encode_query(questions["question"].iloc[0])   # warm-up
+    metrics, latency, per_question = evaluate(retriever, pipeline, questions, args.mode,
+                                              args.context_k, args.generate)
+
+    info = load_info() or {}
+    chunk_lengths = [len(c) for c in retriever.metadata.column("chunk").to_pylist()]
+    result = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "config": {
+            "mode": args.mode,
+            "context_k": args.context_k,
+            "embedding": info.get("embedding"),
+            "index_type": info.get("index_type"),
+            "index_params": info.get("params"),
+            "index_version": info.get("version"),
+            "chunks": len(retriever.metadata),
+            "mean_chunk_chars": float(np.mean(chunk_lengths)) if chunk_lengths else 0.0,
+            "bm25": retriever.sparse is not None,
+        },
+        "questions": len(questions),
+        "metrics": metrics,
+        "latency_ms": latency,
+        "per_question": per_question,
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"retrieval-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"\n✅ Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
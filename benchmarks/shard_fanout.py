@@ -0,0 +1,137 @@
+"""
+Benchmark: search latency of the sharded index (scraper/shards.py) as the shard count grows.
+
+Shards are built in a temporary directory from the vectors and chunks of the
+built index (no embedding model needed; query vectors are random unit vectors):
+  split      the corpus divided into N shards (same total size: fan-out overhead)
+  grow       N shards that each hold a full copy of the corpus (more data per
+             query: what adding partner sites / archives costs)
+Each layout is searched with a thread pool of N workers (parallel fan-out)
+and with 1 worker (shards searched one after another).
+
+Run: python benchmarks/shard_fanout.py --shards 1 2 4 8 16
+     python benchmarks/shard_fanout.py --copies 10   # 10x the corpus per shard
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import faiss
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "scraper"))
+from index_store import index_version, load_index, save_index  # noqa: E402
+from retrieval import EMBEDDING_CONFIG  # noqa: E402
+from shards import ShardedRetriever, shard_paths  # noqa: E402
+from sparse_index import BM25Index  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+ID_MASK = (1 << 63) - 1
+
+
+def corpus():
+    """(chunk rows as a DataFrame, their vectors) of the built index."""
+    index, metadata = load_index()
+    ids = faiss.vector_to_array(index.id_map)
+    vectors = index.index.reconstruct_n(0, index.ntotal)
+    df = metadata.to_pandas()
+    order = {int(i): n for n, i in enumerate(ids)}
+    return df, vectors[[order[i] for i in df["chunk_id"]]]
+
+
+def build_shard(shards_dir: str, name: str, df, vectors):
+    paths = shard_paths(name, shards_dir)
+    os.makedirs(paths["dir"], exist_ok=True)
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+    index.add_with_ids(vectors, df["chunk_id"].to_numpy(dtype="int64"))
+    version = index_version(df["chunk_id"], "flat")
+    BM25Index.build(df["chunk_id"].to_numpy(), df["chunk"].astype(str).tolist(), version).save(paths["bm25"])
+    save_index(index, df, info={"index_type": "flat", "params": {}, "embedding": EMBEDDING_CONFIG,
+                                "version": version, "dim": index.d, "ntotal": int(index.ntotal),
+                                "shard": {"name": name, "sites": [], "language": None}},
+               index_path=paths["index"], metadata_path=paths["metadata"])
+
+
+def build_layout(shards_dir: str, layout: str, n: int, df, vectors, copies: int):
+    for s in range(n):
+        if layout == "split":
+            part = np.arange(s, len(df), n)
+            build_shard(shards_dir, f"s{s:02d}", df.iloc[part].reset_index(drop=True), vectors[part])
+            continue
+        # grow: `copies` copies of the corpus per shard, with chunk IDs made unique per copy
+        frames, vecs = [], []
+        for c in range(copies):
+            salt = (s * copies + c + 1) << 48
+            frames.append(df.assign(chunk_id=(df["chunk_id"].to_numpy() ^ salt) & ID_MASK))
+            vecs.append(vectors)
+        build_shard(shards_dir, f"s{s:02d}", pd.concat(frames, ignore_index=True), np.concatenate(vecs))
+
+
+def latency_ms(retriever, queries, vectors, repeats: int) -> list:
+    """Per-search latency (ms) of the best of `repeats` passes over the queries."""
+    best = None
+    for _ in range(repeats):
+        times = []
+        for q, v in zip(queries, vectors):
+            start = time.perf_counter()
+            retriever.search(q, 5, v, mode="hybrid")
+            times.append((time.perf_counter() - start) * 1000)
+        if best is None or sum(times) < sum(best):
+            best = times
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--layouts", nargs="+", choices=["split", "grow"], default=["split", "grow"])
+    parser.add_argument("--copies", type=int, default=1, help="grow: copies of the corpus in each shard")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--repeats", type=int, default=3, help="best of N passes")
+    parser.add_argument("--out", help="JSON result path (default: benchmarks/results/shards-<time>.json)")
+    args = parser.parse_args()
+
+    df, vectors = corpus()
+    rng = random.Random(0)
+    chunks = df["chunk"].astype(str).tolist()
+    queries = [" ".join(rng.choice(chunks).split()[:6]) for _ in range(args.queries)]
+    query_vectors = np.random.default_rng(0).standard_normal((args.queries, 1, vectors.shape[1])).astype("float32")
+    query_vectors /= np.linalg.norm(query_vectors, axis=2, keepdims=True)
+    print(f"{len(df)} chunks, {args.queries} hybrid queries, {os.cpu_count()} CPU(s)")
+
+    print(f"\n{'layout':<8}{'shards':>7}{'chunks':>9}{'workers':>9}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}")
+    rows = []
+    for layout in args.layouts:
+        for n in args.shards:
+            with tempfile.TemporaryDirectory() as tmp:
+                build_layout(tmp, layout, n, df, vectors, args.copies)
+                for workers in sorted({n, 1}, reverse=True):
+                    retriever = ShardedRetriever(None, shards_dir=tmp, workers=workers, routing="all")
+                    times = latency_ms(retriever, queries, query_vectors, args.repeats)
+                    chunks_total = sum(s.stats()["chunks"] for s in retriever.shards.values())
+                    retriever.close()
+                    row = {"layout": layout, "shards": n, "chunks": chunks_total, "workers": workers,
+                           "p50_ms": float(np.percentile(times, 50)), "p95_ms": float(np.percentile(times, 95)),
+                           "mean_ms": float(np.mean(times))}
+                    rows.append(row)
+                    print(f"{layout:<8}{n:>7}{chunks_total:>9}{workers:>9}{row['p50_ms']:>9.2f}"
+                          f"{row['p95_ms']:>9.2f}{row['mean_ms']:>9.2f}")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"shards-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": datetime.now().isoformat(timespec="seconds"), "cpus": os.cpu_count(),
+                   "queries": args.queries, "copies": args.copies, "results": rows}, f, indent=2)
+    print(f"\n✅ Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark: cost of the tracing layer (scraper/tracing.py) on the retrieval hot path.
+
+  span      ns per `with span(...)` block, tracing disabled vs enabled
+  search    µs per hybrid search (BM25 + FAISS + fusion + metadata lookup) on
+            the built index, with tracing disabled / enabled / enabled + JSON
+            trace log. Query vectors are random unit vectors, so no embedding
+            model is needed and only the instrumented code is timed.
+
+Run: python benchmarks/tracing_overhead.py --queries 2000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraper"))
+import tracing  # noqa: E402
+from retrieval import Retriever  # noqa: E402
+
+
+def span_cost_ns(n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        with tracing.span("bench.span") as s:
+            s.set(candidates=1)
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def search_cost_us(retriever, queries, vectors, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for q, v in zip(queries, vectors):
+            with tracing.span("bench.request"):
+                retriever.search(q, 5, v, mode="hybrid")
+        best = min(best, time.perf_counter() - start)
+    return best / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--spans", type=int, default=200_000)
+    parser.add_argument("--repeats", type=int, default=3, help="best of N passes")
+    args = parser.parse_args()
+
+    retriever = Retriever(model=None)
+    rng = random.Random(0)
+    chunks = retriever.metadata.column("chunk").to_pylist()
+    queries = [" ".join(str(rng.choice(chunks)).split()[:6]) for _ in range(args.queries)]
+    dim = retriever.index.d
+    vectors = np.random.default_rng(0).standard_normal((args.queries, 1, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=2, keepdims=True)
+    print(f"{len(chunks)} chunks, {args.queries} queries, BM25 {'on' if retriever.sparse else 'off'}")
+
+    tracing.configure(enabled=False)
+    span_off = span_cost_ns(args.spans)
+    tracing.configure(enabled=True)
+    span_on = span_cost_ns(args.spans)
+    print(f"\nspan: disabled {span_off:.0f} ns, enabled {span_on:.0f} ns")
+
+    print(f"\n{'tracing':<18}{'µs/search':>11}{'overhead':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        base = None
+        for label, enabled, log_path in [("disabled", False, None), ("enabled", True, None),
+                                         ("enabled + log", True, os.path.join(tmp, "traces.jsonl"))]:
+            tracing.configure(enabled, log_path)
+            us = search_cost_us(retriever, queries, vectors, args.repeats)
+            base = base if base is not None else us
+            print(f"{label:<18}{us:>11.1f}{(us / base - 1) * 100:>9.1f}%")
+
+    tracing.configure(enabled=True)
+    search_cost_us(retriever, queries[:200], vectors[:200], 1)
+    spans = tracing.tracer().snapshot()["spans"]
+    print("\nPer-stage latency (200 traced searches):")
+    for name, s in spans.items():
+        print(f"  {name:<28}{s['count']:>6} x {s['mean_ms']:.3f} ms   p95 <= {s['p95_ms_le']:g} ms")
+
+    # disabled spans vs no instrumentation at all: spans per search x cost of a disabled span
+    per_search = sum(s["count"] for name, s in spans.items() if name != "bench.request") / 200
+    print(f"\n{per_search:.0f} spans per search: disabled tracing adds ~{per_search * span_off / 1000:.1f} µs "
+          f"({per_search * span_off / 1000 / base * 100:.2f}% of a search)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,71 +1,17 @@
 """
 Step 1: Scrape ITI Website
-Run: python 01_scrape.py
+Run: python scraper/01_scrapper.py
 """
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
-import time, pandas as pd
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.action_chains import ActionChains
-
-visited = set()
-data = []
-options = Options()
-options.add_argument("--headless")                # run in headless mode
-options.add_argument("--no-sandbox")
-options.add_argument("--disable-dev-shm-usage")
-options.add_argument("--disable-gpu")
-options.add_argument("--window-size=1920,1080")   # important for pages that depend on size
-# Optional: speed up page loads
-options.page_load_strategy = "eager"
-driver = webdriver.Chrome(
-    service=Service(ChromeDriverManager().install()),
-    options=options
-)
-
-def scrape(url, depth=0):
-    if (url not in visited )and(depth < 5):
-        visited.add(url)
-        driver.get(url)
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.TAG_NAME, "body"))
-        )
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(2)
-        
-        
-        
-
-        html = driver.page_source
-        soup = BeautifulSoup(html, "html.parser")
-        text_parts = []
-
-        for tag in soup.find_all(["h1","h2","h3","h4","p","li","span","div"]):
-            content = tag.get_text(strip=True)
-            if content:
-                text_parts.append(content)
-        data.append({"url": url, "content": " ".join(text_parts)})
-        for a in soup.find_all("a", href=True):
-            link = a["href"]
-
-            # ignore mailto, tel, pdf, images
-            if link.startswith("mailto") or link.startswith("tel") or ".pdf" in link:
-                continue
-
-            #internal links
-            if link.startswith("/"):
-                link = "https://iti.gov.eg" + link
-            
-            # only focus on iti.gov.eg links
-            if "iti.gov.eg" in link:
-                scrape(link, depth + 1)
+import argparse
+import os
+import pandas as pd
+from crawl_engine import CrawlConfig, run_crawl
+from crawl_state import PAGES_PATH, CrawlState, write_changes, NEW, CHANGED, REMOVED, UNCHANGED
 
+parser = argparse.ArgumentParser()
+parser.add_argument("--full", action="store_true", help="ignore crawl state and treat every page as new")
+args = parser.parse_args()
 
 service_links = [
     "https://iti.gov.eg/home",
@@ -149,13 +95,63 @@ service_links = [
 ]
 
 
-# 2. Start the crawling operation from level 0
-for link in service_links:
-    scrape(link, depth=0)
 
-driver.quit()
+# 1. Crawl settings (see crawl_engine.CrawlConfig for all options)
+config = CrawlConfig(
+    max_depth=5,
+    workers=16,          # concurrent HTTP fetches
+    browser_workers=2,   # headless Chrome only for JS-rendered pages
+    per_host_rate=8.0,   # requests / second to iti.gov.eg
+)
+
+# 2. Load crawl state (validators + content hashes from the previous run)
+state = CrawlState()
+if args.full:
+    state.clear()
+
+previous = pd.read_parquet(PAGES_PATH) if os.path.exists(PAGES_PATH) and not args.full else None
+prev_content = {} if previous is None else dict(zip(previous["url"], previous["content"]))
+
+# 3. Start the crawling operation from level 0
+data, stats = run_crawl(service_links, config, state)
+print(f"Crawl stats: {stats}")
+
+# 4. Merge with the previous snapshot: 304 pages keep their stored content,
+#    pages that failed this time are kept as-is, pages no longer reachable are removed
+rows, changes = [], {}
+for row in data:
+    url, content, status = row["url"], row["content"], row["status"]
+    if content is None:
+        content = prev_content.get(url)
+        if content is None:
+            # not modified, but we have no stored copy -> refetch next run
+            state.forget([url])
+            continue
+    rows.append({"url": url, "content": content})
+    changes[url] = status
+
+failed = set(stats.failed_urls)
+for url, content in prev_content.items():
+    if url in changes:
+        continue
+    if url in failed:
+        rows.append({"url": url, "content": content})
+        changes[url] = UNCHANGED
+    else:
+        changes[url] = REMOVED
+state.forget([u for u, s in changes.items() if s == REMOVED])
+state.close()
+
 # store data
-df = pd.DataFrame(data)
+df = pd.DataFrame(rows, columns=["url", "content"])
 df.drop_duplicates(subset=['url', 'content'], inplace=True)
-df.to_csv("data/iti_full_website_data.csv", index=False)
-print("Scrapping Done ")
\ No newline at end of file
+df.to_parquet(PAGES_PATH, index=False)
+
+# only changed URLs are handed to the next stages
+write_changes(changes)
+n_changed = sum(1 for s in changes.values() if s != UNCHANGED)
+print(f"Changed pages: {n_changed} / {len(changes)} "
+      f"(new={sum(s == NEW for s in changes.values())}, "
+      f"changed={sum(s == CHANGED for s in changes.values())}, "
+      f"removed={sum(s == REMOVED for s in changes.values())})")
+print("Scrapping Done ")
@@ -1,52 +1,62 @@
 # stage 2: Cleaning
+import argparse
+import os
 import pandas as pd
-import re
+from boilerplate import BoilerplateFilter
+from crawl_state import CHANGED, NEW, PAGES_PATH, load_changes, write_changes
+from text_cleaner import CLEAN_CHANGES_PATH, CLEAN_PATH, clean_many
+
+# guarded: clean_many() starts worker processes, which re-import this module on spawn
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true", help="re-clean every document, ignoring the change manifest")
+    parser.add_argument("--keep-boilerplate", action="store_true",
+                        help="skip cross-page template block removal")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="cleaning processes")
+    args = parser.parse_args()
+
+    df = pd.read_parquet(PAGES_PATH)
+    df.dropna(subset=["content"], inplace=True)
+
+    # Template blocks (menus, footers, sidebars) counted over the whole crawl, not just changed pages
+    changes = None if args.full else load_changes()
+    text = df["content"]
+    if not args.keep_boilerplate:
+        boilerplate = BoilerplateFilter.fit(df["content"])
+        previous = BoilerplateFilter.load()
+        if previous is None or previous.signature() != boilerplate.signature():
+            changes = None   # the template changed: unchanged pages need re-cleaning too
+        boilerplate.save()
+        text = df["content"].map(boilerplate.apply)
+        print(f"boilerplate: {len(boilerplate.frequent)} template blocks, "
+              f"{df['content'].str.len().sum()} -> {text.str.len().sum()} chars")
+
+    prev_clean = {}
+    if os.path.exists(CLEAN_PATH):
+        prev = pd.read_parquet(CLEAN_PATH, columns=["url", "clean"])
+        prev_clean = dict(zip(prev["url"], prev["clean"]))
+
+    # Incremental mode: reuse the previous clean text of pages the crawler reported unchanged
+    if changes is not None and prev_clean:
+        df["clean"] = df["url"].map(lambda u: None if u in changes else prev_clean.get(u))
+        todo = df["clean"].isna()
+        df.loc[todo, "clean"] = clean_many(text[todo], args.workers)
+        print(f"cleaned {int(todo.sum())} changed documents, reused {int((~todo).sum())}")
+    else:
+        df["clean"] = clean_many(text, args.workers)
+
+    # 6) remove empty rows
+    df = df[df["clean"].str.len() > 10]
+
+    # 7) remove repetitions
+    df.drop_duplicates(subset=["clean"], inplace=True)
+
+    df.to_parquet(CLEAN_PATH, index=False)
+    print("after clean:", len(df))
+
+    # 8) Change manifest for stage 3: pages whose clean text differs from the previous run
+    # (every page when the boilerplate template changed, not only the ones the crawler reported)
+    write_changes({u: CHANGED if u in prev_clean else NEW
+                   for u, c in zip(df["url"], df["clean"]) if prev_clean.get(u) != c}, CLEAN_CHANGES_PATH)
+    df.sample(10)
 
-df = pd.read_csv("data/iti_full_website_data.csv")
-df.dropna(subset=["content"], inplace=True)
-
-def clean_text(text):
-    if not isinstance(text, str):
-        return ""
-
-    t = text
-
-    t = re.sub(r".*@iti\.gov\.eg.*(Home|About|Services|News)", " ", t, flags=re.IGNORECASE)    # 1) delete links 
-    t = re.sub(r"http\S+|www\.\S+", " ", t)
-
-    # 2) delete HTML if exists
-    t = re.sub(r"<[^>]+>", " ", t)
-
-    # 3) delete noise (not information!)
-    nav_patterns = [
-        r"Home\b", r"About ITI\b", r"Services\b", r"Branches\b", r"News\b",
-        r"Programs\b", r"Post Graduates\b", r"Under Graduates\b",
-        r"Tech-Business\b", r"Tech Ambassadors\b", r"Juniors\b",
-        r"KEEP IN TOUCH", r"QUICK LINKS", r"Follow us",
-        r"Terms of Use", r"Privacy Policy",
-        r"Subscribe", r"Read more",
-        r"Previous News", r"Next News",
-        r"All rights reserved", r"©.*?\d{4}"
-    ]
-    for pat in nav_patterns:
-        t = re.sub(pat, " ", t, flags=re.IGNORECASE)
-
-    # 4) remove weird symbols 
-    t = re.sub(r"[•\u2022\u25CF\u25A0]", " ", t)
-
-    # 5) remove spaces repetitions 
-    t = re.sub(r"\s{2,}", " ", t).strip()
-
-    return t
-
-df["clean"] = df["content"].apply(clean_text)
-
-# 6) remove empty rows
-df = df[df["clean"].str.len() > 10]
-
-# 7) remove repetitions
-df.drop_duplicates(subset=["clean"], inplace=True)
-
-df.to_csv("data/iti_sample_clean.csv", index=False)
-print("after clean:", len(df))
-df.sample(10)
@@ -1,53 +1,58 @@
-import pandas as pd
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import argparse
+import os
+import time
+from chunking import (CHUNK_TOKENS, CHUNKS_PATH, OVERLAP_TOKENS, POOL_MIN_DOCS, iter_chunks, peak_rss_mb,
+                      previous_chunks, read_batches, write_chunks)
+from crawl_state import load_changes
+from text_cleaner import CLEAN_CHANGES_PATH, CLEAN_PATH
 # =======================================================
-# stage 3: Chunking
+# stage 3: Chunking (streaming, token-aware, parallel)
 # =======================================================
 
-# 1. Load cleaned data
-try:
-    df = pd.read_csv("data/iti_sample_clean.csv")
-    print(f"Clean data loaded successfully. Number of rows: {len(df)}")
-except FileNotFoundError:
-    print("Error: File iti_sample_clean.csv not found. Make sure it exists.")
-    exit()
+# guarded: the splitter pool starts worker processes, which re-import this module on spawn
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true", help="re-chunk every document, ignoring the change manifest")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="splitting processes")
+    parser.add_argument("--batch-docs", type=int, default=32, help="documents read and split per batch")
+    parser.add_argument("--pool-min-docs", type=int, default=POOL_MIN_DOCS,
+                        help="split in this process below this many documents (no worker start-up)")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS, help="max embedding tokens per chunk")
+    parser.add_argument("--overlap-tokens", type=int, default=OVERLAP_TOKENS)
+    args = parser.parse_args()
 
-# 2. Prepare the recursive splitter (Recursive Text Splitter)
-# It attempts splitting based on separators in order: paragraphs, newlines, sentences, etc.
-text_splitter = RecursiveCharacterTextSplitter(
-    # The separators the splitter will try in order
-    separators=["\n\n", "\n", ". ", " ", ""], 
-    # Maximum chunk size
-    chunk_size=600,
-    # Overlap between each chunk to maintain context
-    chunk_overlap=50,  
-    length_function=len
-)
+    if not os.path.exists(CLEAN_PATH):
+        print("Error: File iti_sample_clean.parquet not found. Run 02_cleaner.py first.")
+        exit()
 
-# 3. Apply splitting on column 'clean'
-all_chunks = []
+    # 1. Incremental mode: documents whose clean text stage 2 left unchanged keep their previous chunks
+    # (stage 2's manifest, not the crawler's: a boilerplate change re-cleans pages the crawl did not touch)
+    changes = None if args.full else load_changes(CLEAN_CHANGES_PATH)
+    if changes is not None and os.path.getmtime(CLEAN_CHANGES_PATH) < os.path.getmtime(CLEAN_PATH):
+        print("⚠️ iti_clean_changes.csv is older than the clean text: re-chunking every document.")
+        changes = None
+    reuse = previous_chunks(changes) if changes is not None else None
 
-for index, row in df.iterrows():
-    # Split the clean text in column 'clean'
-    # Each row is treated as a separate document
-    chunks = text_splitter.create_documents([row['clean']])
-    
-    # Save the resulting chunks
-    for chunk in chunks:
-        all_chunks.append({
-            "url": row["url"],
-            "chunk": chunk.page_content, # the split text
-            "source_doc_index": index # can be used to trace original document
-        })
+    # 2. Stream batches of cleaned documents -> split in the pool -> append to the Parquet file
+    # Splitting follows the separators in order: paragraphs, newlines, sentences, words
+    start = time.perf_counter()
+    totals = {"docs": 0, "reused": 0, "chunks": 0}
 
-# 4. Create new dataframe and save it
-chunks_df_recursive = pd.DataFrame(all_chunks)
+    def counted(results):
+        for record_batch, n_docs, n_reused in results:
+            totals["docs"] += n_docs
+            totals["reused"] += n_reused
+            totals["chunks"] += record_batch.num_rows
+            yield record_batch
 
-# Save chunks to a new CSV file
-chunks_df_recursive.to_csv("data/iti_chunks_sample.csv", index=False)
-print("✅ File iti_chunks_sample.csv saved successfully.")
-print(f"Total number of generated chunks: {len(chunks_df_recursive)}")
+    write_chunks(counted(iter_chunks(read_batches(CLEAN_PATH, args.batch_docs), args.workers,
+                                     args.chunk_tokens, args.overlap_tokens, reuse,
+                                     pool_min_docs=args.pool_min_docs)))
+    seconds = time.perf_counter() - start
 
-# 5. Show a sample of results
-print("\nFirst 5 rows of chunks created using RecursiveCharacterTextSplitter:")
-print(chunks_df_recursive.head())
+    # 3. Report
+    print(f"✅ File {os.path.basename(CHUNKS_PATH)} saved successfully.")
+    print(f"Total number of generated chunks: {totals['chunks']} from {totals['docs']} documents")
+    if reuse is not None:
+        print(f"Re-chunked {totals['docs'] - totals['reused']} changed documents, reused {totals['reused']}")
+    print(f"{totals['docs'] / seconds:.1f} docs/sec, peak RSS {peak_rss_mb():.0f} MB")
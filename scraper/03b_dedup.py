@@ -0,0 +1,37 @@
+import argparse
+import time
+import pandas as pd
+from chunking import CHUNKS_PATH
+from near_dedup import DEDUP_PATH, NUM_PERM, THRESHOLD, dedup_chunks
+# =======================================================
+# stage 3b: Near-duplicate chunk removal (MinHash + LSH)
+# =======================================================
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                    help="word-shingle Jaccard similarity at which two chunks count as duplicates")
+parser.add_argument("--num-perm", type=int, default=NUM_PERM, help="MinHash signature length")
+args = parser.parse_args()
+
+# 1. Load the chunks of stage 3 (always deduplicated in full: clusters can span changed and unchanged pages)
+try:
+    chunks_df = pd.read_parquet(CHUNKS_PATH)
+    print(f"Loaded {len(chunks_df)} chunks.")
+except FileNotFoundError:
+    print("Error: File iti_chunks.parquet not found. Run 03_chuncker.py first.")
+    exit()
+
+# 2. Cluster near-duplicates and keep one representative per cluster (all source URLs are kept in `urls`)
+start = time.perf_counter()
+dedup_df, labels = dedup_chunks(chunks_df, args.threshold, args.num_perm)
+seconds = time.perf_counter() - start
+
+# 3. Save + report how much the corpus shrinks
+dedup_df.to_parquet(DEDUP_PATH, index=False)
+chars_before = int(chunks_df["chunk"].astype(str).str.len().sum())
+chars_after = int(dedup_df["chunk"].astype(str).str.len().sum())
+cluster_sizes = pd.Series(labels).value_counts()
+print(f"✅ File iti_chunks_dedup.parquet saved ({seconds:.2f}s, Jaccard >= {args.threshold}).")
+print(f"Chunks: {len(chunks_df)} -> {len(dedup_df)} ({1 - len(dedup_df) / max(len(chunks_df), 1):.1%} fewer)")
+print(f"Characters: {chars_before} -> {chars_after} ({1 - chars_after / max(chars_before, 1):.1%} fewer)")
+print(f"Clusters with duplicates: {int((cluster_sizes > 1).sum())}, largest: {int(cluster_sizes.max()) if len(cluster_sizes) else 0}")
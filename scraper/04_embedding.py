@@ -1,58 +1,143 @@
 #embedding  # ✅ Stage 4:
-import pandas as pd
+import argparse
+import os
+import time
 import numpy as np
 import faiss # to use fast search index
 from sentence_transformers import SentenceTransformer
 import torch
+from index_store import (INDEX_PATH, METADATA_PATH, diff_ids, index_version, info_path_for, load_chunks, load_info,
+                         save_index)
+from metadata_store import MetadataStore
+from sparse_index import BM25Index, BM25_PATH
+from index_factory import INDEX_TYPES, build_index, supports_remove
+from embedding_cache import EmbeddingCache
+from retrieval import EMBEDDING_CONFIG, encode, faiss_metric
+from shards import add_shard_args, check_shard_args, select_chunks, shard_info, shard_paths
 # =======================================================
-# ✅ Stage 4: Embeddings and Indexing (Modified)
+# ✅ Stage 4: Embeddings and Indexing (incremental, keyed by chunk ID)
 # =======================================================
 
-# 1. Load the split data (Chunks)
+parser = argparse.ArgumentParser()
+parser.add_argument("--full", action="store_true", help="rebuild the index from scratch")
+parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+parser.add_argument("--nlist", type=int, help="IVF cells")
+parser.add_argument("--nprobe", type=int, help="IVF cells searched per query")
+parser.add_argument("--hnsw-m", type=int, help="HNSW graph degree")
+parser.add_argument("--ef-search", type=int, help="HNSW search depth")
+parser.add_argument("--pq-m", type=int, help="PQ sub-quantisers")
+parser.add_argument("--no-bm25", action="store_true", help="skip the BM25 index (built by 04b_bm25.py instead)")
+add_shard_args(parser)
+args = parser.parse_args()
+check_shard_args(parser, args)
+index_params = {"nlist": args.nlist, "nprobe": args.nprobe, "hnsw_m": args.hnsw_m,
+                "ef_search": args.ef_search, "pq_m": args.pq_m}
+
+# 1. Load the split data (Chunks) with a stable ID per chunk
+# (near-duplicates removed by stage 3b when its output is present and up to date)
 try:
-    chunks_df = pd.read_csv("data/iti_chunks_sample.csv")
-    print(f"Loaded {len(chunks_df)} data chunks.")
+    chunks_df, chunks_path = load_chunks(args.chunks)
+    print(f"Loaded {len(chunks_df)} data chunks from {chunks_path}.")
 except FileNotFoundError:
-    print("Error: File iti_chunks_sample.csv not found.")
+    print(f"Error: File {args.chunks or 'iti_chunks.parquet'} not found. Run 03_chuncker.py first.")
+    exit()
+if chunks_df.empty:   # nothing to build an index from (build_index would fail on no embeddings)
+    print(f"Error: {chunks_path} has no chunks; the existing index is left as is. Check stages 2-3.")
     exit()
 
-# 2. Load the model
+# With --shard: only this shard's chunks, written to data/shards/<name>/
+INDEX_FILE, METADATA_FILE, BM25_FILE = INDEX_PATH, METADATA_PATH, BM25_PATH
+if args.shard:
+    chunks_df = select_chunks(chunks_df, args.sites, args.lang)
+    paths = shard_paths(args.shard)
+    os.makedirs(paths["dir"], exist_ok=True)
+    INDEX_FILE, METADATA_FILE, BM25_FILE = paths["index"], paths["metadata"], paths["bm25"]
+    print(f"Shard {args.shard}: {len(chunks_df)} chunks "
+          f"(sites: {args.sites or 'all'}, language: {args.lang or 'all'}).")
+    if chunks_df.empty:
+        print("Error: no chunks match the shard's --sites / --lang.")
+        exit()
+
+# 2. Decide between an incremental update and a full rebuild
+info = load_info(INDEX_FILE)
+rebuild = (args.full or info is None or info["index_type"] != args.index_type
+           or info.get("embedding") != EMBEDDING_CONFIG
+           or not os.path.exists(INDEX_FILE) or not os.path.exists(METADATA_FILE))
+if not rebuild:
+    index = faiss.read_index(INDEX_FILE)
+    existing_ids = MetadataStore.open(METADATA_FILE).chunk_ids
+    to_add, to_remove = diff_ids(existing_ids, chunks_df)
+    if len(to_remove) and not supports_remove(args.index_type):
+        print(f"{args.index_type} index cannot delete vectors -> full rebuild.")
+        rebuild = True
+if rebuild:
+    print(f"Building a new {args.index_type} index.")
+    to_add, to_remove = chunks_df, np.array([], dtype="int64")
+print(f"Chunks to embed: {len(to_add)}, chunks to remove: {len(to_remove)}, "
+      f"unchanged: {len(chunks_df) - len(to_add)}")
+
+# 3. Create embeddings (only for new / changed chunks)
 # Note: This model requires PyTorch and sentence-transformers
-MODEL_NAME = 'all-MiniLM-L6-v2'
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model = SentenceTransformer(MODEL_NAME, device=device)
-print(f"✅ Embedding model loaded: {MODEL_NAME}")
-
-# 3. Create embeddings
-print("Starting embedding creation... (may take some time)")
-
-# Embeddings are created in batches for faster and more efficient processing
-chunks_list = chunks_df["chunk"].tolist()
-# embeddings = model.encode(chunks_list, convert_to_numpy=True)
-embeddings = model.encode(
-    chunks_list,
-    convert_to_numpy=True,
-    batch_size=64,
-    device=device,
-    normalize_embeddings=True
-)
-# CUDA
-
-print(f"✅ Successfully created {len(embeddings)} embeddings.")
-
-# 4. Build FAISS index (Vector Indexing)
+# (model name, normalisation, metric and dtype come from retrieval.EMBEDDING_CONFIG)
+MODEL_NAME = EMBEDDING_CONFIG["model"]
+embeddings = None
+if len(to_add):
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = SentenceTransformer(MODEL_NAME, device=device)
+    print(f"✅ Embedding model loaded: {MODEL_NAME}")
+
+    print("Starting embedding creation... (may take some time)")
+    start = time.perf_counter()
+    # Embeddings are created in batches for faster and more efficient processing;
+    # texts already embedded by this model (boilerplate repeated across pages,
+    # earlier runs, user queries) come from the on-disk cache
+    cache = EmbeddingCache(MODEL_NAME)
+    embeddings = encode(
+        model,
+        to_add["chunk"].tolist(),
+        cache,
+        batch_size=64,
+        device=device
+    )
+    print(f"✅ Successfully created {len(embeddings)} embeddings in {time.perf_counter() - start:.1f}s "
+          f"(cache hits: {cache.hits}, encoded: {cache.misses}).")
+
+# 4. Build / update FAISS index (Vector Indexing)
 # FAISS is an open-source library for fast similarity search
-embedding_dim = embeddings.shape[1] # usually 384 for this model
-index = faiss.IndexFlatL2(embedding_dim)
-index.add(embeddings)
-print("✅ FAISS index (Vector Index) built successfully.")
+if rebuild:
+    index, resolved_params = build_index(args.index_type, embeddings, index_params, metric=faiss_metric())
+else:
+    resolved_params = info["params"]
+if len(to_remove):
+    index.remove_ids(to_remove)
+if embeddings is not None:
+    index.add_with_ids(embeddings, to_add["chunk_id"].to_numpy(dtype="int64"))
+print(f"✅ FAISS {args.index_type} index updated: {index.ntotal} vectors.")
+
+# 5. Build the BM25 inverted index over the same chunks (cheap, always rebuilt in full)
+version = index_version(chunks_df["chunk_id"], args.index_type)
+if not args.no_bm25:
+    start = time.perf_counter()
+    bm25 = BM25Index.build(chunks_df["chunk_id"].to_numpy(), chunks_df["chunk"].astype(str).tolist(), version)
+    bm25.save(BM25_FILE)
+    print(f"✅ BM25 index built: {len(bm25.vocab)} terms in {time.perf_counter() - start:.2f}s.")
 
-# 5. Save the index and metadata
-# Save the text metadata as pickle
-chunks_df.to_pickle("data/iti_metadata.pkl") 
-# Save fast search index as .bin
-faiss.write_index(index, "data/iti_faiss_index.bin") 
+# 6. Save the index, metadata and index info (written to temp files, then swapped in)
+save_index(index, chunks_df, info={
+    "index_type": args.index_type,
+    "params": resolved_params,
+    "embedding": EMBEDDING_CONFIG,
+    "version": version,
+    "dim": index.d,
+    "ntotal": int(index.ntotal),
+    **({"shard": shard_info(args, chunks_path)} if args.shard else {}),
+}, index_path=INDEX_FILE, metadata_path=METADATA_FILE)
 
 print("\n--- Stage 4 Results ---")
-print("✅ Saved iti_metadata.pkl (original texts)")
-print("✅ Saved iti_faiss_index.bin (fast search index)")
+if args.shard:
+    print(f"✅ Index shard {args.shard} saved in {paths['dir']} (running apps pick it up on their next reload)")
+print(f"✅ Saved {METADATA_FILE} (original texts, memory-mapped columns sorted by chunk_id)")
+print(f"✅ Saved {INDEX_FILE} (fast search index, ID-mapped)")
+if not args.no_bm25:
+    print(f"✅ Saved {BM25_FILE} (BM25 inverted index for hybrid search)")
+print(f"✅ Saved {info_path_for(INDEX_FILE)} (index type, search parameters, embedding config)")
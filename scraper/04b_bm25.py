@@ -0,0 +1,40 @@
+import argparse
+import os
+import time
+from index_factory import INDEX_TYPES
+from index_store import index_version, load_chunks
+from shards import add_shard_args, check_shard_args, select_chunks, shard_paths
+from sparse_index import BM25_PATH, BM25Index
+# =======================================================
+# stage 4b: BM25 index only (04_embedding.py builds it too unless --no-bm25)
+# The pipeline runner builds it here, in parallel with the embeddings.
+# =======================================================
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat",
+                    help="index type of the FAISS index built next to it (part of the shared version)")
+add_shard_args(parser)
+args = parser.parse_args()
+check_shard_args(parser, args)
+
+# 1. The same chunks (and chunk IDs) stage 4 indexes
+try:
+    chunks_df, chunks_path = load_chunks(args.chunks)
+    print(f"Loaded {len(chunks_df)} data chunks from {chunks_path}.")
+except FileNotFoundError:
+    print(f"Error: File {args.chunks or 'iti_chunks.parquet'} not found. Run 03_chuncker.py first.")
+    exit()
+BM25_FILE = BM25_PATH
+if args.shard:   # the same selection 04_embedding.py --shard makes
+    chunks_df = select_chunks(chunks_df, args.sites, args.lang)
+    BM25_FILE = shard_paths(args.shard)["bm25"]
+    os.makedirs(os.path.dirname(BM25_FILE), exist_ok=True)
+    print(f"Shard {args.shard}: {len(chunks_df)} chunks.")
+
+# 2. Build + save, stamped with the version the FAISS index info will carry
+start = time.perf_counter()
+version = index_version(chunks_df["chunk_id"], args.index_type)
+bm25 = BM25Index.build(chunks_df["chunk_id"].to_numpy(), chunks_df["chunk"].astype(str).tolist(), version)
+bm25.save(BM25_FILE)
+print(f"✅ BM25 index built: {len(bm25.vocab)} terms in {time.perf_counter() - start:.2f}s.")
+print(f"✅ Saved {BM25_FILE} (version {version})")
@@ -0,0 +1,87 @@
+# Template boilerplate removal by cross-page block frequency (stage 2)
+# ---------------------------------------------------------------------------
+# Every page of the site repeats the same header menu, "QUICK LINKS" /
+# "KEEP IN TOUCH" footer and news sidebar. Instead of listing them by hand,
+# each page is cut into text blocks (lines, further split at sentence ends,
+# since older crawls glued blocks together), every block is hashed, and the
+# number of pages containing each block is counted over the whole crawl.
+# Blocks found on many pages are template, not content, and are dropped;
+# a block repeated inside one page (nested containers) is kept only once.
+
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+BOILERPLATE_PATH = "data/iti_boilerplate.json"
+MIN_PAGES = 3         # a block must repeat on at least this many pages...
+MIN_SHARE = 0.3       # ...and on this share of the crawl to count as template
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s*(?=[A-Z\u0600-\u06FF])")
+_SPACES = re.compile(r"\s+")
+
+
+def split_blocks(text: str) -> list:
+    """Lines of a page, each split into sentence-level blocks. Returns a list of lists of blocks."""
+    if not isinstance(text, str):
+        return []
+    return [[b.strip() for b in _SENTENCE_END.split(line) if b.strip()] for line in text.split("\n")]
+
+
+def block_hash(block: str) -> str:
+    return hashlib.sha1(_SPACES.sub(" ", block).lower().encode("utf-8")).hexdigest()[:16]
+
+
+class BoilerplateFilter:
+    def __init__(self, frequent: set, n_pages: int = 0):
+        self.frequent = set(frequent)   # hashes of template blocks
+        self.n_pages = n_pages
+
+    @classmethod
+    def fit(cls, texts, min_pages: int = MIN_PAGES, min_share: float = MIN_SHARE) -> "BoilerplateFilter":
+        """Count, for every block hash, how many pages contain it."""
+        page_freq = Counter()
+        n_pages = 0
+        for text in texts:
+            lines = split_blocks(text)
+            if not lines:
+                continue
+            n_pages += 1
+            page_freq.update({block_hash(b) for line in lines for b in line})
+        threshold = max(min_pages, min_share * n_pages)
+        return cls({h for h, n in page_freq.items() if n >= threshold}, n_pages)
+
+    def apply(self, text) -> str:
+        """Drop template blocks and in-page repeats; kept blocks stay in order, one line per source line."""
+        if not isinstance(text, str):
+            return text
+        seen, lines = set(), []
+        for line in split_blocks(text):
+            kept = []
+            for block in line:
+                h = block_hash(block)
+                if h in self.frequent or h in seen:
+                    continue
+                seen.add(h)
+                kept.append(block)
+            if kept:
+                lines.append(" ".join(kept))
+        return "\n".join(lines)
+
+    def signature(self) -> str:
+        """Stable hash of the template block set (changes when the site template does)."""
+        return hashlib.sha1("\n".join(sorted(self.frequent)).encode("utf-8")).hexdigest()[:16]
+
+    def save(self, path: str = BOILERPLATE_PATH):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"signature": self.signature(), "pages": self.n_pages,
+                       "blocks": sorted(self.frequent)}, f, indent=1)
+
+    @classmethod
+    def load(cls, path: str = BOILERPLATE_PATH):
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["blocks"], data.get("pages", 0))
@@ -0,0 +1,191 @@
+# Streaming, token-aware chunking for stage 3
+# ---------------------------------------------------------------------------
+# Cleaned documents are read from Parquet in fixed-size batches, split in a
+# process pool (a bounded number of batches in flight, so memory does not grow
+# with the corpus) and appended to a Parquet file one row group per batch.
+#
+# Chunk length is measured in tokens of the embedding model's tokenizer, not
+# characters: all-MiniLM-L6-v2 truncates inputs at 256 word pieces (254 plus
+# [CLS] / [SEP]), and 600 characters of Arabic text could silently exceed that.
+
+import os
+import re
+import sys
+from collections import deque
+from itertools import chain
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import psutil
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CHUNKS_PATH = "data/iti_chunks.parquet"
+TOKENIZER_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MAX_TOKENS = 254        # embedding window minus [CLS] / [SEP]
+CHUNK_TOKENS = 128      # ~ the old 600-character chunks of English text
+OVERLAP_TOKENS = 12     # ~ the old 50-character overlap
+SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+POOL_MIN_DOCS = 2000    # smaller corpora are split in-process (see iter_chunks)
+
+SCHEMA = pa.schema([
+    ("url", pa.string()),
+    ("chunk", pa.string()),
+    ("source_doc_index", pa.int64()),
+])
+
+_APPROX_WORD = re.compile(r"\w+|[^\w\s]")
+_splitter = None   # per process, built by _init_splitter
+
+
+def token_length_function(tokenizer_name: str = TOKENIZER_NAME):
+    """(length function, exact). Falls back to an over-counting estimate when the tokenizer is unavailable."""
+    try:
+        # the Rust tokenizer the model's fast tokenizer wraps (same ids): loads in a fraction of a
+        # second, where importing transformers costs ~2 s in every worker process
+        from tokenizers import Tokenizer
+        tokenizer = Tokenizer.from_pretrained(tokenizer_name)
+        tokenizer.no_truncation()   # tokenizer.json may cap lengths at the model's max_seq_length
+        tokenizer.no_padding()
+    except Exception as e:   # not installed / not downloadable
+        print(f"⚠️ Tokenizer {tokenizer_name} unavailable ({type(e).__name__}): using approximate token counts.")
+        return approx_tokens, False
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids), True
+
+
+def approx_tokens(text: str) -> int:
+    """
+    Rough word-piece count (errs high): a punctuation mark or an English word is one
+    piece (+1 per 8 letters), other scripts split into ~2-letter pieces.
+    """
+    n = 0
+    for word in _APPROX_WORD.findall(text):
+        n += 1 + len(word) // 8 if word.isascii() else (len(word) + 1) // 2
+    return n
+
+
+def _init_splitter(chunk_tokens: int, overlap_tokens: int, tokenizer_name: str):
+    global _splitter
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    length_fn, _ = token_length_function(tokenizer_name)
+    # the splitter measures every word / sentence piece, and pieces repeat a lot across documents
+    _splitter = RecursiveCharacterTextSplitter(separators=SEPARATORS, chunk_size=chunk_tokens,
+                                               chunk_overlap=overlap_tokens,
+                                               length_function=lru_cache(maxsize=1 << 16)(length_fn))
+
+
+def _split_docs(texts) -> list:
+    """List of chunk lists, one per document."""
+    return [_splitter.split_text(str(t)) for t in texts]
+
+
+def read_batches(path: str, batch_docs: int):
+    """Yield (first row index, DataFrame with url / clean) batches of the cleaned-documents file (Parquet or CSV)."""
+    if path.endswith(".csv"):
+        batches = pd.read_csv(path, usecols=["url", "clean"], chunksize=batch_docs)
+    else:
+        batches = (b.to_pandas() for b in pq.ParquetFile(path).iter_batches(batch_docs, columns=["url", "clean"]))
+    start = 0
+    for batch in batches:
+        yield start, batch
+        start += len(batch)
+
+
+def iter_chunks(batches, workers: int = 1, chunk_tokens: int = CHUNK_TOKENS,
+                overlap_tokens: int = OVERLAP_TOKENS, reuse=None, tokenizer_name: str = TOKENIZER_NAME,
+                pool_min_docs: int = POOL_MIN_DOCS):
+    """
+    Yield (pyarrow.RecordBatch of chunks, documents, documents reused) per input batch, in document order.
+    reuse(urls) -> {url: [chunks]} returns previous chunks of unchanged documents (not re-split).
+    The process pool is only started for corpora of at least pool_min_docs documents: below that,
+    starting the workers (and their tokenizers) costs more than splitting in this process.
+    """
+    if chunk_tokens > MAX_TOKENS:
+        raise ValueError(f"chunk_tokens={chunk_tokens} exceeds the embedding window ({MAX_TOKENS} tokens)")
+    init_args = (chunk_tokens, overlap_tokens, tokenizer_name)
+
+    def submit(split, start, batch):
+        urls = batch["url"].astype(str).tolist()
+        reused = reuse(urls) if reuse is not None else {}
+        todo = [i for i, u in enumerate(urls) if u not in reused]
+        return start, urls, reused, todo, split([batch["clean"].iloc[i] for i in todo])
+
+    def assemble(start, urls, reused, todo, split_chunks):
+        new = dict(zip(todo, split_chunks))
+        cols = {"url": [], "chunk": [], "source_doc_index": []}
+        for i, url in enumerate(urls):
+            for chunk in (new[i] if i in new else reused[url]):
+                cols["url"].append(url)
+                cols["chunk"].append(chunk)
+                cols["source_doc_index"].append(start + i)
+        return pa.RecordBatch.from_pydict(cols, schema=SCHEMA), len(urls), len(reused)
+
+    workers = min(workers, os.cpu_count() or 1)   # more processes than CPUs only adds start-up cost
+    batches = iter(batches)
+    head, head_docs = [], 0   # the first batches, read ahead to decide on the pool
+    if workers > 1:
+        for start, batch in batches:
+            head.append((start, batch))
+            head_docs += len(batch)
+            if head_docs >= pool_min_docs:
+                break
+    if workers <= 1 or head_docs < pool_min_docs:
+        _init_splitter(*init_args)
+        for start, batch in chain(head, batches):
+            yield assemble(*submit(_split_docs, start, batch))
+        return
+    batches = chain(head, batches)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_splitter, initargs=init_args) as pool:
+        pending = deque()   # at most 2 batches per worker in flight
+        for start, batch in batches:
+            pending.append(submit(lambda texts: pool.submit(_split_docs, texts), start, batch))
+            if len(pending) >= 2 * workers:
+                *head, future = pending.popleft()
+                yield assemble(*head, future.result())
+        while pending:
+            *head, future = pending.popleft()
+            yield assemble(*head, future.result())
+
+
+def previous_chunks(changes: set, path: str = CHUNKS_PATH):
+    """
+    reuse() callback for iter_chunks: previous chunks of the documents not in `changes`.
+    The previous output is read once per run into a {url: [chunks]} map that every batch
+    looks up (None if there is no previous output).
+    """
+    if not os.path.exists(path):
+        return None
+    table = pq.read_table(path, columns=["url", "chunk"])
+    previous = {}
+    for url, chunk in zip(table.column("url").to_pylist(), table.column("chunk").to_pylist()):
+        if url not in changes:
+            previous.setdefault(url, []).append(chunk)
+    del table
+
+    def reuse(urls):
+        return {u: previous[u] for u in urls if u in previous}
+    return reuse
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS of this process in MB (Windows: peak working set; elsewhere ru_maxrss, in bytes on macOS)."""
+    info = psutil.Process().memory_info()
+    if hasattr(info, "peak_wset"):
+        return info.peak_wset / 2 ** 20
+    try:
+        import resource
+    except ImportError:
+        return info.rss / 2 ** 20   # no peak available: current RSS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 2 ** 20 if sys.platform == "darwin" else maxrss / 1024
+
+
+def write_chunks(record_batches, path: str = CHUNKS_PATH):
+    """Append the record batches to a Parquet file (one row group each); swapped into place when done."""
+    tmp = path + ".tmp"
+    with pq.ParquetWriter(tmp, SCHEMA) as writer:
+        for batch in record_batches:
+            writer.write_batch(batch)
+    os.replace(tmp, path)
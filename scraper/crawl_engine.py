@@ -0,0 +1,384 @@
+# Crawl engine used by stage 1 (01_scrapper.py)
+# ---------------------------------------------------------------------------
+# - asyncio worker pool over a shared URL queue (bounded concurrency)
+# - plain HTTP fetching (httpx) for static pages
+# - small pool of headless Chrome workers, only for pages that need JavaScript
+# - per-host rate limit
+# - readiness check (document ready + stable body text) instead of a fixed sleep
+
+import asyncio
+import re
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urljoin, urldefrag, urlparse
+
+import httpx
+from bs4 import BeautifulSoup
+
+try:
+    import lxml  # noqa: F401  (faster parser if installed)
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+TEXT_TAGS = ["h1", "h2", "h3", "h4", "p", "li", "span", "div"]
+BLOCK_TAGS = [t for t in TEXT_TAGS if t != "span"]   # span is inline: its text joins the enclosing block
+_SPACES = re.compile(r"\s+")
+
+
+@dataclass
+class CrawlConfig:
+    allowed_domain: str = "iti.gov.eg"
+    base_url: str = "https://iti.gov.eg"
+    max_depth: int = 5
+    workers: int = 16                 # concurrent fetch tasks
+    browser_workers: int = 2          # headless Chrome instances (JS pages only)
+    per_host_rate: float = 8.0        # max requests / second / host (0 = unlimited)
+    timeout: float = 20.0
+    ready_timeout: float = 10.0       # max wait for a JS page to render
+    min_static_chars: int = 200       # less text than this -> render with a browser
+    js_url_patterns: list = field(default_factory=list)  # regexes always rendered
+    use_browser: bool = True
+    user_agent: str = "Mozilla/5.0 (compatible; ITI-Chatbot-Crawler/1.0)"
+
+
+# -------------------------------------------------------
+# Parsing helpers
+# -------------------------------------------------------
+def extract_page(html: str):
+    """
+    Return (page text, raw hrefs) from one HTML document. Text is leaf-level:
+    every text node is emitted once, grouped into one line per block element
+    (h1-h4 / p / li / div, or a span outside them), so nested divs no longer
+    repeat their children's text.
+    """
+    soup = BeautifulSoup(html, HTML_PARSER)
+    blocks, owner, parts = [], None, []
+    for string in soup.strings:   # script / style contents are skipped
+        node = string.find_parent(BLOCK_TAGS) or string.find_parent("span")
+        if node is None:
+            continue
+        if node is not owner and parts:
+            blocks.append("".join(parts))
+            parts = []
+        owner = node
+        parts.append(string)
+    if parts:
+        blocks.append("".join(parts))
+    lines = (_SPACES.sub(" ", b).strip() for b in blocks)
+    hrefs = [a["href"] for a in soup.find_all("a", href=True)]
+    return "\n".join(line for line in lines if line), hrefs
+
+
+def normalize_link(link: str, config: CrawlConfig):
+    """Apply the stage 1 link rules; return an absolute URL or None."""
+    # ignore mailto, tel, pdf, images
+    if link.startswith("mailto") or link.startswith("tel") or ".pdf" in link:
+        return None
+    # internal links
+    if link.startswith("/"):
+        link = urljoin(config.base_url, link)
+    # only focus on allowed domain links
+    if config.allowed_domain not in link:
+        return None
+    return urldefrag(link)[0]
+
+
+# -------------------------------------------------------
+# Per-host rate limit
+# -------------------------------------------------------
+class HostRateLimiter:
+    """Spaces requests to the same host at least 1/rate seconds apart."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next_slot = {}
+        self._locks = {}
+
+    async def wait(self, url: str):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+# -------------------------------------------------------
+# Browser pool (only used for JS-rendered pages)
+# -------------------------------------------------------
+def _make_driver():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920,1080")   # important for pages that depend on size
+    options.page_load_strategy = "eager"
+    return webdriver.Chrome(
+        service=Service(ChromeDriverManager().install()),
+        options=options
+    )
+
+
+def wait_until_ready(driver, timeout: float, poll: float = 0.25):
+    """Wait for document.readyState and for the body text to stop growing."""
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    last_len = [-1]
+
+    def _ready(d):
+        if d.execute_script("return document.readyState") != "complete":
+            return False
+        d.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        cur = d.execute_script("return document.body ? document.body.innerText.length : 0")
+        stable = cur > 0 and cur == last_len[0]
+        last_len[0] = cur
+        return stable
+
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll).until(_ready)
+    except Exception:
+        pass  # render whatever is there after the timeout
+
+
+class BrowserUnavailable(RuntimeError):
+    """No headless Chrome could be started (missing Chrome / chromedriver, start-up timeout)."""
+
+
+class BrowserPool:
+    """Lazily started pool of headless Chrome drivers, one page at a time each."""
+
+    def __init__(self, size: int, ready_timeout: float):
+        self.size = max(1, size)
+        self.ready_timeout = ready_timeout
+        self._idle = []
+        self._started = 0             # drivers alive or being created
+        self._failures = 0            # consecutive start-up failures
+        self._cond = asyncio.Condition()
+
+    @property
+    def broken(self) -> bool:
+        return self._failures >= self.size   # every slot failed to start: stop trying
+
+    async def _acquire(self):
+        async with self._cond:
+            while True:
+                if self.broken:
+                    raise BrowserUnavailable("headless Chrome failed to start")
+                if self._idle:
+                    return self._idle.pop()
+                if self._started < self.size:
+                    self._started += 1
+                    break
+                await self._cond.wait()
+        try:
+            driver = await asyncio.to_thread(_make_driver)
+        except Exception as e:
+            async with self._cond:
+                self._started -= 1    # give the slot back, or later fetches wait forever
+                self._failures += 1
+                self._cond.notify_all()
+            raise BrowserUnavailable(f"headless Chrome failed to start: {e}") from e
+        self._failures = 0
+        return driver
+
+    async def _release(self, driver, healthy: bool):
+        if not healthy:   # a driver whose render raised may be wedged: replace it
+            try:
+                await asyncio.to_thread(driver.quit)
+            except Exception:
+                pass
+        async with self._cond:
+            if healthy:
+                self._idle.append(driver)
+            else:
+                self._started -= 1
+            self._cond.notify()
+
+    def _render(self, driver, url):
+        driver.get(url)
+        wait_until_ready(driver, self.ready_timeout)
+        return driver.page_source
+
+    async def fetch(self, url: str) -> str:
+        driver = await self._acquire()
+        healthy = False
+        try:
+            html = await asyncio.to_thread(self._render, driver, url)
+            healthy = True
+            return html
+        finally:
+            await self._release(driver, healthy)
+
+    def close(self):
+        while self._idle:
+            try:
+                self._idle.pop().quit()
+            except Exception:
+                pass
+
+
+# -------------------------------------------------------
+# Crawl
+# -------------------------------------------------------
+class CrawlStats:
+    def __init__(self):
+        self.pages = 0
+        self.static_pages = 0
+        self.browser_pages = 0
+        self.not_modified = 0
+        self.errors = 0
+        self.failed_urls = []
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def pages_per_sec(self):
+        return self.pages / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return (f"pages={self.pages} static={self.static_pages} browser={self.browser_pages} "
+                f"not_modified={self.not_modified} errors={self.errors} "
+                f"elapsed={self.elapsed:.1f}s ({self.pages_per_sec:.1f} pages/sec)")
+
+
+def _needs_browser(url: str, text: str, config: CrawlConfig) -> bool:
+    if any(re.search(p, url) for p in config.js_url_patterns):
+        return True
+    return len(text) < config.min_static_chars
+
+
+def _page_links(hrefs, config: CrawlConfig):
+    links = []
+    for href in hrefs:
+        link = normalize_link(href, config)
+        if link and link not in links:
+            links.append(link)
+    return links
+
+
+async def crawl(seeds, config: CrawlConfig = None, state=None):
+    """
+    Breadth-first crawl from `seeds`; returns (rows, stats).
+    rows = [{"url", "content", "status"}]. With a crawl_state.CrawlState, conditional
+    requests are sent and status is new / changed / unchanged; a 304 row has content None.
+    """
+    config = config or CrawlConfig()
+    stats = CrawlStats()
+    limiter = HostRateLimiter(config.per_host_rate)
+    browsers = BrowserPool(config.browser_workers, config.ready_timeout) if config.use_browser else None
+
+    visited = set()
+    data = []
+    queue = asyncio.Queue()
+    for url in seeds:
+        if url not in visited:
+            visited.add(url)
+            queue.put_nowait((url, 0))
+
+    async def process(client, url, depth):
+        html, etag, last_modified, rendered = None, None, None, False
+        text, links = "", []
+        if not any(re.search(p, url) for p in config.js_url_patterns):
+            headers = state.conditional_headers(url) if state is not None else {}
+            await limiter.wait(url)
+            resp = await client.get(url, headers=headers)
+            if resp.status_code == 304:
+                # not modified: reuse the links stored from the last crawl
+                stats.not_modified += 1
+                state.touch(url)
+                links = state.get(url)["links"]
+                stats.pages += 1
+                data.append({"url": url, "content": None, "status": "unchanged"})
+                enqueue(links, depth)
+                return
+            resp.raise_for_status()
+            html = resp.text
+            etag = resp.headers.get("ETag")
+            last_modified = resp.headers.get("Last-Modified")
+            text, hrefs = await asyncio.to_thread(extract_page, html)
+            links = _page_links(hrefs, config)
+
+        if browsers is not None and _needs_browser(url, text, config):
+            await limiter.wait(url)
+            try:
+                rendered_html = await browsers.fetch(url)
+            except Exception as e:
+                if html is None:   # JS-only URL: there is no static text to fall back to
+                    raise
+                print(f"⚠️ {url}: browser render failed ({e}), keeping the static HTML text")
+                rendered_html = None
+            if rendered_html is not None:
+                html = rendered_html
+                text, hrefs = await asyncio.to_thread(extract_page, html)
+                links = _page_links(hrefs, config)
+                rendered = True
+                stats.browser_pages += 1
+            else:
+                stats.static_pages += 1
+        else:
+            stats.static_pages += 1
+
+        status = "new"
+        if state is not None:
+            status = state.record(url, text, links, etag, last_modified, rendered)
+        stats.pages += 1
+        data.append({"url": url, "content": text, "status": status})
+        enqueue(links, depth)
+
+    def enqueue(links, depth):
+        if depth + 1 >= config.max_depth:
+            return
+        for link in links:
+            if link not in visited:
+                visited.add(link)
+                queue.put_nowait((link, depth + 1))
+
+    async def worker(client):
+        while True:
+            url, depth = await queue.get()
+            try:
+                await process(client, url, depth)
+            except Exception as e:
+                stats.errors += 1
+                stats.failed_urls.append(url)
+                print(f"⚠️ {url}: {e}")
+            finally:
+                queue.task_done()
+
+    headers = {"User-Agent": config.user_agent}
+    limits = httpx.Limits(max_connections=config.workers)
+    async with httpx.AsyncClient(headers=headers, timeout=config.timeout,
+                                 follow_redirects=True, limits=limits) as client:
+        tasks = [asyncio.create_task(worker(client)) for _ in range(config.workers)]
+        try:
+            await queue.join()
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if browsers is not None:
+                browsers.close()
+            if state is not None:
+                state.commit()
+    stats.finished = time.perf_counter()
+    return data, stats
+
+
+def run_crawl(seeds, config: CrawlConfig = None, state=None):
+    """Blocking wrapper around crawl()."""
+    return asyncio.run(crawl(seeds, config, state))
@@ -0,0 +1,134 @@
+# Persistent crawl state + change manifest for incremental re-scrapes
+# ---------------------------------------------------------------------------
+# crawl_state.sqlite keeps, per URL: HTTP validators (ETag / Last-Modified),
+# a hash of the extracted text and the page's out-links. The crawler uses it to
+# send conditional requests and to detect unchanged pages; stage 1 then writes
+# iti_changes.csv (url, status) so stages 2-4 only redo work for changed URLs.
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+STATE_PATH = "data/crawl_state.sqlite"
+CHANGES_PATH = "data/iti_changes.csv"
+PAGES_PATH = "data/iti_full_website_data.parquet"   # stage 1 output: url, content
+
+# statuses written to the change manifest
+NEW, CHANGED, UNCHANGED, REMOVED = "new", "changed", "unchanged", "removed"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class CrawlState:
+    """Small SQLite store of per-URL validators and content hashes."""
+
+    def __init__(self, path: str = STATE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                links TEXT,
+                rendered INTEGER DEFAULT 0,
+                last_crawled REAL,
+                last_changed REAL
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, url: str):
+        row = self.conn.execute(
+            "SELECT etag, last_modified, content_hash, links, rendered FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "content_hash": row[2],
+            "links": json.loads(row[3] or "[]"),
+            "rendered": bool(row[4]),
+        }
+
+    def conditional_headers(self, url: str) -> dict:
+        """If-None-Match / If-Modified-Since for a page fetched before without a browser."""
+        prev = self.get(url)
+        if prev is None or prev["rendered"]:
+            # a JS page's static shell can stay the same while its content changes
+            return {}
+        headers = {}
+        if prev["etag"]:
+            headers["If-None-Match"] = prev["etag"]
+        if prev["last_modified"]:
+            headers["If-Modified-Since"] = prev["last_modified"]
+        return headers
+
+    def record(self, url: str, text: str, links, etag=None, last_modified=None, rendered=False) -> str:
+        """Store the latest crawl of `url`; returns NEW, CHANGED or UNCHANGED."""
+        new_hash = content_hash(text)
+        prev = self.get(url)
+        if prev is None:
+            status = NEW
+        elif prev["content_hash"] == new_hash:
+            status = UNCHANGED
+        else:
+            status = CHANGED
+        now = time.time()
+        self.conn.execute("""
+            INSERT INTO pages (url, etag, last_modified, content_hash, links, rendered, last_crawled, last_changed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                content_hash = excluded.content_hash,
+                links = excluded.links,
+                rendered = excluded.rendered,
+                last_crawled = excluded.last_crawled,
+                last_changed = CASE WHEN pages.content_hash = excluded.content_hash
+                                    THEN pages.last_changed ELSE excluded.last_changed END
+        """, (url, etag, last_modified, new_hash, json.dumps(list(links)), int(rendered), now, now))
+        return status
+
+    def touch(self, url: str):
+        """Mark a 304 Not Modified page as crawled."""
+        self.conn.execute("UPDATE pages SET last_crawled = ? WHERE url = ?", (time.time(), url))
+
+    def forget(self, urls):
+        self.conn.executemany("DELETE FROM pages WHERE url = ?", [(u,) for u in urls])
+
+    def clear(self):
+        self.conn.execute("DELETE FROM pages")
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+# -------------------------------------------------------
+# Change manifest (stage 1 -> stages 2..4)
+# -------------------------------------------------------
+def write_changes(changes: dict, path: str = CHANGES_PATH):
+    """changes: {url: status}. Only non-unchanged entries are written."""
+    rows = [{"url": u, "status": s} for u, s in changes.items() if s != UNCHANGED]
+    pd.DataFrame(rows, columns=["url", "status"]).to_csv(path, index=False)
+
+
+def load_changes(path: str = CHANGES_PATH):
+    """Return {url: status} from the last crawl, or None if there is no manifest."""
+    if not os.path.exists(path):
+        return None
+    df = pd.read_csv(path)
+    return dict(zip(df["url"], df["status"]))
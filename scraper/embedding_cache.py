@@ -0,0 +1,218 @@
+# Persistent embedding cache keyed by (model name, text hash)
+# ---------------------------------------------------------------------------
+# Vectors are stored un-normalised in a memory-mapped float32 file, one row per
+# slot; a small SQLite table maps sha1(text) -> slot and tracks last use for
+# LRU eviction once `max_entries` is reached. Normalisation is applied on read,
+# so the batch pipeline (normalised) and the query path share the same entries.
+# Free slots are listed explicitly; every lookup / insert runs under a thread
+# lock + file lock, so stage 4 and the apps can share one cache directory.
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from filelock import FileLock
+import numpy as np
+
+CACHE_DIR = "data/embedding_cache"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class EmbeddingCache:
+    """On-disk cache for one embedding model."""
+
+    def __init__(self, model_name: str, root: str = CACHE_DIR,
+                 max_entries: int = 200_000, initial_capacity: int = 4096):
+        self.model_name = model_name
+        self.dir = os.path.join(root, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        os.makedirs(self.dir, exist_ok=True)
+        self.vectors_path = os.path.join(self.dir, "vectors.f32")
+        self.max_entries = max_entries
+        self.initial_capacity = min(initial_capacity, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(os.path.join(self.dir, "cache.lock"))   # portable (fcntl / msvcrt)
+        self.dim = None
+        self.capacity = 0
+        self._vectors = None
+
+        self.conn = sqlite3.connect(os.path.join(self.dir, "index.sqlite"), check_same_thread=False)
+        with self._exclusive():
+            self.conn.execute("CREATE TABLE IF NOT EXISTS entries "
+                              "(hash TEXT PRIMARY KEY, slot INTEGER, last_used REAL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value INTEGER)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS free_slots (slot INTEGER PRIMARY KEY)")
+            self._sync()
+            if self._info("free_list") is None:
+                self._rebuild_free_list()
+
+    # ---------------------------------------------------
+    # storage helpers (called with _exclusive() held)
+    # ---------------------------------------------------
+    @contextmanager
+    def _exclusive(self):
+        """Thread lock + file lock: one reader / writer at a time across threads and processes
+        (stage 4 and the apps share the cache). Commits on success, rolls back on error."""
+        with self._lock, self._file_lock:
+            try:
+                yield
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+    def _info(self, key):
+        row = self.conn.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_info(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)", (key, int(value)))
+
+    def _sync(self):
+        """Pick up a dim / capacity another process may have written."""
+        dim, capacity = self._info("dim"), self._info("capacity") or 0
+        if dim != self.dim or capacity != self.capacity or (self._vectors is None and dim and capacity):
+            self.dim, self.capacity = dim, capacity
+            self._vectors = None
+            if self.dim and self.capacity:
+                self._vectors = np.memmap(self.vectors_path, dtype="float32", mode="r+",
+                                          shape=(self.capacity, self.dim))
+
+    def _rebuild_free_list(self):
+        """List the slots no entry uses (caches written before the free list: repairs shared / orphaned slots)."""
+        self.conn.execute("DELETE FROM entries WHERE slot >= ? OR slot IN "
+                          "(SELECT slot FROM entries GROUP BY slot HAVING COUNT(*) > 1)", (self.capacity,))
+        used = {slot for (slot,) in self.conn.execute("SELECT slot FROM entries")}
+        self.conn.execute("DELETE FROM free_slots")
+        self.conn.executemany("INSERT INTO free_slots (slot) VALUES (?)",
+                              [(s,) for s in range(self.capacity) if s not in used])
+        self._set_info("free_list", 1)
+
+    def _grow(self, capacity: int):
+        old = self.capacity
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        size = capacity * self.dim * 4
+        with open(self.vectors_path, "ab") as f:
+            if os.path.getsize(self.vectors_path) < size:   # never shrink
+                f.truncate(size)
+        self._set_info("capacity", capacity)
+        self.conn.executemany("INSERT OR IGNORE INTO free_slots (slot) VALUES (?)",
+                              [(s,) for s in range(old, capacity)])
+        self._sync()
+
+    def _take_free(self, n: int) -> list:
+        return [s for (s,) in self.conn.execute("SELECT slot FROM free_slots ORDER BY slot LIMIT ?", (n,))]
+
+    def _free_slots(self, n: int):
+        """Return n writable slots: free ones first (growing the file if allowed), then least recently used ones."""
+        free = self._take_free(n)
+        if len(free) < n and self.capacity < self.max_entries:
+            used = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            self._grow(min(self.max_entries, max(used + n, self.capacity * 2, self.initial_capacity)))
+            free = self._take_free(n)
+        self.conn.executemany("DELETE FROM free_slots WHERE slot = ?", [(s,) for s in free])
+        if len(free) < n:
+            victims = self.conn.execute(
+                "SELECT hash, slot FROM entries ORDER BY last_used LIMIT ?", (n - len(free),)
+            ).fetchall()
+            self.conn.executemany("DELETE FROM entries WHERE hash = ?", [(h,) for h, _ in victims])
+            free += [s for _, s in victims]
+        return free
+
+    def _slots_for(self, hashes) -> dict:
+        rows = []
+        for i in range(0, len(hashes), 500):
+            part = hashes[i:i + 500]
+            rows += self.conn.execute(
+                f"SELECT hash, slot FROM entries WHERE hash IN ({','.join('?' * len(part))})", part
+            ).fetchall()
+        return dict(rows)
+
+    # ---------------------------------------------------
+    # public API
+    # ---------------------------------------------------
+    def get_many(self, hashes):
+        """Return {hash: vector} for the cached hashes."""
+        found = {}
+        if not hashes:
+            return found
+        with self._exclusive():
+            self._sync()
+            if self._vectors is None:
+                return found
+            for h, slot in self._slots_for(hashes).items():
+                found[h] = np.array(self._vectors[slot])
+            now = time.time()
+            self.conn.executemany("UPDATE entries SET last_used = ? WHERE hash = ?", [(now, h) for h in found])
+        return found
+
+    def put_many(self, hashes, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype="float32")
+        new = dict(zip(hashes, vectors))
+        with self._exclusive():
+            self._sync()
+            # another thread / process may have stored some of these texts since the caller's lookup
+            existing = self._slots_for(list(new))
+            now = time.time()
+            self.conn.executemany("UPDATE entries SET last_used = ? WHERE hash = ?", [(now, h) for h in existing])
+            new = [(h, v) for h, v in new.items() if h not in existing][-self.max_entries:]
+            if not new:
+                return
+            if self.dim is None:
+                self._set_info("dim", vectors.shape[1])
+                self._sync()
+            slots = self._free_slots(len(new))
+            for slot, (_, vec) in zip(slots, new):
+                self._vectors[slot] = vec
+            self._vectors.flush()
+            self.conn.executemany("INSERT INTO entries (hash, slot, last_used) VALUES (?, ?, ?)",
+                                  [(h, s, now) for (h, _), s in zip(new, slots)])
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+def encode_cached(model, texts, cache: EmbeddingCache, normalize: bool = True, **encode_kwargs) -> np.ndarray:
+    """
+    model.encode() with a cache in front: identical texts are encoded once per model,
+    across runs and across callers. Extra kwargs (batch_size, device...) go to encode().
+    """
+    single = isinstance(texts, str)
+    texts = [texts] if single else list(texts)
+    hashes = [text_hash(t) for t in texts]
+
+    found = cache.get_many(list(dict.fromkeys(hashes)))
+    missing = {}
+    for h, t in zip(hashes, texts):
+        if h not in found and h not in missing:
+            missing[h] = t
+    cache.hits += len(texts) - sum(1 for h in hashes if h in missing)
+    cache.misses += len(missing)
+
+    if missing:
+        new_vectors = model.encode(list(missing.values()), convert_to_numpy=True,
+                                   normalize_embeddings=False, **encode_kwargs)
+        new_vectors = np.asarray(new_vectors, dtype="float32")
+        cache.put_many(list(missing.keys()), new_vectors)
+        found.update(zip(missing.keys(), new_vectors))
+
+    vectors = np.stack([found[h] for h in hashes]).astype("float32")
+    if normalize:
+        vectors = _normalize(vectors)
+    return vectors[0] if single else vectors
@@ -0,0 +1,82 @@
+# FAISS index factory for stage 4
+# ---------------------------------------------------------------------------
+# Index types:
+#   flat     - exact brute force search (baseline)
+#   hnsw     - graph index, fast and accurate, no deletions (rebuilt when chunks are removed)
+#   ivf_flat - inverted lists over k-means cells, exact distances inside probed cells
+#   ivf_pq   - inverted lists + product quantisation, smallest memory footprint
+# Search-time knobs (efSearch / nprobe) are stored with the index info so the
+# app configures the searcher the same way the index was built for.
+
+import math
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ["flat", "hnsw", "ivf_flat", "ivf_pq"]
+
+DEFAULT_PARAMS = {
+    "hnsw_m": 32,            # graph degree
+    "ef_construction": 80,
+    "ef_search": 64,
+    "nlist": 256,            # IVF cells (capped by the training set size)
+    "nprobe": 16,            # IVF cells visited per query
+    "pq_m": 48,              # PQ sub-quantisers (must divide the dimension)
+    "pq_nbits": 8,
+}
+
+
+def supports_remove(index_type: str) -> bool:
+    return index_type != "hnsw"
+
+
+def resolve_params(index_type: str, dim: int, n_train: int, params: dict = None) -> dict:
+    """Fill defaults and shrink IVF / PQ sizes so they can be trained on n_train vectors."""
+    p = dict(DEFAULT_PARAMS)
+    p.update({k: v for k, v in (params or {}).items() if v is not None})
+    if index_type in ("ivf_flat", "ivf_pq"):
+        # faiss wants ~39 training points per centroid
+        p["nlist"] = max(1, min(p["nlist"], n_train // 39))
+        p["nprobe"] = min(p["nprobe"], p["nlist"])
+    if index_type == "ivf_pq":
+        while dim % p["pq_m"]:
+            p["pq_m"] -= 1
+        p["pq_nbits"] = max(1, min(p["pq_nbits"], int(math.log2(max(2, n_train // 39)))))
+    return p
+
+
+def build_index(index_type: str, embeddings: np.ndarray, params: dict = None, metric=faiss.METRIC_L2):
+    """
+    Return (empty trained index that accepts add_with_ids, resolved params).
+    IVF indexes keep IDs natively; flat and HNSW are wrapped in IndexIDMap2.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    dim = embeddings.shape[1]
+    p = resolve_params(index_type, dim, len(embeddings), params)
+
+    if index_type == "flat":
+        index = faiss.IndexIDMap2(faiss.IndexFlat(dim, metric))
+    elif index_type == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(dim, p["hnsw_m"], metric)
+        hnsw.hnsw.efConstruction = p["ef_construction"]
+        index = faiss.IndexIDMap2(hnsw)
+    elif index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(faiss.IndexFlat(dim, metric), dim, p["nlist"], metric)
+    else:
+        index = faiss.IndexIVFPQ(faiss.IndexFlat(dim, metric), dim, p["nlist"], p["pq_m"], p["pq_nbits"], metric)
+
+    if not index.is_trained:
+        index.train(embeddings)
+    configure_search(index, index_type, p)
+    return index, p
+
+
+def configure_search(index, index_type: str, params: dict):
+    """Apply the search-time parameters recorded for this index."""
+    if index_type == "hnsw":
+        inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+        inner.hnsw.efSearch = params.get("ef_search", DEFAULT_PARAMS["ef_search"])
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        faiss.extract_index_ivf(index).nprobe = params.get("nprobe", DEFAULT_PARAMS["nprobe"])
+    return index
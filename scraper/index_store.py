@@ -0,0 +1,125 @@
+# FAISS index + metadata storage keyed by chunk ID
+# ---------------------------------------------------------------------------
+# Every chunk gets a stable, content-addressed 63-bit ID (hash of url + text).
+# The vectors live in a faiss.IndexIDMap2, so search returns chunk IDs and the
+# metadata store (metadata_store.py, memory-mapped Arrow) is keyed by the same
+# IDs. That lets stage 4 add only new chunks and remove deleted ones instead of
+# rebuilding the whole index.
+
+import hashlib
+import json
+import os
+
+import faiss
+import numpy as np
+import pandas as pd
+
+from index_factory import configure_search
+from metadata_store import MetadataStore
+
+INDEX_PATH = "data/iti_faiss_index.bin"
+METADATA_PATH = "data/iti_metadata.arrow"   # chunk_id, url, chunk, source_doc_index, urls
+INFO_PATH = "data/iti_index_info.json"   # index type, build/search params, model
+
+
+def chunk_id(url: str, text: str) -> int:
+    """Stable int64 ID for one chunk (same url + same text -> same ID)."""
+    digest = hashlib.sha1(f"{url}\0{text}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little") & ((1 << 63) - 1)
+
+
+def assign_chunk_ids(chunks_df: pd.DataFrame) -> pd.DataFrame:
+    """Add a `chunk_id` column and drop exact duplicate chunks of the same page."""
+    df = chunks_df.copy()
+    df["chunk_id"] = [chunk_id(str(u), str(c)) for u, c in zip(df["url"], df["chunk"])]
+    return df.drop_duplicates(subset="chunk_id").reset_index(drop=True)
+
+
+def load_chunks(path: str = None):
+    """
+    (chunks with chunk IDs, path read) for stage 4: the given chunk file (another corpus
+    for an index shard), else the near-duplicate-free chunks of stage 3b when present and
+    newer than the stage 3 chunks, else the stage 3 chunks.
+    Raises FileNotFoundError when neither exists.
+    """
+    from chunking import CHUNKS_PATH
+    from near_dedup import DEDUP_PATH
+    if path is not None:
+        return assign_chunk_ids(pd.read_parquet(path)), path
+    path = CHUNKS_PATH
+    if os.path.exists(DEDUP_PATH) and (not os.path.exists(CHUNKS_PATH)
+                                       or os.path.getmtime(DEDUP_PATH) >= os.path.getmtime(CHUNKS_PATH)):
+        path = DEDUP_PATH
+    else:
+        print("⚠️ iti_chunks_dedup.parquet missing or older than the chunks: indexing without near-duplicate "
+              "removal (run 03b_dedup.py first).")
+    return assign_chunk_ids(pd.read_parquet(path)), path
+
+
+def index_version(chunk_ids, index_type: str) -> str:
+    """Short fingerprint of the indexed chunks; changes whenever the index content changes."""
+    ids = np.sort(np.asarray(chunk_ids, dtype="int64"))
+    return hashlib.sha1(ids.tobytes() + index_type.encode("utf-8")).hexdigest()[:16]
+
+
+def info_path_for(index_path: str) -> str:
+    return INFO_PATH if index_path == INDEX_PATH else os.path.splitext(index_path)[0] + "_info.json"
+
+
+def load_info(index_path: str = INDEX_PATH):
+    """Index info saved next to the index, or None for an index built before it existed."""
+    path = info_path_for(index_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_index(index_path: str = INDEX_PATH, metadata_path: str = METADATA_PATH):
+    """
+    Load (index, metadata store) and configure the searcher from the saved index info.
+    The metadata file is memory-mapped, not read into memory.
+    """
+    index = faiss.read_index(index_path)
+    metadata = MetadataStore.open(metadata_path)
+    info = load_info(index_path)
+    if info is not None:
+        configure_search(index, info["index_type"], info.get("params", {}))
+    return index, metadata
+
+
+def lookup(metadata: MetadataStore, ids, distances=None) -> list:
+    """Hit dicts for the labels returned by index.search, in search order (missing / -1 labels are skipped)."""
+    positions, found = metadata.rows_for(ids)
+    hits = metadata.take(positions)
+    rows = [dict(zip(hits, values)) for values in zip(*hits.values())]
+    if distances is not None:
+        for row, dist in zip(rows, np.asarray(distances).ravel()[found]):
+            row["distance"] = float(dist)
+    return rows
+
+
+def save_index(index, metadata: pd.DataFrame, info: dict = None,
+               index_path: str = INDEX_PATH, metadata_path: str = METADATA_PATH):
+    """Write all files to temporaries first, then swap them into place."""
+    meta_tmp, index_tmp = metadata_path + ".tmp", index_path + ".tmp"
+    MetadataStore.write(metadata, meta_tmp)
+    faiss.write_index(index, index_tmp)
+    info_path = info_path_for(index_path)
+    if info is not None:
+        with open(info_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(info, f, indent=2)
+    # lookup() skips IDs missing from the metadata, so a reader in between never breaks
+    os.replace(meta_tmp, metadata_path)
+    os.replace(index_tmp, index_path)
+    if info is not None:
+        os.replace(info_path + ".tmp", info_path)
+
+
+def diff_ids(existing_ids, chunks_df: pd.DataFrame):
+    """Return (chunks to add, ids to remove) between the indexed chunk IDs and the current chunks."""
+    existing = set(int(i) for i in existing_ids)
+    current = set(chunks_df["chunk_id"].tolist())
+    to_add = chunks_df[~chunks_df["chunk_id"].isin(existing)]
+    to_remove = np.array(sorted(existing - current), dtype="int64")
+    return to_add, to_remove
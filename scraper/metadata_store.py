@@ -0,0 +1,72 @@
+# Memory-mapped, columnar chunk metadata (replaces the pickled DataFrame)
+# ---------------------------------------------------------------------------
+# The chunk texts, URLs and source_doc_index are written as one uncompressed
+# Arrow IPC file, sorted by chunk_id. Opening it memory-maps the file, so the
+# columns are never copied or unpickled, and every process serving the same
+# index shares the same page-cache pages. A search hit (chunk ID) is turned
+# into a row with a binary search on the chunk_id column and plain array
+# takes; no DataFrame is built per query.
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+COLUMNS = ["chunk_id", "url", "chunk", "source_doc_index", "urls"]
+SCHEMA = pa.schema([
+    ("chunk_id", pa.int64()),
+    ("url", pa.string()),
+    ("chunk", pa.string()),
+    ("source_doc_index", pa.int64()),
+    ("urls", pa.string()),   # every source URL of a near-duplicate cluster, ';'-separated (stage 3b)
+])
+
+
+class MetadataStore:
+    def __init__(self, table: pa.Table):
+        ids = table.column("chunk_id")
+        if ids.num_chunks > 1:   # files written by write() hold one record batch
+            table = table.combine_chunks()
+            ids = table.column("chunk_id")
+        if "urls" not in table.column_names:   # written before stage 3b: one source URL per chunk
+            table = table.append_column("urls", table.column("url"))
+        self.table = table
+        # zero-copy view of the (sorted) ID column
+        self.chunk_ids = ids.chunk(0).to_numpy() if ids.num_chunks else np.array([], dtype="int64")
+
+    @classmethod
+    def open(cls, path: str) -> "MetadataStore":
+        with pa.memory_map(path, "r") as source:
+            return cls(pa.ipc.open_file(source).read_all())
+
+    @staticmethod
+    def write(df: pd.DataFrame, path: str):
+        """Write the chunk rows (a DataFrame with COLUMNS) sorted by chunk_id as one record batch."""
+        if "urls" not in df.columns:
+            df = df.assign(urls=df["url"])
+        df = df[COLUMNS].sort_values("chunk_id")
+        table = pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False)
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, SCHEMA) as writer:
+            writer.write_table(table, max_chunksize=max(len(table), 1))
+
+    def __len__(self):
+        return len(self.table)
+
+    def rows_for(self, ids):
+        """(row positions, mask over `ids`) for the IDs present in the store; -1 / unknown IDs are dropped."""
+        ids = np.asarray(ids, dtype="int64").ravel()
+        if not len(self.chunk_ids):
+            return np.array([], dtype="int64"), np.zeros(len(ids), dtype=bool)
+        pos = np.searchsorted(self.chunk_ids, ids).clip(max=len(self.chunk_ids) - 1)
+        found = (ids >= 0) & (self.chunk_ids[pos] == ids)
+        return pos[found], found
+
+    def take(self, positions, columns=COLUMNS) -> dict:
+        """{column: list of values} for the given row positions."""
+        idx = pa.array(np.asarray(positions, dtype="int64"))
+        return {col: self.table.column(col).take(idx).to_pylist() for col in columns}
+
+    def column(self, name: str):
+        return self.table.column(name)
+
+    def to_pandas(self) -> pd.DataFrame:
+        return self.table.to_pandas()
@@ -0,0 +1,121 @@
+# Near-duplicate chunk detection with MinHash + LSH (stage 3b)
+# ---------------------------------------------------------------------------
+# Track pages share templates, so many chunks differ only by a track name or
+# a date. Each chunk becomes a set of word shingles; a MinHash signature
+# (num_perm multiply-shift hashes) estimates Jaccard similarity, and LSH
+# banding only compares chunks that share at least one band bucket. Candidate
+# pairs are confirmed with the exact Jaccard of their shingle sets against a
+# cluster representative (the longest chunk), which is the one chunk kept.
+
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+DEDUP_PATH = "data/iti_chunks_dedup.parquet"
+SHINGLE_WORDS = 3
+NUM_PERM = 128
+THRESHOLD = 0.8
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def shingles(text: str, k: int = SHINGLE_WORDS) -> set:
+    words = _WORD_RE.findall(str(text).lower())
+    if len(words) <= k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def lsh_params(threshold: float, num_perm: int, recall: float = 0.95):
+    """
+    (bands, rows) with bands * rows == num_perm: the most rows per band (fewest
+    candidates) that still puts a pair at exactly `threshold` in a shared bucket
+    with probability >= recall. False candidates are cheap: they are re-checked exactly.
+    """
+    pairs = [(num_perm // r, r) for r in range(num_perm, 0, -1) if num_perm % r == 0]
+    for bands, rows in pairs:
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            return bands, rows
+    return num_perm, 1
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        # multiply-shift hashing: h(x) = (a * x + b) >> 32 over uint64 (wraps), a odd
+        self.a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set: set) -> np.ndarray:
+        if not shingle_set:
+            return np.full(len(self.a), 0xFFFFFFFF, dtype=np.uint64)
+        x = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingle_set), dtype=np.uint64,
+                        count=len(shingle_set))
+        with np.errstate(over="ignore"):
+            h = ((x[:, None] * self.a + self.b) >> np.uint64(32)) & _MASK32
+        return h.min(axis=0)
+
+
+def near_duplicate_clusters(texts, threshold: float = THRESHOLD, num_perm: int = NUM_PERM,
+                            shingle_words: int = SHINGLE_WORDS) -> list:
+    """
+    Representative position per text. Texts are visited longest first; each one
+    joins the first representative it shares an LSH bucket with at shingle
+    Jaccard >= threshold, or becomes a representative itself. Every member is
+    checked against its representative (no chaining through intermediate texts).
+    """
+    sets = [shingles(t, shingle_words) for t in texts]
+    hasher = MinHasher(num_perm)
+    signatures = np.stack([hasher.signature(s) for s in sets]) if sets else np.zeros((0, num_perm), np.uint64)
+    bands, rows = lsh_params(threshold, num_perm)
+
+    candidates = defaultdict(set)
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for i, sig in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+            buckets[sig.tobytes()].append(i)
+        for members in buckets.values():
+            if len(members) > 1:
+                for i in members:
+                    candidates[i].update(members)
+
+    lengths = [len(str(t)) for t in texts]
+    order = sorted(range(len(sets)), key=lambda i: (-lengths[i], i))
+    labels = [None] * len(sets)
+    for i in order:
+        for rep in sorted(candidates[i]):
+            if labels[rep] == rep and jaccard(sets[i], sets[rep]) >= threshold:
+                labels[i] = rep
+                break
+        else:
+            labels[i] = i
+    return labels
+
+
+def dedup_chunks(chunks_df, threshold: float = THRESHOLD, num_perm: int = NUM_PERM):
+    """
+    One row per near-duplicate cluster: the longest chunk represents it (its url,
+    chunk and source_doc_index), `urls` lists every distinct source URL of the
+    cluster (';'-separated, representative's first) for citation.
+    Returns (deduplicated DataFrame, representative position per input row).
+    """
+    df = chunks_df.reset_index(drop=True)
+    labels = near_duplicate_clusters(df["chunk"].astype(str).tolist(), threshold, num_perm)
+    members = defaultdict(list)
+    for i, rep in enumerate(labels):
+        members[rep].append(i)
+    source_urls = df["url"].astype(str).tolist()
+    reps = sorted(members)
+    out = df.iloc[reps].copy()
+    out["urls"] = [";".join(dict.fromkeys([source_urls[rep]] + [source_urls[i] for i in members[rep]]))
+                   for rep in reps]
+    return out.reset_index(drop=True), np.asarray(labels)
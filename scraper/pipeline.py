@@ -0,0 +1,294 @@
+# Declarative runner for the offline pipeline (stages 1-4)
+# ---------------------------------------------------------------------------
+# Every stage is declared once: its script, the data files it reads and
+# writes, and the helper modules its result depends on. Before a stage runs,
+# its fingerprint (hash of its input files, code and arguments) is compared
+# with the one recorded after its last successful run; an up-to-date stage
+# whose outputs are untouched is skipped.
+#
+# Stages run as child processes (each script keeps working on its own, and
+# the peak RSS of each stage, worker processes included, is sampled with psutil). A stage starts as soon
+# as the stages producing its inputs are done, so independent stages (FAISS
+# embeddings and the BM25 index) run in parallel. Stages hand data over as
+# Parquet / Arrow / binary index files, not CSV.
+#
+# Run: python scraper/pipeline.py                 # clean -> chunk -> dedup -> embed + bm25
+#      python scraper/pipeline.py --scrape        # re-crawl the site first
+#      python scraper/pipeline.py --dry-run       # only show what would run
+#      python scraper/pipeline.py --shards shards.json   # also build the index shards listed there
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+import psutil
+
+from boilerplate import BOILERPLATE_PATH
+from chunking import CHUNKS_PATH
+from crawl_state import CHANGES_PATH, PAGES_PATH
+from index_factory import INDEX_TYPES
+from index_store import INDEX_PATH, INFO_PATH, METADATA_PATH, info_path_for
+from near_dedup import DEDUP_PATH
+from shards import shard_paths
+from sparse_index import BM25_PATH
+from text_cleaner import CLEAN_CHANGES_PATH, CLEAN_PATH
+
+SCRAPER_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(SCRAPER_DIR)
+STATE_FILE = "data/pipeline_state.json"
+
+RAN, SKIPPED, FAILED, BLOCKED, WOULD_RUN = "ran", "up to date", "failed", "blocked", "would run"
+
+
+@dataclass
+class Stage:
+    name: str
+    script: str                                   # file in scraper/
+    inputs: list                                  # data files read (a missing file is fingerprinted as such)
+    outputs: list                                 # data files written
+    code: list = field(default_factory=list)      # helper modules (scraper/<name>.py) the result depends on
+    args: list = field(default_factory=list)
+    volatile: bool = False                        # reads the outside world (the website): never skipped
+
+    def command(self) -> list:
+        return [sys.executable, os.path.join(SCRAPER_DIR, self.script)] + [str(a) for a in self.args]
+
+
+def default_stages(index_type: str = "flat", workers: int = None, full: bool = False) -> list:
+    full_arg = ["--full"] if full else []
+    worker_args = ["--workers", workers] if workers else []
+    return [
+        Stage("scrape", "01_scrapper.py", [], [PAGES_PATH, CHANGES_PATH],
+              code=["crawl_engine", "crawl_state"], args=full_arg, volatile=True),
+        Stage("clean", "02_cleaner.py", [PAGES_PATH, CHANGES_PATH], [CLEAN_PATH, CLEAN_CHANGES_PATH, BOILERPLATE_PATH],
+              code=["text_cleaner", "boilerplate", "crawl_state"], args=full_arg + worker_args),
+        Stage("chunk", "03_chuncker.py", [CLEAN_PATH, CLEAN_CHANGES_PATH], [CHUNKS_PATH],
+              code=["chunking", "crawl_state"], args=full_arg + worker_args),
+        Stage("dedup", "03b_dedup.py", [CHUNKS_PATH], [DEDUP_PATH], code=["near_dedup"]),
+        Stage("embed", "04_embedding.py", [DEDUP_PATH], [INDEX_PATH, METADATA_PATH, INFO_PATH],
+              code=["index_store", "metadata_store", "index_factory", "embedding_cache", "retrieval"],
+              args=full_arg + ["--index-type", index_type, "--no-bm25"]),
+        Stage("bm25", "04b_bm25.py", [DEDUP_PATH], [BM25_PATH],
+              code=["sparse_index", "index_store"], args=["--index-type", index_type]),
+    ]
+
+
+def shard_stages(config_path: str, index_type: str = "flat", full: bool = False) -> list:
+    """
+    embed:<name> + bm25:<name> stages for every shard in a JSON list like
+    [{"name": "iti-ar", "lang": "ar"}, {"name": "partner-x", "chunks": "data/partner_x_chunks.parquet",
+      "sites": ["partner-x.org"]}]  (see shards.py).
+    """
+    with open(config_path, encoding="utf-8") as f:
+        specs = json.load(f)
+    stages = []
+    for spec in specs:
+        paths = shard_paths(spec["name"])
+        select = ["--shard", spec["name"]]
+        if spec.get("chunks"):
+            select += ["--chunks", spec["chunks"]]
+        if spec.get("sites"):
+            select += ["--sites", *spec["sites"]]
+        if spec.get("lang"):
+            select += ["--lang", spec["lang"]]
+        inputs = [spec.get("chunks") or DEDUP_PATH]
+        stages += [
+            Stage(f"embed:{spec['name']}", "04_embedding.py", inputs,
+                  [paths["index"], paths["metadata"], info_path_for(paths["index"])],
+                  code=["index_store", "metadata_store", "index_factory", "embedding_cache", "retrieval", "shards"],
+                  args=(["--full"] if full else []) + ["--index-type", index_type, "--no-bm25"] + select),
+            Stage(f"bm25:{spec['name']}", "04b_bm25.py", inputs, [paths["bm25"]],
+                  code=["sparse_index", "index_store", "shards"], args=["--index-type", index_type] + select),
+        ]
+    return stages
+
+
+# -------------------------------------------------------
+# Fingerprints
+# -------------------------------------------------------
+def file_hash(path: str):
+    """sha256 of a file's content, or None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def fingerprint(stage: Stage) -> str:
+    data = {
+        "command": [stage.script] + [str(a) for a in stage.args],
+        "code": {name: file_hash(os.path.join(SCRAPER_DIR, name + ".py")) for name in [stage.script[:-3]] + stage.code},
+        "inputs": {path: file_hash(path) for path in stage.inputs},
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def load_state(path: str = STATE_FILE) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state: dict, path: str = STATE_FILE):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def is_up_to_date(stage: Stage, fp: str, state: dict) -> bool:
+    prev = state.get(stage.name)
+    if stage.volatile or prev is None or prev.get("fingerprint") != fp:
+        return False
+    # outputs must still be the ones this run produced (not deleted or rewritten by hand)
+    return all(file_hash(path) == prev["outputs"].get(path) for path in stage.outputs)
+
+
+# -------------------------------------------------------
+# Execution
+# -------------------------------------------------------
+_print_lock = threading.Lock()
+
+
+def sample_peak_rss(pid: int, done: threading.Event, peak: list, interval: float = 0.1):
+    """Until `done` is set, keep in peak[0] the largest RSS (bytes) of the process + its children."""
+    try:
+        root = psutil.Process(pid)
+    except psutil.Error:
+        return
+    while not done.is_set():
+        try:
+            procs = [root] + root.children(recursive=True)
+        except psutil.Error:   # the stage exited
+            return
+        rss = 0
+        for p in procs:
+            try:
+                rss += p.memory_info().rss
+            except psutil.Error:
+                pass
+        peak[0] = max(peak[0] or 0, rss)
+        done.wait(interval)
+
+
+def run_stage(stage: Stage):
+    """Run the stage script as a child process; returns (exit code, wall seconds, peak RSS in MB or None)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(stage.command(), cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            text=True, env={**os.environ, "PYTHONUNBUFFERED": "1"})
+    # sampled (works on Windows too): the sum over the stage and its worker processes
+    done, peak = threading.Event(), [None]
+    sampler = threading.Thread(target=sample_peak_rss, args=(proc.pid, done, peak), daemon=True)
+    sampler.start()
+    for line in proc.stdout:
+        with _print_lock:
+            print(f"[{stage.name}] {line}", end="")
+    proc.stdout.close()
+    code = proc.wait()
+    done.set()
+    sampler.join()
+    return code, time.perf_counter() - start, peak[0] / 2 ** 20 if peak[0] else None
+
+
+def dependencies(stages: list) -> dict:
+    """{stage name: names of the selected stages that write one of its inputs}."""
+    producers = {path: s.name for s in stages for path in s.outputs}
+    return {s.name: {producers[p] for p in s.inputs if p in producers and producers[p] != s.name} for s in stages}
+
+
+def run_pipeline(stages: list, force: bool = False, dry_run: bool = False, state_path: str = STATE_FILE) -> list:
+    """Run the stages in dependency order (independent ones in parallel); returns one report row per stage."""
+    state = load_state(state_path)
+    deps = dependencies(stages)
+    results, running = {}, {}
+
+    def launch(stage: Stage, upstream_would_run: bool = False):
+        # dry run: an upstream stage that would run would rewrite this stage's inputs, so it would run too
+        if dry_run and upstream_would_run:
+            return {"stage": stage.name, "status": WOULD_RUN, "seconds": 0.0, "peak_rss_mb": None}
+        fp = fingerprint(stage)   # taken after the upstream stages finished: sees their new outputs
+        if not force and is_up_to_date(stage, fp, state):
+            return {"stage": stage.name, "status": SKIPPED, "seconds": 0.0, "peak_rss_mb": None}
+        if dry_run:
+            return {"stage": stage.name, "status": WOULD_RUN, "seconds": 0.0, "peak_rss_mb": None}
+        code, seconds, rss = run_stage(stage)
+        row = {"stage": stage.name, "status": RAN if code == 0 else FAILED, "seconds": seconds, "peak_rss_mb": rss}
+        if code == 0:
+            state[stage.name] = {"fingerprint": fp, "outputs": {p: file_hash(p) for p in stage.outputs},
+                                 "finished": time.strftime("%Y-%m-%d %H:%M:%S"), "seconds": round(seconds, 3),
+                                 "peak_rss_mb": round(rss, 1) if rss is not None else None}
+        return row
+
+    with ThreadPoolExecutor(max_workers=len(stages) or 1) as pool:
+        while len(results) < len(stages):
+            for stage in stages:
+                if stage.name in results or stage.name in running:
+                    continue
+                upstream = deps[stage.name]
+                if any(results.get(d, {}).get("status") in (FAILED, BLOCKED) for d in upstream):
+                    results[stage.name] = {"stage": stage.name, "status": BLOCKED, "seconds": 0.0,
+                                           "peak_rss_mb": None}
+                elif all(d in results for d in upstream):
+                    upstream_would_run = any(results[d]["status"] == WOULD_RUN for d in upstream)
+                    running[stage.name] = pool.submit(launch, stage, upstream_would_run)
+            if not running:
+                continue
+            finished, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+            for name, future in list(running.items()):
+                if future in finished:
+                    results[name] = future.result()
+                    del running[name]
+                    if not dry_run:
+                        save_state(state, state_path)
+
+    return [results[s.name] for s in stages]
+
+
+def print_report(rows: list, total_seconds: float):
+    width = max([10] + [len(r["stage"]) + 2 for r in rows])
+    print(f"\n{'stage':<{width}}{'status':<13}{'wall s':>9}{'peak RSS MB':>13}")
+    for r in rows:
+        rss = f"{r['peak_rss_mb']:>13.0f}" if r["peak_rss_mb"] is not None else f"{'-':>13}"
+        print(f"{r['stage']:<{width}}{r['status']:<13}{r['seconds']:>9.2f}{rss}")
+    print(f"total wall time: {total_seconds:.2f}s")
+
+
+def main():
+    names = [s.name for s in default_stages()]
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stages", nargs="+", choices=names, help="stages to consider (default: all but scrape)")
+    parser.add_argument("--scrape", action="store_true", help="also re-crawl the site (stage 1 always runs)")
+    parser.add_argument("--force", action="store_true", help="run the selected stages even if up to date")
+    parser.add_argument("--dry-run", action="store_true", help="only print which stages would run")
+    parser.add_argument("--full", action="store_true", help="pass --full to the stages (no incremental reuse)")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--workers", type=int, help="processes for cleaning / chunking (default: all cores)")
+    parser.add_argument("--shards", metavar="CONFIG", help="JSON list of index shards to build next to the main index")
+    args = parser.parse_args()
+
+    shards_config = os.path.abspath(args.shards) if args.shards else None
+    os.chdir(ROOT)   # data paths are relative to the repo root, like the stage scripts
+    selected = args.stages or [n for n in names if n != "scrape" or args.scrape]
+    stages = [s for s in default_stages(args.index_type, args.workers, args.full) if s.name in selected]
+    if shards_config:   # embed:<name> / bm25:<name> run when embed / bm25 are selected
+        stages += [s for s in shard_stages(shards_config, args.index_type, args.full)
+                   if s.name.split(":")[0] in selected]
+    start = time.perf_counter()
+    rows = run_pipeline(stages, force=args.force, dry_run=args.dry_run)
+    print_report(rows, time.perf_counter() - start)
+    if any(r["status"] in (FAILED, BLOCKED) for r in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
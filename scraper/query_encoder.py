@@ -0,0 +1,115 @@
+# Micro-batching query encoder shared by all chat sessions of one process
+# ---------------------------------------------------------------------------
+# Each Streamlit session used to run its own one-string forward pass. Here a
+# background thread collects queries that arrive within a short window
+# (max_wait_ms, or until max_batch is reached), encodes them in one batched
+# call and hands each vector back to the waiting session.
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class EncoderMetrics:
+    """Batch size and queueing delay of the last `window` batches."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self.batch_sizes = deque(maxlen=window)
+        self.queue_delays_ms = deque(maxlen=window)
+        self.batches = 0
+        self.queries = 0
+
+    def record(self, size: int, delays_ms):
+        with self._lock:
+            self.batches += 1
+            self.queries += size
+            self.batch_sizes.append(size)
+            self.queue_delays_ms.extend(delays_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            sizes = np.array(self.batch_sizes or [0])
+            delays = np.array(self.queue_delays_ms or [0.0])
+            return {
+                "batches": self.batches,
+                "queries": self.queries,
+                "mean_batch_size": float(sizes.mean()),
+                "max_batch_size": int(sizes.max()),
+                "queue_delay_p50_ms": float(np.percentile(delays, 50)),
+                "queue_delay_p95_ms": float(np.percentile(delays, 95)),
+            }
+
+
+class BatchingEncoder:
+    """
+    encode(text) blocks until the text's vector is ready. `encode_fn(list_of_texts)`
+    must return a 2-D array; it is only ever called from the worker thread.
+    """
+
+    def __init__(self, encode_fn, max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.encode_fn = encode_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.metrics = EncoderMetrics()
+        self._queue = queue.Queue()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="query-encoder", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        if self._stopped:
+            raise RuntimeError("BatchingEncoder is closed")
+        fut = Future()
+        self._queue.put((text, fut, time.perf_counter()))
+        return fut
+
+    def encode(self, text: str, timeout: float = None) -> np.ndarray:
+        """Vector for one query, shape (1, dim)."""
+        return self.submit(text).result(timeout).reshape(1, -1)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)   # finish this batch, stop afterwards
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            texts = [t for t, _, _ in batch]
+            try:
+                vectors = self.encode_fn(texts)
+            except Exception as e:
+                for _, fut, _ in batch:
+                    fut.set_exception(e)
+                continue
+            self.metrics.record(len(batch), [(started - t0) * 1000 for _, _, t0 in batch])
+            for (_, fut, _), vec in zip(batch, vectors):
+                fut.set_result(vec)
+
+    def close(self):
+        self._stopped = True
+        self._queue.put(None)
+        self._thread.join()
@@ -0,0 +1,176 @@
+# Shared retrieval module
+# ---------------------------------------------------------------------------
+# One place that owns the embedding configuration (model, normalisation,
+# metric, dtype). Stage 4 records it with the index; 05_sematic_search.py and
+# web/st.py load the index through Retriever, which refuses an index built
+# with a different configuration, so queries and chunks are always embedded
+# and compared the same way.
+#
+# When stage 4 also built the BM25 index (sparse_index.py), search() is
+# hybrid: dense and BM25 candidates are merged with reciprocal rank fusion.
+# Each search step runs in a tracing span (tracing.py; a no-op unless enabled).
+#
+# Several named indexes (per site / language, shards.py) are searched together
+# through ShardedRetriever, which fans out to one Retriever per shard.
+
+import os
+
+import faiss
+import numpy as np
+
+from embedding_cache import EmbeddingCache, encode_cached
+from index_store import INDEX_PATH, METADATA_PATH, load_index, load_info, lookup
+from query_encoder import BatchingEncoder
+from sparse_index import BM25_PATH, BM25Index, rrf_fuse
+from tracing import span
+
+# Normalised vectors + inner product = cosine similarity
+EMBEDDING_CONFIG = {
+    "model": "all-MiniLM-L6-v2",
+    "normalize": True,
+    "metric": "inner_product",
+    "dtype": "float32",
+}
+
+_METRICS = {"inner_product": faiss.METRIC_INNER_PRODUCT, "l2": faiss.METRIC_L2}
+
+HYBRID_CANDIDATES = 20   # dense and BM25 candidates each, before fusion
+SEARCH_MODES = ("hybrid", "dense", "sparse")
+
+
+class IndexConfigError(RuntimeError):
+    """The saved index was built with a different embedding configuration."""
+
+
+def faiss_metric(config: dict = EMBEDDING_CONFIG):
+    return _METRICS[config["metric"]]
+
+
+def check_index_config(info, config: dict = EMBEDDING_CONFIG):
+    recorded = (info or {}).get("embedding")
+    if recorded != config:
+        raise IndexConfigError(
+            f"Index embedding config {recorded} does not match {config}. "
+            f"Rebuild it with: python scraper/04_embedding.py --full"
+        )
+
+
+def encode(model, texts, cache: EmbeddingCache = None, config: dict = EMBEDDING_CONFIG, **encode_kwargs):
+    """Embed texts exactly as the index was built: returns a 2-D array of config['dtype']."""
+    if isinstance(texts, str):
+        texts = [texts]
+    if cache is not None:
+        vectors = encode_cached(model, texts, cache, normalize=config["normalize"], **encode_kwargs)
+    else:
+        vectors = model.encode(texts, convert_to_numpy=True,
+                               normalize_embeddings=config["normalize"], **encode_kwargs)
+    return np.ascontiguousarray(vectors, dtype=config["dtype"])
+
+
+def to_scores(distances, config: dict = EMBEDDING_CONFIG):
+    """FAISS distances -> similarity scores (higher is better) for either metric."""
+    distances = np.asarray(distances)
+    return distances if config["metric"] == "inner_product" else -distances
+
+
+def fuse_rankings(rankings: dict, top_k: int):
+    """(ids, scores) from Retriever.rankings() output: cosine scores for dense alone, else the RRF score."""
+    if "bm25" not in rankings:
+        ids, scores = rankings["dense"]
+        return ids[:top_k], scores[:top_k]
+    if "dense" not in rankings:
+        return rrf_fuse([rankings["bm25"][0]], top_k)
+    with span("retrieve.fuse"):
+        return rrf_fuse([rankings["dense"][0], rankings["bm25"][0]], top_k)
+
+
+class Retriever:
+    """Embedding model + FAISS index + metadata, checked against EMBEDDING_CONFIG."""
+
+    def __init__(self, model, cache: EmbeddingCache = None, index_path: str = INDEX_PATH,
+                 metadata_path: str = METADATA_PATH, config: dict = EMBEDDING_CONFIG,
+                 batch_window_ms: float = None, max_batch: int = 32, bm25_path: str = BM25_PATH):
+        info = load_info(index_path)
+        check_index_config(info, config)
+        self.version = info.get("version")   # changes whenever the index is rebuilt / updated
+        self.model = model
+        self.cache = cache
+        self.config = config
+        self.index, self.metadata = load_index(index_path, metadata_path)
+        # BM25 side of hybrid search; skipped if missing or built from other chunks than the index
+        self.sparse = BM25Index.load(bm25_path) if os.path.exists(bm25_path) else None
+        if self.sparse is not None and self.sparse.version != self.version:
+            print(f"⚠️ {bm25_path} does not match the index (rerun 04_embedding.py); using dense search only.")
+            self.sparse = None
+        # with a batching window, concurrent queries share one forward pass
+        self.encoder = None
+        if batch_window_ms is not None:
+            self.encoder = BatchingEncoder(lambda texts: encode(model, texts, cache, config),
+                                           max_batch=max_batch, max_wait_ms=batch_window_ms)
+
+    def encode_query(self, query: str):
+        with span("retrieve.encode_query", batched=self.encoder is not None):
+            if self.encoder is not None:
+                return self.encoder.encode(query)
+            return encode(self.model, query, self.cache, self.config)
+
+    def search(self, query: str, top_k: int = 5, query_embedding=None, mode: str = "hybrid") -> list:
+        """
+        Return the top_k hits as dicts (chunk_id, url, chunk, source_doc_index, score), best first.
+        mode="dense": score is the cosine similarity. mode="hybrid" (dense only if there is
+        no BM25 index) / "sparse": score is the reciprocal-rank-fusion score.
+        """
+        with span("retrieve.search", mode=mode, top_k=top_k):
+            return self.hits(*self.rank(query, top_k, query_embedding, mode))
+
+    def rank(self, query: str, top_k: int = 5, query_embedding=None, mode: str = "hybrid"):
+        """(chunk ids, scores) of the top_k chunks, best first, without touching the metadata."""
+        return fuse_rankings(self.rankings(query, top_k, query_embedding, mode), top_k)
+
+    def rankings(self, query: str, top_k: int = 5, query_embedding=None, mode: str = "hybrid") -> dict:
+        """
+        Candidate lists before fusion: {"dense": (ids, cosine scores), "bm25": (ids, BM25 scores)},
+        each best first; only the ones `mode` uses (dense alone when there is no BM25 index).
+        """
+        out = {}
+        if mode != "dense" and self.sparse is not None:
+            with span("retrieve.bm25_search") as s:
+                out["bm25"] = self.sparse.search(query, max(top_k, HYBRID_CANDIDATES))
+                s.set(candidates=len(out["bm25"][0]))
+        if mode != "sparse" or self.sparse is None:
+            depth = max(top_k, HYBRID_CANDIDATES) if out else top_k
+            out["dense"] = self.dense_search(query, depth, query_embedding)
+        return out
+
+    def dense_search(self, query: str, top_k: int, query_embedding=None):
+        """(chunk ids, cosine scores) from the FAISS index, best first."""
+        if query_embedding is None:
+            query_embedding = self.encode_query(query)
+        with span("retrieve.faiss_search", k=top_k) as s:
+            distances, ids = self.index.search(query_embedding, top_k)
+            keep = ids[0] >= 0
+            s.set(candidates=int(keep.sum()))
+            return ids[0][keep], to_scores(distances[0][keep], self.config)
+
+    def hits(self, ids, scores) -> list:
+        """Metadata rows for ranked chunk ids, with their `score`."""
+        with span("retrieve.metadata_lookup", rows=len(ids)):
+            rows = lookup(self.metadata, ids, scores)
+            for row in rows:
+                row["score"] = row.pop("distance")
+            return sorted(rows, key=lambda r: r["score"], reverse=True)
+
+
+def load_embedding_model(device: str = None, use_cache: bool = True, config: dict = EMBEDDING_CONFIG):
+    """(SentenceTransformer, embedding cache or None) for the configured model."""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(config["model"], device=device)
+    cache = EmbeddingCache(config["model"]) if use_cache else None
+    return model, cache
+
+
+def load_retriever(device: str = None, use_cache: bool = True, **kwargs) -> Retriever:
+    """Load the configured SentenceTransformer and build a Retriever."""
+    model, cache = load_embedding_model(device, use_cache, kwargs.get("config", EMBEDDING_CONFIG))
+    return Retriever(model, cache, **kwargs)
@@ -0,0 +1,323 @@
+# Named index shards (per site / per language) + parallel fan-out search
+# ---------------------------------------------------------------------------
+# Besides the single ITI index (data/iti_*), stage 4 can build named shards,
+# each a directory data/shards/<name>/ with its own FAISS index, Arrow
+# metadata, index info (which records the shard's sites / language) and BM25
+# index:
+#   python scraper/04_embedding.py --shard iti-en --lang en
+#   python scraper/04_embedding.py --shard iti-ar --lang ar
+#   python scraper/04_embedding.py --shard partner-x --chunks data/partner_x_chunks.parquet
+#   python scraper/04_embedding.py --shard news-archive --sites news.iti.gov.eg
+#
+# ShardedRetriever has the Retriever interface. A query is embedded once and
+# the relevant shards (by default: those of the query's language plus the
+# shards without one) are searched in a thread pool; FAISS releases the GIL
+# while it searches. The per-shard dense candidates are merged by cosine
+# score and the BM25 candidates by BM25 score (IDF is per shard, so these are
+# only roughly comparable across shards), and the two merged lists are fused
+# like a single index's: with one shard the ranking is the unsharded one.
+#
+# reload() loads shards that were added or rebuilt on disk and drops removed
+# ones without a restart (polled every `reload_interval_s` seconds by the
+# app). The shard set is swapped in one assignment, so queries in flight
+# finish on the shards they started with. The combined `version` changes on
+# every reload that changes a shard, which invalidates cached answers.
+
+import contextvars
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from index_store import info_path_for, load_info
+from query_encoder import BatchingEncoder
+from retrieval import EMBEDDING_CONFIG, HYBRID_CANDIDATES, Retriever, encode, fuse_rankings, load_embedding_model
+from tracing import span
+
+SHARDS_DIR = os.environ.get("ITI_SHARDS_DIR", "data/shards")
+LANGUAGES = ("ar", "en")
+DEFAULT_WORKERS = int(os.environ.get("ITI_SHARD_WORKERS", 8))
+
+_SHARD_NAME = re.compile(r"[A-Za-z0-9_.-]+")
+_ARABIC = re.compile(r"[\u0600-\u06FF]")
+_LATIN = re.compile(r"[A-Za-z]")
+
+
+# -------------------------------------------------------
+# Layout + building (stage 4 / 4b)
+# -------------------------------------------------------
+def shard_paths(name: str, shards_dir: str = SHARDS_DIR) -> dict:
+    """{"dir", "index", "metadata", "bm25"} of one shard (index info: info_path_for(index))."""
+    if not _SHARD_NAME.fullmatch(name):
+        raise ValueError(f"Invalid shard name {name!r} (letters, digits, '.', '_', '-')")
+    d = os.path.join(shards_dir, name)
+    return {"dir": d, "index": os.path.join(d, "faiss_index.bin"),
+            "metadata": os.path.join(d, "metadata.arrow"), "bm25": os.path.join(d, "bm25.npz")}
+
+
+def list_shards(shards_dir: str = SHARDS_DIR) -> list:
+    """Names of the built shards (directories holding an index info file), sorted."""
+    if not os.path.isdir(shards_dir):
+        return []
+    names = [name for name in os.listdir(shards_dir) if _SHARD_NAME.fullmatch(name)]
+    return sorted(name for name in names if os.path.exists(info_path_for(shard_paths(name, shards_dir)["index"])))
+
+
+def detect_language(text: str):
+    """"ar" or "en" by the majority script of the letters, None without letters."""
+    ar, en = len(_ARABIC.findall(str(text))), len(_LATIN.findall(str(text)))
+    if not ar and not en:
+        return None
+    return "ar" if ar >= en else "en"
+
+
+def site_of(url: str) -> str:
+    host = urlsplit(str(url)).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def add_shard_args(parser):
+    """Stage 4 / 4b options for building a shard instead of the main index."""
+    parser.add_argument("--shard", help="build the index shard data/shards/<name>/ instead of the main index")
+    parser.add_argument("--chunks", help="chunk file (Parquet: url, chunk, source_doc_index) to index "
+                                         "(default: the stage 3b / stage 3 output)")
+    parser.add_argument("--sites", nargs="+", help="shard only: keep chunks from these hosts (and their subdomains)")
+    parser.add_argument("--lang", choices=LANGUAGES, help="shard only: keep chunks in this language")
+
+
+def check_shard_args(parser, args):
+    if (args.sites or args.lang) and not args.shard:
+        parser.error("--sites / --lang select the chunks of a shard: add --shard NAME")
+    if args.shard:
+        try:
+            shard_paths(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+
+
+def select_chunks(chunks_df, sites: list = None, language: str = None):
+    """The chunks of one shard: from the given sites (host or subdomain) and / or in the given language."""
+    keep = np.ones(len(chunks_df), dtype=bool)
+    if sites:
+        wanted = [site_of(s if "//" in s else f"//{s}") for s in sites]
+        hosts = chunks_df["url"].map(site_of)
+        keep &= hosts.map(lambda h: any(h == s or h.endswith("." + s) for s in wanted)).to_numpy(dtype=bool)
+    if language:
+        keep &= (chunks_df["chunk"].map(detect_language) == language).to_numpy(dtype=bool)
+    return chunks_df[keep].reset_index(drop=True)
+
+
+def shard_info(args, chunks_path: str) -> dict:
+    """What the index info records about a shard (used for routing queries)."""
+    return {"name": args.shard, "sites": args.sites or [], "language": args.lang, "chunks": chunks_path}
+
+
+# -------------------------------------------------------
+# Searching
+# -------------------------------------------------------
+@dataclass(eq=False)   # compared / hashed by identity: one object per loaded version
+class Shard:
+    name: str
+    retriever: Retriever
+    info: dict
+    signature: tuple    # (mtime, size) of its files: a change means the shard was rebuilt
+
+    @property
+    def language(self):
+        return (self.info.get("shard") or {}).get("language")
+
+    def stats(self) -> dict:
+        meta = self.info.get("shard") or {}
+        return {"chunks": len(self.retriever.metadata), "version": self.retriever.version,
+                "language": meta.get("language"), "sites": meta.get("sites", []),
+                "bm25": self.retriever.sparse is not None}
+
+
+def shard_signature(paths: dict) -> tuple:
+    out = []
+    for path in (paths["index"], paths["metadata"], info_path_for(paths["index"]), paths["bm25"]):
+        try:
+            st = os.stat(path)
+            out.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            out.append(None)
+    return tuple(out)
+
+
+def merge_by_score(lists: list, depth: int):
+    """Merge per-shard (shard, (ids, scores)) lists by score: (ids, scores, owning shards) of the best `depth`."""
+    ids = np.concatenate([np.asarray(r[0], dtype="int64") for _, r in lists])
+    scores = np.concatenate([np.asarray(r[1], dtype="float64") for _, r in lists])
+    owners = np.concatenate([np.full(len(r[0]), n) for n, (_, r) in enumerate(lists)]).astype("int64")
+    order = np.argsort(-scores, kind="stable")
+    _, first = np.unique(ids[order], return_index=True)   # a chunk in two shards counts once
+    order = order[np.sort(first)][:depth]
+    return ids[order], scores[order], [lists[i][0] for i in owners[order]]
+
+
+class ShardedRetriever:
+    """Named Retrievers sharing one embedding model; searches fan out to them in a thread pool."""
+
+    def __init__(self, model, cache=None, shards_dir: str = SHARDS_DIR, names: list = None,
+                 config: dict = EMBEDDING_CONFIG, batch_window_ms: float = None, max_batch: int = 32,
+                 workers: int = DEFAULT_WORKERS, routing: str = "language", reload_interval_s: float = None):
+        self.model = model
+        self.cache = cache
+        self.config = config
+        self.shards_dir = shards_dir
+        self.names = names          # None: every shard in shards_dir (including ones added later)
+        self.routing = routing      # "language": skip shards of the other language; "all": every shard
+        self.shards = {}
+        self.version = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        report = self.reload()
+        if not self.shards:
+            raise FileNotFoundError(f"No index shards could be loaded from {shards_dir}: {report['failed']}")
+        self.workers = max(1, workers)
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="shard-search")
+        self.encoder = None
+        if batch_window_ms is not None:
+            self.encoder = BatchingEncoder(lambda texts: encode(model, texts, cache, config),
+                                           max_batch=max_batch, max_wait_ms=batch_window_ms)
+        if reload_interval_s:
+            threading.Thread(target=self._watch, args=(reload_interval_s,), name="shard-reload", daemon=True).start()
+
+    # -------------------------------------------------------
+    # Hot reload
+    # -------------------------------------------------------
+    def reload(self) -> dict:
+        """Load new / rebuilt shards and drop removed ones; returns {"added", "updated", "removed", "failed"}."""
+        with self._reload_lock:
+            current = self.shards
+            report = {"added": [], "updated": [], "removed": [], "failed": {}}
+            shards = {}
+            for name in self.names or list_shards(self.shards_dir):
+                try:
+                    paths = shard_paths(name, self.shards_dir)
+                    signature = shard_signature(paths)
+                    old = current.get(name)
+                    if old is not None and old.signature == signature:
+                        shards[name] = old
+                        continue
+                    retriever = Retriever(self.model, self.cache, paths["index"], paths["metadata"], self.config,
+                                          bm25_path=paths["bm25"])
+                    shards[name] = Shard(name, retriever, load_info(paths["index"]), signature)
+                    report["updated" if old is not None else "added"].append(name)
+                except Exception as e:   # keep serving the previous version of a shard that fails to load
+                    report["failed"][name] = f"{type(e).__name__}: {e}"
+                    if name in current:
+                        shards[name] = current[name]
+            if not shards and current:
+                report["failed"]["*"] = f"no shards found in {self.shards_dir}, keeping the loaded ones"
+                return report
+            report["removed"] = sorted(set(current) - set(shards))
+            self.shards = shards
+            self.version = hashlib.sha1(";".join(f"{n}={s.retriever.version}" for n, s in sorted(shards.items()))
+                                        .encode("utf-8")).hexdigest()[:16]
+            for key in ("added", "updated", "removed"):
+                if report[key]:
+                    print(f"🔄 Index shards {key}: {', '.join(report[key])}")
+            for name, error in report["failed"].items():
+                print(f"⚠️ Index shard {name} not loaded: {error}")
+            return report
+
+    def _watch(self, interval_s: float):
+        while not self._stop.wait(interval_s):
+            self.reload()
+
+    def close(self):
+        self._stop.set()
+        self.pool.shutdown(wait=False)
+
+    # -------------------------------------------------------
+    # Search
+    # -------------------------------------------------------
+    def encode_query(self, query: str):
+        with span("retrieve.encode_query", batched=self.encoder is not None):
+            if self.encoder is not None:
+                return self.encoder.encode(query)
+            return encode(self.model, query, self.cache, self.config)
+
+    def select(self, query: str, names: list = None) -> list:
+        """Shards to search: the named ones, else by the query's language (all of them if none matches)."""
+        current = self.shards   # one snapshot per query
+        if names:
+            unknown = sorted(set(names) - set(current))
+            if unknown:
+                raise ValueError(f"Unknown index shards {unknown} (loaded: {sorted(current)})")
+            return [current[n] for n in names]
+        selected = list(current.values())
+        language = detect_language(query) if self.routing == "language" else None
+        if language is not None:
+            routed = [s for s in selected if s.language in (None, language)]
+            selected = routed or selected
+        return selected
+
+    def search(self, query: str, top_k: int = 5, query_embedding=None, mode: str = "hybrid",
+               shards: list = None) -> list:
+        """Retriever.search over the selected shards; every hit also has its `shard` name."""
+        with span("retrieve.search", mode=mode, top_k=top_k) as s:
+            selected = self.select(query, shards)
+            s.set(shards=len(selected))
+            return self.hits(*self.rank(query, top_k, query_embedding, mode, selected))
+
+    def rank(self, query: str, top_k: int = 5, query_embedding=None, mode: str = "hybrid", selected: list = None):
+        """(chunk ids, scores, owning Shard of each id) of the top_k chunks over the selected shards, best first."""
+        selected = self.select(query) if selected is None else selected
+        if query_embedding is None and (mode != "sparse" or any(s.retriever.sparse is None for s in selected)):
+            query_embedding = self.encode_query(query)   # once, shared by every shard
+        per_shard = self.fan_out(selected, lambda r: r.rankings(query, top_k, query_embedding, mode))
+        with span("retrieve.merge_shards", shards=len(selected)):
+            merged, owner = {}, {}
+            for kind in ("dense", "bm25"):
+                lists = [(shard, out[kind]) for shard, out in zip(selected, per_shard) if kind in out]
+                if not lists:
+                    continue
+                ids, scores, owners = merge_by_score(lists, max(top_k, HYBRID_CANDIDATES))
+                merged[kind] = (ids, scores)
+                for i, shard in zip(ids.tolist(), owners):
+                    owner.setdefault(i, shard)
+        ids, scores = fuse_rankings(merged, top_k)
+        return ids, scores, [owner[i] for i in ids.tolist()]
+
+    def fan_out(self, selected: list, fn) -> list:
+        """fn(shard retriever) for every selected shard, in parallel; results in shard order."""
+        if len(selected) == 1:
+            return [self._search_shard(selected[0], fn)]
+        # each task gets a copy of the caller's context, so its spans nest under the request trace
+        futures = [self.pool.submit(contextvars.copy_context().run, self._search_shard, shard, fn)
+                   for shard in selected]
+        return [f.result() for f in futures]
+
+    @staticmethod
+    def _search_shard(shard: Shard, fn):
+        with span("retrieve.shard", shard=shard.name):
+            return fn(shard.retriever)
+
+    def hits(self, ids, scores, owners) -> list:
+        """Metadata rows (with `score` and `shard`) of ranked chunk ids, looked up in their own shard."""
+        ids, scores = np.asarray(ids), np.asarray(scores)
+        position = {i: n for n, i in enumerate(ids.tolist())}
+        rows = []
+        for shard in dict.fromkeys(owners):
+            mine = [n for n, o in enumerate(owners) if o is shard]
+            for row in shard.retriever.hits(ids[mine], scores[mine]):
+                row["shard"] = shard.name
+                rows.append(row)
+        return sorted(rows, key=lambda r: position[r["chunk_id"]])
+
+    def stats(self) -> dict:
+        return {"version": self.version, "routing": self.routing, "workers": self.workers,
+                "shards": {name: s.stats() for name, s in self.shards.items()}}
+
+
+def load_sharded_retriever(device: str = None, use_cache: bool = True, **kwargs) -> ShardedRetriever:
+    """Load the configured SentenceTransformer once and build a ShardedRetriever over the shard directory."""
+    model, cache = load_embedding_model(device, use_cache, kwargs.get("config", EMBEDDING_CONFIG))
+    return ShardedRetriever(model, cache, **kwargs)
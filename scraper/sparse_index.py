@@ -0,0 +1,115 @@
+# Sparse BM25 inverted index over the chunks + rank fusion with the dense index
+# ---------------------------------------------------------------------------
+# MiniLM often misses exact terms (track names, course codes, Arabic
+# keywords). Stage 4 builds a BM25 inverted index over the same chunks as the
+# FAISS index; the Retriever fuses both rankings with reciprocal rank fusion.
+#
+# Layout (data/iti_bm25.npz): postings grouped by term, CSC-style
+#   indptr[t]:indptr[t+1] -> docs (row positions) and precomputed BM25 weights
+# so scoring a query is one np.bincount over the postings of its terms.
+
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+BM25_PATH = "data/iti_bm25.npz"
+RRF_K = 60   # standard reciprocal rank fusion constant
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_ARABIC_DIACRITICS = re.compile(r"[\u064B-\u0652\u0640]")   # harakat + tatweel
+_ARABIC_FOLD = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ة": "ه", "ى": "ي"})
+_ARABIC_ARTICLE = re.compile(r"^(?:وال|بال|كال|فال|لل|ال)(?=\w{3})")   # "the" + attached prepositions
+
+
+def tokenize(text: str) -> list:
+    """
+    Lower-cased word tokens. Arabic letter variants are folded, diacritics
+    dropped and the definite article stripped (التسجيل -> تسجيل).
+    """
+    text = _ARABIC_DIACRITICS.sub("", str(text).lower()).translate(_ARABIC_FOLD)
+    return [_ARABIC_ARTICLE.sub("", t) for t in _TOKEN_RE.findall(text)]
+
+
+class BM25Index:
+    def __init__(self, chunk_ids, vocab, indptr, docs, weights, version: str = None):
+        self.version = version             # index_version() of the chunks it was built from
+        self.chunk_ids = np.asarray(chunk_ids, dtype="int64")
+        self.vocab = vocab                 # term -> term id
+        self.indptr = indptr
+        self.docs = docs
+        self.weights = weights
+
+    @classmethod
+    def build(cls, chunk_ids, texts, version: str = None, k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        vocab, term_ids, doc_ids, tfs = {}, [], [], []
+        doc_len = np.zeros(len(texts), dtype="float32")
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_len[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc)
+                tfs.append(tf)
+        term_ids = np.asarray(term_ids, dtype="int64")
+        doc_ids = np.asarray(doc_ids, dtype="int32")
+        tfs = np.asarray(tfs, dtype="float32")
+
+        df = np.bincount(term_ids, minlength=len(vocab)).astype("float32")
+        idf = np.log1p((len(texts) - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * doc_len / max(doc_len.mean(), 1.0))
+        weights = idf[term_ids] * tfs * (k1 + 1) / (tfs + norm[doc_ids])
+
+        order = np.argsort(term_ids, kind="stable")
+        indptr = np.zeros(len(vocab) + 1, dtype="int64")
+        indptr[1:] = np.cumsum(np.bincount(term_ids, minlength=len(vocab)))
+        return cls(chunk_ids, vocab, indptr, doc_ids[order], weights[order].astype("float32"), version)
+
+    def save(self, path: str = BM25_PATH):
+        terms = np.array(sorted(self.vocab, key=self.vocab.get), dtype=str)
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, chunk_ids=self.chunk_ids, terms=terms, indptr=self.indptr,
+                            docs=self.docs, weights=self.weights, version=np.array(self.version or ""))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = BM25_PATH) -> "BM25Index":
+        with np.load(path) as f:
+            vocab = {term: i for i, term in enumerate(f["terms"].tolist())}
+            return cls(f["chunk_ids"], vocab, f["indptr"], f["docs"], f["weights"], str(f["version"]) or None)
+
+    def __len__(self):
+        return len(self.chunk_ids)
+
+    def search(self, query: str, top_k: int = 20):
+        """(chunk ids, BM25 scores) of the best top_k chunks containing any query term."""
+        terms = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not terms:
+            return np.array([], dtype="int64"), np.array([], dtype="float32")
+        spans = [slice(self.indptr[t], self.indptr[t + 1]) for t in terms]
+        scores = np.bincount(np.concatenate([self.docs[s] for s in spans]),
+                             weights=np.concatenate([self.weights[s] for s in spans]),
+                             minlength=len(self.chunk_ids))
+        hits = np.flatnonzero(scores)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return self.chunk_ids[hits], scores[hits].astype("float32")
+
+
+def rrf_fuse(rankings, top_k: int, k: int = RRF_K):
+    """
+    Reciprocal rank fusion of several ranked chunk-id lists:
+    score(id) = sum over lists of 1 / (k + rank). Returns (ids, scores), best first.
+    Put the dense ranking first: it wins ties.
+    """
+    rankings = [np.asarray(r, dtype="int64") for r in rankings if len(r)]
+    if not rankings:
+        return np.array([], dtype="int64"), np.array([], dtype="float64")
+    ids = np.concatenate(rankings)
+    contrib = np.concatenate([1.0 / (k + np.arange(1, len(r) + 1)) for r in rankings])
+    unique, first, inverse = np.unique(ids, return_index=True, return_inverse=True)
+    scores = np.bincount(inverse, weights=contrib)
+    order = np.lexsort((first, -scores))[:top_k]   # ties: earlier list / rank first
+    return unique[order], scores[order]
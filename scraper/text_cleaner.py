@@ -0,0 +1,83 @@
+# Text cleaning rules for stage 2, compiled once + parallel over documents
+# ---------------------------------------------------------------------------
+# clean_text() applies the same ordered rules 02_cleaner.py always used, but:
+#   - every pattern is compiled once at import instead of per call/per rule
+#   - the "contact line" rule  .*@iti\.gov\.eg.*(Home|About|Services|News)
+#     backtracks quadratically on long lines (it was ~97% of stage 2). It is
+#     replaced by a per-line scan with the same result: from the start of a
+#     line up to the end of the last nav keyword that follows the first
+#     "@iti.gov.eg" on that line becomes " ".
+#   - the nav rules stay separate, ordered passes: a later rule can match
+#     text an earlier one created ("Previous News" after "News\b" ran), so
+#     one fused alternation changes the output (and is not faster in `re`).
+# clean_many() fans document batches out to a process pool.
+
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+CLEAN_PATH = "data/iti_sample_clean.parquet"   # stage 2 output: url, content, clean
+CLEAN_CHANGES_PATH = "data/iti_clean_changes.csv"   # stage 2 -> 3: pages whose clean text changed
+
+_CONTACT_AT = re.compile(r"@iti\.gov\.eg", re.IGNORECASE)
+_CONTACT_NAV = re.compile(r"Home|About|Services|News", re.IGNORECASE)
+
+NAV_PATTERNS = [
+    r"Home\b", r"About ITI\b", r"Services\b", r"Branches\b", r"News\b",
+    r"Programs\b", r"Post Graduates\b", r"Under Graduates\b",
+    r"Tech-Business\b", r"Tech Ambassadors\b", r"Juniors\b",
+    r"KEEP IN TOUCH", r"QUICK LINKS", r"Follow us",
+    r"Terms of Use", r"Privacy Policy",
+    r"Subscribe", r"Read more",
+    r"Previous News", r"Next News",
+    r"All rights reserved", r"©.*?\d{4}"
+]
+
+# (compiled pattern, replacement) in the order they are applied after the contact-line rule
+RULES = (
+    [(re.compile(r"http\S+|www\.\S+"), " "),          # links
+     (re.compile(r"<[^>]+>"), " ")]                   # HTML if exists
+    + [(re.compile(p, re.IGNORECASE), " ") for p in NAV_PATTERNS]   # noise (not information!)
+    + [(re.compile(r"[•\u2022\u25CF\u25A0]"), " "),   # weird symbols
+       (re.compile(r"\s{2,}"), " ")]                  # spaces repetitions
+)
+
+
+def _strip_contact_line(line: str) -> str:
+    at = _CONTACT_AT.search(line)
+    if at is None:
+        return line
+    last = None
+    m = _CONTACT_NAV.search(line, at.end())
+    while m:   # keywords can overlap ("ServiceServices"), so step one char, not one match
+        last = m
+        m = _CONTACT_NAV.search(line, m.start() + 1)
+    return line if last is None else " " + line[last.end():]
+
+
+def strip_contact_lines(text: str) -> str:
+    if _CONTACT_AT.search(text) is None:
+        return text
+    return "\n".join(_strip_contact_line(line) for line in text.split("\n"))
+
+
+def clean_text(text) -> str:
+    if not isinstance(text, str):
+        return ""
+    t = strip_contact_lines(text)
+    for pattern, repl in RULES:
+        t = pattern.sub(repl, t)
+    return t.strip()
+
+
+def _clean_batch(texts):
+    return [clean_text(t) for t in texts]
+
+
+def clean_many(texts, workers: int = 1, batch_size: int = 16) -> list:
+    """clean_text over many documents; workers > 1 cleans batches in a process pool (same order)."""
+    texts = list(texts)
+    if workers <= 1 or len(texts) <= batch_size:
+        return _clean_batch(texts)
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [t for batch in pool.map(_clean_batch, batches) for t in batch]
@@ -0,0 +1,221 @@
+# Per-request tracing + Prometheus metrics for the RAG hot path
+# ---------------------------------------------------------------------------
+# Each stage of a request (query encoding, answer cache lookup, FAISS / BM25
+# search, fusion, metadata lookup, generation, answer cleanup) runs inside
+# `with span("name") as s:`; s.set(...) attaches counts (candidates, prompt /
+# generated tokens, cache hit). Spans nest per thread / task (contextvars):
+# the outermost one is the request trace.
+#
+#   ITI_TRACING=1          record span durations into latency histograms and
+#                          counters, exported in Prometheus text format
+#                          (render_prometheus(); GET /metrics on api_server.py)
+#   ITI_TRACE_LOG=<path>   also append every finished request trace, with its
+#                          span tree, as one JSON line (implies ITI_TRACING)
+#
+# Disabled (the default), span() returns one shared no-op object: the cost is
+# a function call and a flag check (see benchmarks/tracing_overhead.py).
+
+import bisect
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current = contextvars.ContextVar("iti_current_span", default=None)
+_trace_ids = itertools.count(1)
+_ID_PREFIX = f"{os.getpid():x}-{int(time.time()):x}-"   # unique across processes / restarts
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "attrs", "parent", "children", "trace_id", "start", "seconds")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.children = []
+        self.parent = None
+        self.start = None
+        self.seconds = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.parent = _current.get()
+        if self.parent is not None:
+            self.trace_id = self.parent.trace_id
+            self.parent.children.append(self)
+        else:
+            self.trace_id = _ID_PREFIX + format(next(_trace_ids), "x")
+        _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.attrs["error"] = exc_type.__name__
+        # set, not reset(token): a streamed answer's generator may be closed from another context
+        _current.set(self.parent)
+        self.tracer.finish(self)
+        return False
+
+    def as_dict(self) -> dict:
+        return {"name": self.name, "ms": round(self.seconds * 1000, 3), **self.attrs,
+                **({"children": [c.as_dict() for c in self.children]} if self.children else {})}
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last one: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1   # first bucket with value <= bound
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float):
+        """Upper bound of the bucket holding the q-quantile (Prometheus histogram_quantile without interpolation)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Tracer:
+    def __init__(self, enabled: bool = False, log_path: str = None):
+        self.log_path = log_path
+        self.enabled = enabled or bool(log_path)
+        self._lock = threading.Lock()
+        self.span_seconds = {}   # span name -> Histogram
+        self.counters = {}       # (metric name, sorted label items) -> value
+        self._log = None         # trace log file, opened on the first trace (line-buffered)
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        return cls(os.environ.get("ITI_TRACING", "0") not in ("", "0"), os.environ.get("ITI_TRACE_LOG") or None)
+
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def count(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        """Record a stage duration measured elsewhere (e.g. tokenisation inside generation)."""
+        if not self.enabled or seconds is None:
+            return
+        with self._lock:
+            self._histogram(name).observe(seconds)
+
+    def _histogram(self, name: str) -> Histogram:
+        hist = self.span_seconds.get(name)
+        if hist is None:
+            hist = self.span_seconds[name] = Histogram()
+        return hist
+
+    def finish(self, span: Span):
+        with self._lock:
+            self._histogram(span.name).observe(span.seconds)
+            if span.parent is None and self.log_path:
+                line = json.dumps({"trace_id": span.trace_id, "time": time.time(), **span.as_dict()},
+                                  ensure_ascii=False, default=str)
+                if self._log is None:
+                    self._log = open(self.log_path, "a", encoding="utf-8", buffering=1)
+                self._log.write(line + "\n")
+
+    # -------------------------------------------------------
+    # Export
+    # -------------------------------------------------------
+    def render_prometheus(self) -> str:
+        lines = ["# HELP iti_span_seconds Duration of each RAG stage.", "# TYPE iti_span_seconds histogram"]
+        with self._lock:
+            for name, hist in sorted(self.span_seconds.items()):
+                cumulative = 0
+                for bound, n in zip(hist.buckets + (float("inf"),), hist.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'iti_span_seconds_bucket{{span="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'iti_span_seconds_sum{{span="{name}"}} {hist.sum:.6f}')
+                lines.append(f'iti_span_seconds_count{{span="{name}"}} {hist.count}')
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Per-span count / mean / p95 (bucket bound) in ms, and the counters."""
+        with self._lock:
+            spans = {name: {"count": h.count, "mean_ms": round(h.sum / h.count * 1000, 3),
+                            "p95_ms_le": h.quantile(0.95) * 1000}
+                     for name, h in sorted(self.span_seconds.items()) if h.count}
+            counters = {name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""): value
+                        for (name, labels), value in sorted(self.counters.items())}
+        return {"spans": spans, "counters": counters}
+
+
+TRACER = Tracer.from_env()
+
+
+def span(name: str, **attrs):
+    """`with span("retrieve.faiss_search", k=20) as s: ...` (a no-op unless tracing is enabled)."""
+    if not TRACER.enabled:
+        return NOOP_SPAN
+    return Span(TRACER, name, attrs)
+
+
+def count(name: str, value: float = 1, **labels):
+    TRACER.count(name, value, **labels)
+
+
+def observe(name: str, seconds: float):
+    TRACER.observe(name, seconds)
+
+
+def configure(enabled: bool = True, log_path: str = None) -> Tracer:
+    """Replace the process-wide tracer (benchmarks / scripts; the apps use the environment variables)."""
+    global TRACER
+    TRACER = Tracer(enabled, log_path)
+    return TRACER
+
+
+def tracer() -> Tracer:
+    return TRACER
@@ -0,0 +1,76 @@
+"""
+Golden-output test for the stage 2 cleaner (scraper/text_cleaner.py).
+
+Each fixture page is cleaned by text_cleaner.clean_text and compared with the
+output of the original 02_cleaner.clean_text (kept verbatim in
+benchmarks/cleaner_throughput.py) and with the recorded expected text.
+
+Run: python -m pytest tests/
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "scraper"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from cleaner_throughput import legacy_clean_text  # noqa: E402
+from text_cleaner import clean_many, clean_text  # noqa: E402
+
+# name -> (page text, expected clean text)
+PAGES = {
+    "english_nav": (
+        "17002ITIinfo@iti.gov.egHomeAbout ITIServicesBranchesNews\n"
+        "HomeAbout ITIServicesPost GraduatesUnder GraduatesTech-BusinessJuniors\n"
+        "The ITI Talent Summit connects industry with future tech professionals.Read MoreNext News",
+        "HomeAbout ITIServicesPost GraduatesUnder GraduatesTech-Business "
+        "The ITI Talent Summit connects industry with future tech professionals. Next",
+    ),
+    "arabic_nav": (
+        "الرئيسية\nHome\nعن المعهد About ITI\n"
+        "يقدم معهد تكنولوجيا المعلومات برامج تدريبية مجانية للخريجين.\n"
+        "QUICK LINKS • Follow us\n© جميع الحقوق محفوظة 2024",
+        "الرئيسية عن المعهد يقدم معهد تكنولوجيا المعلومات برامج تدريبية مجانية للخريجين.",
+    ),
+    "contact_lines": (
+        "Call 17002 or mail info@iti.gov.eg Home About Services News\n"
+        "The 9-month program starts in October.\n"
+        "admissions@ITI.gov.eg | About us\n"
+        "Apply online before the deadline.",
+        "The 9-month program starts in October. us\nApply online before the deadline.",
+    ),
+    "emails_phones": (
+        "Contact: +20 2 3535 5555, hr@iti.gov.eg and careers@example.com\n"
+        "Visit https://iti.gov.eg/apply or www.iti.gov.eg for details.",
+        "Contact: +20 2 3535 5555, hr@iti.gov.eg and careers@example.com\nVisit or for details.",
+    ),
+    "html_and_symbols": (
+        "<p>Intake 45</p> ● Web development ■ Data science • AI\n\n\n"
+        "All rights reserved Terms of Use Privacy Policy",
+        "Intake 45 Web development Data science AI",
+    ),
+    "overlapping_keywords": (
+        "x@iti.gov.eg ServiceServices tail\nPrevious News Subscribe now",
+        "tail\nPrevious now",
+    ),
+}
+
+
+@pytest.mark.parametrize("name", sorted(PAGES))
+def test_matches_golden_output(name):
+    page, expected = PAGES[name]
+    assert clean_text(page) == expected
+    assert clean_text(page) == legacy_clean_text(page)
+
+
+@pytest.mark.parametrize("value", [None, float("nan"), 17002])
+def test_non_text_cleans_to_empty(value):
+    assert clean_text(value) == ""
+    assert legacy_clean_text(value) == ""
+
+
+def test_pool_keeps_order_and_output():
+    pages = [page for page, _ in PAGES.values()] * 4
+    assert clean_many(pages, workers=2, batch_size=3) == [legacy_clean_text(p) for p in pages]
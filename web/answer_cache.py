@@ -0,0 +1,102 @@
+# Answer cache for repeated and near-duplicate questions
+# ---------------------------------------------------------------------------
+# Tier 1: exact match on the normalised question text.
+# Tier 2: cosine similarity between query embeddings above a threshold.
+# Entries carry the index version they were answered from, so rebuilding the
+# index invalidates them; TTL + LRU bound their age and number.
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    q = re.sub(r"[^\w\s]", " ", query.lower())
+    return re.sub(r"\s+", " ", q).strip()
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 24 * 3600,
+                 similarity_threshold: float = 0.92):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.threshold = similarity_threshold
+        self._entries = OrderedDict()   # normalised query -> entry dict (LRU order)
+        self._lock = threading.Lock()
+        self._matrix, self._keys = None, []   # stacked vectors for the semantic tier
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    # ---------------------------------------------------
+    def _expired(self, entry, version) -> bool:
+        return entry["version"] != version or time.time() - entry["created"] > self.ttl
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        self._matrix = None
+
+    def _semantic_matrix(self):
+        if self._matrix is None:
+            self._keys = [k for k, e in self._entries.items() if e["vector"] is not None]
+            self._matrix = (np.stack([self._entries[k]["vector"] for k in self._keys])
+                            if self._keys else None)
+        return self._matrix
+
+    def _hit(self, key, counter: str):
+        entry = self._entries[key]
+        self._entries.move_to_end(key)
+        setattr(self, counter, getattr(self, counter) + 1)
+        self.saved_seconds += entry["seconds"]
+        return entry["value"]
+
+    # ---------------------------------------------------
+    def get(self, query: str, query_vector=None, version=None):
+        """Cached value for `query` answered from index `version`, or None."""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry, version):
+                    return self._hit(key, "exact_hits")
+                self._drop(key)
+
+            if query_vector is not None:
+                matrix = self._semantic_matrix()
+                if matrix is not None:
+                    sims = matrix @ np.asarray(query_vector, dtype="float32").ravel()
+                    for i in np.argsort(-sims):
+                        if sims[i] < self.threshold:
+                            break
+                        cand = self._keys[i]
+                        if cand in self._entries and not self._expired(self._entries[cand], version):
+                            return self._hit(cand, "semantic_hits")
+            self.misses += 1
+            return None
+
+    def put(self, query: str, value, query_vector=None, version=None, seconds: float = 0.0):
+        """Store `value`; `seconds` is what producing it cost (counted as saved on each hit)."""
+        key = normalize_query(query)
+        vector = None if query_vector is None else np.asarray(query_vector, dtype="float32").ravel()
+        with self._lock:
+            self._entries[key] = {"value": value, "vector": vector, "version": version,
+                                  "created": time.time(), "seconds": seconds}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "generation_seconds_saved": round(self.saved_seconds, 2),
+        }
@@ -0,0 +1,71 @@
+# HTTP client for api_server.py with the same interface as warmup.AppLoader
+# (retrieve_context / answer / stream_answer / stats / readiness / reload_index),
+# so the Streamlit page can run either in-process or as a thin client of a
+# shared model server.
+
+import json
+
+import httpx
+
+from warmup import NotReady
+
+
+class ServerBusy(RuntimeError):
+    """The API server rejected the request because its queue is full."""
+
+
+class RAGClient:
+    def __init__(self, base_url: str, timeout: float = 300.0):
+        self.base_url = base_url.rstrip("/")
+        self.http = httpx.Client(base_url=self.base_url, timeout=timeout)
+
+    def _check(self, resp):
+        if resp.status_code == 503:
+            body = resp.json()
+            if body.get("loading"):
+                raise NotReady(body["error"])
+            raise ServerBusy(body.get("error", "server busy"))
+        resp.raise_for_status()
+
+    def _post(self, path: str, payload: dict) -> dict:
+        resp = self.http.post(path, json=payload)
+        self._check(resp)
+        return resp.json()
+
+    def retrieve_context(self, query: str, top_k: int = None, shards: list = None):
+        out = self._post("/retrieve", {"query": query, "top_k": top_k, "shards": shards})
+        return out["context"], out["source"]
+
+    def answer(self, query: str, top_k: int = None) -> dict:
+        return self._post("/answer", {"query": query, "top_k": top_k})
+
+    def stream_answer(self, query: str, top_k: int = None):
+        with self.http.stream("POST", "/answer", json={"query": query, "top_k": top_k, "stream": True}) as resp:
+            if resp.status_code != 200:
+                resp.read()
+            self._check(resp)
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("type") == "error":
+                    raise RuntimeError(event["error"])
+                yield event
+
+    def readiness(self) -> dict:
+        """Per-component loading status of the server (GET /ready answers 503 until retrieval is loaded)."""
+        resp = self.http.get("/ready")
+        if resp.status_code not in (200, 503):
+            resp.raise_for_status()
+        return resp.json()
+
+    def reload_index(self) -> dict:
+        """Make the server load index shards added / rebuilt / removed on disk now."""
+        resp = self.http.post("/reload")
+        self._check(resp)
+        return resp.json()
+
+    def stats(self) -> dict:
+        resp = self.http.get("/health")
+        self._check(resp)
+        return resp.json()
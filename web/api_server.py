@@ -0,0 +1,290 @@
+"""
+Headless RAG API: one process holds the embedding model, FAISS index and Qwen,
+and any number of UIs / clients call it over HTTP.
+
+Run: python web/api_server.py --port 8000
+     ITI_API_URL=http://localhost:8000 streamlit run web/st.py
+
+Endpoints (JSON bodies):
+  POST /retrieve  {"query", "top_k"?, "budget_tokens"?, "shards"?}
+                                                   -> {"context", "source", "sources", "tokens"}
+  POST /answer    {"query", "top_k"?, "stream"?}   -> {"answer", "context", "source", "sources", "cached",
+                                                       "metrics", "retrieval_only"}
+                  with "stream": true the response is newline-delimited JSON events
+                  ({"type": "token", "text"} ... then {"type": "done", ...})
+  GET  /health                                     -> liveness: queue, cache and loading statistics
+  GET  /ready                                      -> per-component load status / time / memory;
+                                                      200 once retrieval is loaded, 503 before
+  GET  /metrics                                    -> Prometheus text: per-stage latency histograms,
+                                                      token / cache counters (needs ITI_TRACING=1)
+  POST /reload                                     -> load index shards added / rebuilt / removed on
+                                                      disk now ({"added", "updated", "removed", "failed"})
+
+The server listens immediately and loads the models in the background
+(warmup.AppLoader): retrieval first, then Qwen. Until retrieval is loaded,
+/retrieve and /answer return 503 + Retry-After; while Qwen loads, /answer
+returns the retrieved context ("retrieval_only": true).
+
+Each endpoint has its own admission queue: at most `concurrency` requests run at
+once, at most `max_waiting` wait for a slot; anything beyond that is rejected
+with 503 + Retry-After instead of piling up (backpressure).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import tornado.web
+from tornado.iostream import StreamClosedError
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraper"))
+from tracing import tracer  # noqa: E402
+from warmup import AppLoader, NotReady  # noqa: E402
+
+
+class Overloaded(Exception):
+    pass
+
+
+class AdmissionQueue:
+    """Bounded concurrency + bounded waiting room."""
+
+    def __init__(self, name: str, concurrency: int, max_waiting: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self._sem = asyncio.Semaphore(concurrency)
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.completed = 0
+
+    async def __aenter__(self):
+        if self._sem.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise Overloaded(self.name)
+        self.waiting += 1
+        try:
+            await self._sem.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.running -= 1
+        self.completed += 1
+        self._sem.release()
+
+    def stats(self) -> dict:
+        return {"running": self.running, "waiting": self.waiting, "concurrency": self.concurrency,
+                "max_waiting": self.max_waiting, "completed": self.completed, "rejected": self.rejected}
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, state):
+        self.state = state
+
+    def write_json(self, obj, status: int = 200):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(obj, ensure_ascii=False))
+
+    def json_body(self) -> dict:
+        try:
+            body = json.loads(self.request.body or b"{}")
+        except json.JSONDecodeError:
+            raise tornado.web.HTTPError(400, reason="invalid JSON")
+        if not str(body.get("query", "")).strip():
+            raise tornado.web.HTTPError(400, reason="missing 'query'")
+        return body
+
+    @staticmethod
+    def top_k(body):
+        """Ranked candidates for context packing (None: the pipeline's default)."""
+        return int(body["top_k"]) if body.get("top_k") is not None else None
+
+    def overloaded(self, name):
+        self.set_header("Retry-After", "1")
+        self.write_json({"error": f"{name} queue is full, retry later"}, status=503)
+
+    def not_ready(self, error):
+        self.set_header("Retry-After", "5")
+        self.write_json({"error": str(error), "loading": True}, status=503)
+
+    async def run_blocking(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.state["executor"], fn, *args)
+
+
+class RetrieveHandler(BaseHandler):
+    async def post(self):
+        body = self.json_body()
+        try:
+            async with self.state["retrieve_queue"]:
+                budget = int(body["budget_tokens"]) if body.get("budget_tokens") is not None else None
+                shards = body.get("shards")
+                shards = [shards] if isinstance(shards, str) else shards
+                if shards is not None and not (isinstance(shards, list) and all(isinstance(n, str) for n in shards)):
+                    raise ValueError("'shards' must be a list of shard names")
+                packed = await self.run_blocking(
+                    lambda: self.state["pipeline"].pack_context(body["query"], self.top_k(body), budget,
+                                                                shards=shards))
+        except Overloaded as e:
+            return self.overloaded(str(e))
+        except NotReady as e:
+            return self.not_ready(e)
+        except ValueError as e:   # bad / unknown shard names, or an unsharded index
+            return self.write_json({"error": str(e)}, status=400)
+        self.write_json({"context": packed.text, "source": packed.source_url, "sources": packed.sources(),
+                         "tokens": packed.tokens})
+
+
+class AnswerHandler(BaseHandler):
+    _stop_events = None   # set -> the streaming generator stops at its next event
+
+    async def post(self):
+        body = self.json_body()
+        pipeline = self.state["pipeline"]
+        try:
+            async with self.state["answer_queue"]:
+                if not body.get("stream"):
+                    result = await self.run_blocking(pipeline.answer, body["query"], self.top_k(body))
+                    return self.write_json(result)
+                events = self._events(pipeline.stream_answer(body["query"], self.top_k(body)))
+                self.set_header("Content-Type", "application/x-ndjson")
+                try:
+                    async for event in events:
+                        self.write(json.dumps(event, ensure_ascii=False) + "\n")
+                        await self.flush()
+                finally:
+                    await events.aclose()   # stops the generator (and frees its scheduler slot) on disconnect
+                self.finish()
+        except Overloaded as e:
+            return self.overloaded(str(e))
+        except NotReady as e:
+            return self.not_ready(e)
+        except StreamClosedError:
+            pass  # client went away
+
+    def on_connection_close(self):
+        if self._stop_events is not None:
+            self._stop_events.set()
+
+    async def _events(self, generator):
+        """
+        Run a blocking event generator in the executor and yield its events here.
+        When the consumer stops (client disconnected, handler exited), the generator is
+        closed in its own thread, so its cleanup (`finally`) runs and generation stops.
+        """
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        done = object()
+        stop = self._stop_events = threading.Event()
+
+        def pump():
+            try:
+                for event in generator:
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(events.put_nowait, event)
+            except Exception as e:
+                loop.call_soon_threadsafe(events.put_nowait, {"type": "error", "error": str(e)})
+            finally:
+                generator.close()
+                loop.call_soon_threadsafe(events.put_nowait, done)
+
+        loop.run_in_executor(self.state["executor"], pump)
+        try:
+            while True:
+                event = await events.get()
+                if event is done:
+                    return
+                yield event
+        finally:
+            stop.set()
+
+
+class ReadyHandler(BaseHandler):
+    def get(self):
+        pipeline = self.state["pipeline"]
+        if hasattr(pipeline, "readiness"):
+            readiness = pipeline.readiness()
+        else:   # a RAGPipeline loaded up front
+            readiness = {"ready": True, "loading": False, "retrieval_ready": True,
+                         "generation_ready": pipeline.generation_ready}
+        self.write_json(readiness, status=200 if readiness["retrieval_ready"] else 503)
+
+
+class ReloadHandler(BaseHandler):
+    async def post(self):
+        try:
+            report = await self.run_blocking(self.state["pipeline"].reload_index)
+        except NotReady as e:
+            return self.not_ready(e)
+        except ValueError as e:   # single, unsharded index
+            return self.write_json({"error": str(e)}, status=400)
+        self.write_json(report)
+
+
+class MetricsHandler(BaseHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.finish(tracer().render_prometheus())
+
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        self.write_json({
+            "status": "ok",
+            "retrieve_queue": self.state["retrieve_queue"].stats(),
+            "answer_queue": self.state["answer_queue"].stats(),
+            **self.state["pipeline"].stats(),
+        })
+
+
+def make_app(pipeline, answer_concurrency: int = None, retrieve_concurrency: int = 4, max_waiting: int = 16):
+    # by default admit as many answers as the generation scheduler can batch together
+    if answer_concurrency is None:
+        answer_concurrency = getattr(pipeline, "max_concurrent_generations", 1)
+    state = {
+        "pipeline": pipeline,
+        "answer_queue": AdmissionQueue("answer", answer_concurrency, max_waiting),
+        "retrieve_queue": AdmissionQueue("retrieve", retrieve_concurrency, max_waiting),
+        "executor": ThreadPoolExecutor(max_workers=answer_concurrency + retrieve_concurrency),
+    }
+    return tornado.web.Application([
+        (r"/retrieve", RetrieveHandler, {"state": state}),
+        (r"/answer", AnswerHandler, {"state": state}),
+        (r"/health", HealthHandler, {"state": state}),
+        (r"/ready", ReadyHandler, {"state": state}),
+        (r"/metrics", MetricsHandler, {"state": state}),
+        (r"/reload", ReloadHandler, {"state": state}),
+    ])
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("ITI_API_PORT", 8000)))
+    parser.add_argument("--answer-concurrency", type=int, default=None,
+                        help="generations running at once (default: the scheduler's ITI_GEN_MAX_BATCH)")
+    parser.add_argument("--retrieve-concurrency", type=int, default=4)
+    parser.add_argument("--max-waiting", type=int, default=16, help="queued requests per endpoint before 503")
+    parser.add_argument("--no-llm", action="store_true", help="retrieval-only server: never load Qwen")
+    args = parser.parse_args()
+
+    # listen first, load in the background (GET /ready reports progress)
+    pipeline = AppLoader(load_generation=not args.no_llm)
+    app = make_app(pipeline, args.answer_concurrency, args.retrieve_concurrency, args.max_waiting)
+    app.listen(args.port, address=args.host)
+    print(f"✅ RAG API listening on http://{args.host}:{args.port} (loading components in the background)")
+    pipeline.start()
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,197 @@
+# Token-budgeted context assembly for the Qwen prompt
+# ---------------------------------------------------------------------------
+# retrieve_context used to join the top 2 chunks and cut the text at 450
+# characters, often mid-word and mid-fact, while still paying prompt tokens for
+# the partial chunk. ContextPacker instead:
+#   - measures every chunk in Qwen tokenizer tokens (an over-counting estimate
+#     until the LLM, and with it the tokenizer, is loaded)
+#   - walks the ranked candidates best first and keeps whole chunks while they
+#     fit the prompt-token budget; a chunk that does not fit is skipped, a
+#     smaller lower-ranked one may still fit
+#   - skips chunks that are mostly already in the context (share of their
+#     3-word shingles covered by the chunks kept so far >= `redundancy`)
+#   - merges kept chunks of the same page (source_doc_index) into one passage,
+#     in page order when their chunk overlap shows they are neighbours, so the
+#     overlapping words are sent once
+# Only the best chunk is ever truncated: when it alone exceeds the budget, it
+# is cut at the last sentence (or word) boundary that fits.
+
+import os
+import re
+from dataclasses import dataclass, field
+
+DEFAULT_BUDGET_TOKENS = int(os.environ.get("ITI_CONTEXT_TOKENS", 256))
+DEFAULT_CANDIDATES = int(os.environ.get("ITI_CONTEXT_CANDIDATES", 8))
+DEFAULT_REDUNDANCY = 0.6
+PASSAGE_SEPARATOR = "\n\n"
+MIN_OVERLAP_WORDS = 3    # chunk overlap (stage 3: 12 tokens) that marks two chunks as neighbours
+MAX_OVERLAP_WORDS = 40
+
+_SENTENCE_END = re.compile(r"(?<=[.!?؟])\s+")
+
+
+def approx_token_counter():
+    from chunking import approx_tokens
+    return approx_tokens
+
+
+def tokenizer_counter(tokenizer):
+    """Exact prompt-token count with the generation model's tokenizer."""
+    return lambda text: len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+@dataclass
+class Passage:
+    text: str
+    urls: list            # every source URL of the merged chunks (near-duplicates included), best first
+    chunk_ids: list
+    source_doc_index: int
+    rank: int             # best rank among its chunks (0 = top hit)
+    tokens: int = 0
+
+
+@dataclass
+class PackedContext:
+    text: str
+    passages: list = field(default_factory=list)
+    tokens: int = 0
+    budget: int = 0
+    candidates: int = 0
+    redundant: int = 0    # candidates skipped as already covered
+    over_budget: int = 0  # candidates skipped because they did not fit
+    truncated: bool = False
+
+    @property
+    def source_url(self) -> str:
+        return self.passages[0].urls[0] if self.passages and self.passages[0].urls else ""
+
+    def sources(self) -> list:
+        """Per-passage citations: [{"urls", "chunk_ids", "tokens"}], in context order."""
+        return [{"urls": p.urls, "chunk_ids": [int(c) for c in p.chunk_ids], "tokens": p.tokens}
+                for p in self.passages]
+
+    def stats(self) -> dict:
+        return {"tokens": self.tokens, "budget": self.budget, "passages": len(self.passages),
+                "chunks": sum(len(p.chunk_ids) for p in self.passages), "candidates": self.candidates,
+                "redundant": self.redundant, "over_budget": self.over_budget, "truncated": self.truncated}
+
+
+def _hit_urls(hit) -> list:
+    urls = [u for u in str(hit.get("urls") or "").split(";") if u]
+    if hit.get("url") and hit["url"] not in urls:
+        urls.insert(0, hit["url"])
+    return urls
+
+
+def word_overlap(a: str, b: str) -> int:
+    """Number of words at the end of `a` that start `b` (the splitter's chunk overlap), 0 if under the minimum."""
+    tail, head = a.split()[-MAX_OVERLAP_WORDS:], b.split()[:MAX_OVERLAP_WORDS]
+    for n in range(min(len(tail), len(head)), MIN_OVERLAP_WORDS - 1, -1):
+        if tail[-n:] == head[:n]:
+            return n
+    return 0
+
+
+def merge_neighbours(texts: list) -> str:
+    """Join chunks of one page; neighbouring chunks are put in page order with their overlap sent once."""
+    pieces = list(texts)
+    merged = True
+    while merged and len(pieces) > 1:
+        merged = False
+        for i in range(len(pieces)):
+            for j in range(len(pieces)):
+                if i == j:
+                    continue
+                n = word_overlap(pieces[i], pieces[j])
+                if n:
+                    rest = pieces[j].split(None, n)[n] if len(pieces[j].split()) > n else ""
+                    pieces[i] = f"{pieces[i]} {rest}".strip()
+                    del pieces[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return PASSAGE_SEPARATOR.join(pieces)
+
+
+class ContextPacker:
+    def __init__(self, count_tokens=None, budget_tokens: int = DEFAULT_BUDGET_TOKENS,
+                 candidates: int = DEFAULT_CANDIDATES, redundancy: float = DEFAULT_REDUNDANCY):
+        self.count_tokens = count_tokens or approx_token_counter()
+        self.budget_tokens = budget_tokens
+        self.candidates = candidates    # ranked hits to consider
+        self.redundancy = redundancy
+
+    def truncate(self, text: str, budget: int) -> str:
+        """Longest prefix of whole sentences (else whole words) within `budget` tokens."""
+        sentences = _SENTENCE_END.split(text)
+        out = ""
+        for s in sentences:
+            candidate = f"{out} {s}".strip()
+            if self.count_tokens(candidate) > budget:
+                break
+            out = candidate
+        if out:
+            return out
+        words = text.split()
+        lo, hi = 0, len(words)
+        while lo < hi:   # most words that fit
+            mid = (lo + hi + 1) // 2
+            if self.count_tokens(" ".join(words[:mid])) <= budget:
+                lo = mid
+            else:
+                hi = mid - 1
+        return " ".join(words[:lo])
+
+    def pack(self, hits: list, budget_tokens: int = None) -> PackedContext:
+        """Pack ranked hits (dicts with chunk_id, url, urls, chunk, source_doc_index), best first."""
+        from near_dedup import shingles
+
+        budget = budget_tokens or self.budget_tokens
+        packed = PackedContext("", budget=budget, candidates=len(hits))
+        sep_tokens = self.count_tokens(PASSAGE_SEPARATOR)
+        kept, covered, used = [], set(), 0
+        for rank, hit in enumerate(hits):
+            text = str(hit["chunk"]).strip()
+            if not text:
+                continue
+            grams = shingles(text)
+            if grams and len(grams & covered) / len(grams) >= self.redundancy:
+                packed.redundant += 1
+                continue
+            cost = self.count_tokens(text) + (sep_tokens if kept else 0)
+            if used + cost > budget:
+                if kept:
+                    packed.over_budget += 1
+                    continue
+                text = self.truncate(text, budget)   # the best chunk alone is too long
+                cost = self.count_tokens(text)
+                packed.truncated = True
+                if not text:
+                    break
+            kept.append((rank, hit, text))
+            covered |= grams
+            used += cost
+
+        # one passage per page, pages in the order of their best chunk
+        groups = {}
+        for rank, hit, text in kept:
+            key = (hit.get("source_doc_index"), hit.get("url"))
+            groups.setdefault(key, []).append((rank, hit, text))
+        for (doc_index, _), members in groups.items():
+            urls = []
+            for _, hit, _ in members:
+                urls += [u for u in _hit_urls(hit) if u not in urls]
+            text = merge_neighbours([t for _, _, t in members])
+            packed.passages.append(Passage(text, urls, [h["chunk_id"] for _, h, _ in members], doc_index,
+                                           members[0][0], self.count_tokens(text)))
+
+        packed.text = PASSAGE_SEPARATOR.join(p.text for p in packed.passages)
+        packed.tokens = self.count_tokens(packed.text) if packed.text else 0
+        # token counts of joined text can differ from the sum of the parts by a token or two
+        while packed.tokens > budget and len(packed.passages) > 1:
+            packed.passages.pop()
+            packed.over_budget += 1
+            packed.text = PASSAGE_SEPARATOR.join(p.text for p in packed.passages)
+            packed.tokens = self.count_tokens(packed.text)
+        return packed
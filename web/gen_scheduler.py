@@ -0,0 +1,349 @@
+# Continuous-batching generation scheduler shared by all concurrent requests
+# ---------------------------------------------------------------------------
+# Each request used to run its own model.generate() with batch size 1, so
+# concurrent users queued behind each other. Here one worker thread owns the
+# model and runs a token-by-token decode loop over a batch of active
+# sequences:
+#   - new prompts are left-padded, prefilled together and merged into the
+#     running batch between decode steps (no waiting for the batch to drain)
+#   - finished sequences (EOS, max_new_tokens, first complete sentence, or
+#     the client went away) leave the batch immediately, and left padding
+#     that no remaining sequence needs is trimmed from the KV cache
+#   - every sequence keeps its own sampling settings (temperature, top_k,
+#     top_p, repetition_penalty, do_sample) and max_new_tokens
+#   - with a PrefixCache, prompts starting with the static instruction block
+#     reuse its KV cache and only prefill their own tokens; the rows are laid
+#     out as [prefix | padding | prompt tail], padding masked out
+
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import torch
+from transformers import DynamicCache
+
+from generation import SAMPLING, GenerationStats, PrefixCache, has_complete_sentence
+
+_DONE = object()
+
+
+class SchedulerMetrics:
+    """Batch occupancy and queueing delay of the last `window` steps / requests."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self.batch_sizes = deque(maxlen=window)
+        self.queue_delays_ms = deque(maxlen=window)
+        self.steps = 0
+        self.requests = 0
+        self.tokens = 0
+
+    def record_step(self, size: int):
+        with self._lock:
+            self.steps += 1
+            self.tokens += size
+            self.batch_sizes.append(size)
+
+    def record_admit(self, delays_ms):
+        with self._lock:
+            self.requests += len(delays_ms)
+            self.queue_delays_ms.extend(delays_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            sizes = np.array(self.batch_sizes or [0])
+            delays = np.array(self.queue_delays_ms or [0.0])
+            return {
+                "steps": self.steps,
+                "requests": self.requests,
+                "generated_tokens": self.tokens,
+                "mean_batch_size": float(sizes.mean()),
+                "max_batch_size": int(sizes.max()),
+                "queue_delay_p50_ms": float(np.percentile(delays, 50)),
+                "queue_delay_p95_ms": float(np.percentile(delays, 95)),
+            }
+
+
+class _Sequence:
+    def __init__(self, prompt_ids, max_new_tokens, sampling, stop_at_first_sentence):
+        self.prompt_ids = prompt_ids
+        self.max_new_tokens = max_new_tokens
+        self.sampling = sampling
+        self.stop_at_first_sentence = stop_at_first_sentence
+        self.generated = []
+        self.text = ""
+        self.out = queue.Queue()
+        self.done = False   # finished, or the client stopped reading
+        self.reuse_prefix = False
+        self.tokenize_seconds = None
+        self.submitted = time.perf_counter()
+
+
+def _left_pad(t, length: int, dim: int):
+    extra = length - t.shape[dim]
+    if extra <= 0:
+        return t
+    shape = list(t.shape)
+    shape[dim] = extra
+    return torch.cat([t.new_zeros(shape), t], dim=dim)
+
+
+def _to_layers(cache):
+    """Per-layer [key, value] tensors of shape (batch, heads, seq, head_dim)."""
+    if hasattr(cache, "to_legacy_cache"):
+        cache = cache.to_legacy_cache()
+    return [[k, v] for k, v in cache]
+
+
+class _Batch:
+    """Active sequences plus their shared, left-padded KV cache."""
+
+    def __init__(self, seqs, layers, mask, positions, next_tokens):
+        self.seqs = seqs                # list[_Sequence]
+        self.layers = layers            # per-layer [key, value]
+        self.mask = mask                # (batch, cached_len) 1 = real token, 0 = padding
+        self.positions = positions      # (batch,) position id of the next input token
+        self.next_tokens = next_tokens  # (batch,) sampled but not yet fed to the model
+
+    def __len__(self):
+        return len(self.seqs)
+
+    def merge(self, other: "_Batch"):
+        length = max(self.mask.shape[1], other.mask.shape[1])
+        for mine, theirs in zip(self.layers, other.layers):
+            for j in range(2):
+                mine[j] = torch.cat([_left_pad(mine[j], length, 2), _left_pad(theirs[j], length, 2)], dim=0)
+        self.mask = torch.cat([_left_pad(self.mask, length, 1), _left_pad(other.mask, length, 1)], dim=0)
+        self.positions = torch.cat([self.positions, other.positions])
+        self.next_tokens = torch.cat([self.next_tokens, other.next_tokens])
+        self.seqs += other.seqs
+
+    def keep(self, rows):
+        """Drop every sequence not in `rows`, then trim columns that are padding for all remaining ones."""
+        if len(rows) == len(self.seqs):
+            return
+        if not rows:
+            self.seqs = []
+            return
+        idx = torch.tensor(rows, device=self.mask.device)
+        mask = self.mask.index_select(0, idx)
+        first = int(mask.any(0).nonzero()[0])
+        self.mask = mask[:, first:]
+        for layer in self.layers:
+            for j in range(2):
+                layer[j] = layer[j].index_select(0, idx)[:, :, first:]
+        self.positions = self.positions.index_select(0, idx)
+        self.next_tokens = self.next_tokens.index_select(0, idx)
+        self.seqs = [self.seqs[i] for i in rows]
+
+
+def sample_next_token(logits, seen_ids, sampling: dict) -> int:
+    """One token from a (vocab,) logits row, applying the request's own settings in generate()'s order."""
+    logits = logits.float()
+    penalty = sampling.get("repetition_penalty", 1.0)
+    if penalty != 1.0 and seen_ids:
+        ids = torch.tensor(seen_ids, device=logits.device)
+        score = logits.gather(0, ids)
+        score = torch.where(score < 0, score * penalty, score / penalty)
+        logits = logits.scatter(0, ids, score)
+    if not sampling.get("do_sample", True):
+        return int(logits.argmax())
+
+    logits = logits / max(sampling.get("temperature", 1.0), 1e-5)
+    top_k = sampling.get("top_k") or 0
+    if 0 < top_k < logits.numel():
+        kth = torch.topk(logits, top_k).values[-1]
+        logits = logits.masked_fill(logits < kth, float("-inf"))
+    top_p = sampling.get("top_p", 1.0)
+    if top_p < 1.0:
+        sorted_logits, order = torch.sort(logits, descending=True)
+        probs = sorted_logits.softmax(-1)
+        remove = probs.cumsum(-1) - probs > top_p   # always keeps the most likely token
+        logits = logits.scatter(0, order, sorted_logits.masked_fill(remove, float("-inf")))
+    return int(torch.multinomial(logits.softmax(-1), 1))
+
+
+class GenerationScheduler:
+    """
+    stream(prompt, ...) has the same contract as generation.stream_generate but
+    shares forward passes with every other in-flight request. At most
+    `max_batch` sequences decode together; further requests wait for a slot.
+    """
+
+    def __init__(self, tokenizer, model, max_batch: int = 8, prefix_cache: PrefixCache = None):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.max_batch = max_batch
+        self.prefix_cache = prefix_cache
+        self.device = next(model.parameters()).device
+        self.pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+        eos = model.generation_config.eos_token_id
+        self.eos_ids = set(eos if isinstance(eos, (list, tuple)) else [eos]) | {tokenizer.eos_token_id}
+        self.eos_ids.discard(None)
+        self.metrics = SchedulerMetrics()
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="generation-scheduler", daemon=True)
+        self._thread.start()
+
+    # -------------------------------------------------------
+    # Client side
+    # -------------------------------------------------------
+    def submit(self, prompt: str, max_new_tokens: int = 200, stop_at_first_sentence: bool = True,
+               **sampling) -> _Sequence:
+        if self._stopped:
+            raise RuntimeError("GenerationScheduler is closed")
+        tokenize_start = time.perf_counter()
+        prompt_ids = self.tokenizer(prompt)["input_ids"]
+        seq = _Sequence(prompt_ids, max_new_tokens, {**SAMPLING, **sampling}, stop_at_first_sentence)
+        seq.tokenize_seconds = time.perf_counter() - tokenize_start
+        seq.reuse_prefix = self.prefix_cache is not None and self.prefix_cache.matches(prompt_ids)
+        with self._cond:
+            self._pending.append(seq)
+            self._cond.notify()
+        return seq
+
+    def stream(self, prompt: str, max_new_tokens: int = 200, stats: GenerationStats = None,
+               stop_at_first_sentence: bool = True, **sampling):
+        """Yield decoded text pieces as this request's tokens are produced."""
+        stats = stats if stats is not None else GenerationStats()
+        seq = self.submit(prompt, max_new_tokens, stop_at_first_sentence, **sampling)
+        stats.tokenize_seconds = seq.tokenize_seconds
+        stats.prompt_tokens = len(seq.prompt_ids)
+        stats.prefix_tokens = len(self.prefix_cache) if seq.reuse_prefix else 0
+        try:
+            while True:
+                piece = seq.out.get()
+                if piece is _DONE:
+                    break
+                if isinstance(piece, Exception):
+                    raise piece
+                if piece and stats.first_token_at is None:
+                    stats.first_token_at = time.perf_counter()
+                yield piece
+        finally:
+            seq.done = True   # no-op if finished; frees the slot if the consumer stopped early
+            stats.finished_at = time.perf_counter()
+            stats.generated_tokens = len(seq.generated)
+
+    def generate(self, prompt: str, max_new_tokens: int = 200, **sampling):
+        """Blocking variant of stream: returns (generated text, GenerationStats)."""
+        stats = GenerationStats()
+        text = "".join(self.stream(prompt, max_new_tokens, stats, **sampling))
+        return text, stats
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join()
+
+    # -------------------------------------------------------
+    # Worker side
+    # -------------------------------------------------------
+    def _admit(self, active: int):
+        with self._cond:
+            while not self._pending and not active and not self._stopped:
+                self._cond.wait()
+            new = []
+            while self._pending and active + len(new) < self.max_batch:
+                new.append(self._pending.popleft())
+            return new
+
+    def _prefill(self, seqs, reuse_prefix: bool) -> _Batch:
+        n = len(seqs)
+        skip = len(self.prefix_cache) if reuse_prefix else 0
+        tails = [s.prompt_ids[skip:] for s in seqs]
+        length = max(len(t) for t in tails)
+        input_ids = torch.full((n, length), self.pad_id, dtype=torch.long)
+        mask = torch.zeros((n, skip + length), dtype=torch.long)
+        mask[:, :skip] = 1
+        for i, tail in enumerate(tails):
+            input_ids[i, length - len(tail):] = torch.tensor(tail)
+            mask[i, skip + length - len(tail):] = 1
+        input_ids, mask = input_ids.to(self.device), mask.to(self.device)
+        out = self.model(input_ids=input_ids, attention_mask=mask,
+                         position_ids=(mask.cumsum(-1) - 1).clamp(min=0)[:, skip:],
+                         past_key_values=self.prefix_cache.fresh_cache(n) if reuse_prefix else None,
+                         use_cache=True)
+        batch = _Batch(seqs, _to_layers(out.past_key_values), mask, mask.sum(-1), None)
+        batch.next_tokens = self._sample(batch, out.logits[:, -1])
+        return batch
+
+    def _decode_step(self, batch: _Batch):
+        mask = torch.cat([batch.mask, batch.mask.new_ones((len(batch), 1))], dim=1)
+        out = self.model(input_ids=batch.next_tokens[:, None], attention_mask=mask,
+                         position_ids=batch.positions[:, None],
+                         past_key_values=DynamicCache.from_legacy_cache(tuple(map(tuple, batch.layers))),
+                         use_cache=True)
+        batch.layers = _to_layers(out.past_key_values)
+        batch.mask = mask
+        batch.positions = batch.positions + 1
+        batch.next_tokens = self._sample(batch, out.logits[:, -1])
+
+    def _sample(self, batch: _Batch, logits):
+        """Pick each row's next token, stream its text, and finish sequences that are done."""
+        tokens = []
+        for row, seq in zip(logits, batch.seqs):
+            tok = sample_next_token(row, seq.prompt_ids + seq.generated, seq.sampling)
+            tokens.append(tok)
+            if seq.done:
+                continue
+            if tok in self.eos_ids:
+                self._finish(seq)
+                continue
+            seq.generated.append(tok)
+            text = self.tokenizer.decode(seq.generated, skip_special_tokens=True)
+            if not text.endswith("\ufffd"):   # wait for the rest of a multi-byte character
+                seq.out.put(text[len(seq.text):])
+                seq.text = text
+            if len(seq.generated) >= seq.max_new_tokens or (
+                    seq.stop_at_first_sentence and has_complete_sentence(seq.text)):
+                self._finish(seq)
+        self.metrics.record_step(len(batch))
+        return torch.tensor(tokens, device=self.device)
+
+    def _finish(self, seq: _Sequence, error: Exception = None):
+        if error is not None:
+            seq.out.put(error)
+        else:
+            text = self.tokenizer.decode(seq.generated, skip_special_tokens=True)
+            if len(text) > len(seq.text):   # flush a trailing partial character
+                seq.out.put(text[len(seq.text):])
+                seq.text = text
+        seq.done = True
+        seq.out.put(_DONE)
+
+    def _run(self):
+        batch = None
+        while True:
+            new = self._admit(len(batch) if batch else 0)
+            if self._stopped and not new and not batch:
+                return
+            try:
+                with torch.inference_mode():
+                    if new:
+                        now = time.perf_counter()
+                        self.metrics.record_admit([(now - s.submitted) * 1000 for s in new])
+                        for reuse in (True, False):
+                            group = [s for s in new if s.reuse_prefix == reuse]
+                            if not group:
+                                continue
+                            fresh = self._prefill(group, reuse)
+                            if batch is None:
+                                batch = fresh
+                            else:
+                                batch.merge(fresh)
+                    else:
+                        self._decode_step(batch)
+                    batch.keep([i for i, s in enumerate(batch.seqs) if not s.done])
+                    if not batch.seqs:
+                        batch = None
+            except Exception as e:
+                for seq in (batch.seqs if batch else []) + new:
+                    if not seq.done:
+                        self._finish(seq, e)
+                batch = None
@@ -0,0 +1,250 @@
+# Qwen generation helpers (prompt, streaming, stopping, answer cleanup)
+# ---------------------------------------------------------------------------
+# The app only keeps the first complete sentence of the model output
+# (clean_generated_text), so generation stops as soon as that sentence is
+# complete instead of running to max_new_tokens. Tokens are streamed as they
+# are produced and time-to-first-token / tokens-per-second are measured.
+# The fixed instruction block at the start of every prompt is prefilled once
+# (PrefixCache) and its KV cache reused by each request.
+
+import threading
+import time
+
+import torch
+from transformers import DynamicCache, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+SENTENCE_ENDS = ["?", ".", "!", "\n"]
+MAX_ANSWER_CHARS = 400
+
+# Sampling settings used by the app
+SAMPLING = dict(
+    do_sample=True,
+    temperature=0.7,
+    top_k=50,
+    top_p=0.95,
+    repetition_penalty=1.1,
+)
+
+
+# Fixed instruction block every prompt starts with; its KV cache is computed once (PrefixCache)
+PROMPT_PREFIX = """You are an intelligent assistant specialized in ITI information.
+Answer ONLY using the information provided in the (context).
+If the information is not available, say: "Information not available."
+
+Context:
+"""
+
+
+def build_prompt(context: str, query: str) -> str:
+    return f"""{PROMPT_PREFIX}{context}
+
+Question:
+{query}
+
+Answer:
+""".strip()
+
+
+def _answer_text(text: str, prompt_tail: str = "\n\n") -> str:
+    """Generated text after the answer marker, with the prompt tail collapsed."""
+    if "الإجابة:" in text:   # original Arabic marker
+        text = text.split("الإجابة:", 1)[-1]
+    if "Answer:" in text:
+        text = text.split("Answer:", 1)[-1]
+
+    return text.replace(prompt_tail, " ").strip()
+
+
+def _first_sentence(text: str):
+    """First sentence of already normalised text, or None while there is none yet."""
+    for sep in SENTENCE_ENDS:
+        if sep in text:
+            parts = text.split(sep)
+            candidate = parts[0].strip()
+            if len(candidate) > 2:
+                return candidate + sep
+    return None
+
+
+def clean_generated_text(text: str, prompt_tail: str = "\n\n") -> str:
+    text = _answer_text(text, prompt_tail)
+    return _first_sentence(text) or text
+
+
+def finalize_answer(generated: str) -> str:
+    """First sentence of the generated text, capped at MAX_ANSWER_CHARS."""
+    answer = clean_generated_text(generated)
+    if len(answer) > MAX_ANSWER_CHARS:
+        answer = answer[:MAX_ANSWER_CHARS].rsplit(' ', 1)[0] + '...'
+    return answer.strip()
+
+
+def has_complete_sentence(text: str) -> bool:
+    """True once clean_generated_text would return a full sentence for `text`."""
+    return _first_sentence(_answer_text(text)) is not None
+
+
+class FirstSentenceStop(StoppingCriteria):
+    """Stop generating once the new tokens contain a complete first sentence."""
+
+    def __init__(self, tokenizer, prompt_len: int):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+        self.generated_tokens = 0
+
+    def __call__(self, input_ids, scores, **kwargs):
+        new_ids = input_ids[0, self.prompt_len:]
+        self.generated_tokens = int(new_ids.shape[-1])
+        return has_complete_sentence(self.tokenizer.decode(new_ids, skip_special_tokens=True))
+
+
+class StopOnEvent(StoppingCriteria):
+    """Stop generating once the event is set (the consumer of the stream went away)."""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return self.event.is_set()
+
+
+class PrefixCache:
+    """
+    KV cache of the static prompt prefix, computed once at startup. Prompts whose
+    token ids start with the prefix ids only prefill their own context + question.
+    """
+
+    def __init__(self, tokenizer, model, prefix: str = PROMPT_PREFIX):
+        self.ids = tokenizer(prefix)["input_ids"]
+        device = next(model.parameters()).device
+        with torch.no_grad():
+            out = model(input_ids=torch.tensor([self.ids], device=device), use_cache=True)
+        cache = out.past_key_values
+        if hasattr(cache, "to_legacy_cache"):
+            cache = cache.to_legacy_cache()
+        self.layers = tuple((k, v) for k, v in cache)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def matches(self, input_ids) -> bool:
+        """True if the prompt tokenizes to the prefix ids followed by at least one more token."""
+        ids = list(input_ids)
+        hit = len(ids) > len(self.ids) and ids[:len(self.ids)] == self.ids
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return hit
+
+    def fresh_cache(self, batch_size: int = 1):
+        """A new cache holding the prefix for `batch_size` rows (generation appends to it in place)."""
+        return DynamicCache.from_legacy_cache(tuple(
+            (k.expand(batch_size, -1, -1, -1).clone(), v.expand(batch_size, -1, -1, -1).clone())
+            for k, v in self.layers))
+
+    def stats(self) -> dict:
+        return {"prefix_tokens": len(self.ids), "hits": self.hits, "misses": self.misses}
+
+
+class GenerationStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.prompt_tokens = 0
+        self.prefix_tokens = 0   # prompt tokens served from the prefix KV cache
+        self.generated_tokens = 0
+        self.tokenize_seconds = None
+
+    @property
+    def ttft(self):
+        """Seconds until the first generated text arrived."""
+        return None if self.first_token_at is None else self.first_token_at - self.started
+
+    @property
+    def tokens_per_sec(self):
+        if self.finished_at is None or self.first_token_at is None:
+            return None
+        decode_time = self.finished_at - self.first_token_at
+        return (self.generated_tokens - 1) / decode_time if decode_time > 0 else None
+
+    def as_dict(self):
+        return {
+            "ttft_s": self.ttft,
+            "tokens_per_sec": self.tokens_per_sec,
+            "prompt_tokens": self.prompt_tokens,
+            "prefix_tokens": self.prefix_tokens,
+            "generated_tokens": self.generated_tokens,
+            "tokenize_s": self.tokenize_seconds,
+            "total_s": None if self.finished_at is None else self.finished_at - self.started,
+        }
+
+
+def _prepare_inputs(tokenizer, prompt: str, device: str):
+    inputs = tokenizer(prompt, return_tensors="pt")
+    target = 'cuda' if device == 'cuda' and torch.cuda.is_available() else 'cpu'
+    return {k: v.to(target) for k, v in inputs.items()}
+
+
+def stream_generate(tokenizer, model, device: str, prompt: str, max_new_tokens: int = 200,
+                    stats: GenerationStats = None, stop_at_first_sentence: bool = True,
+                    prefix_cache: PrefixCache = None, **sampling):
+    """
+    Yield decoded text pieces as the model produces them (generation runs in a thread).
+    With a matching `prefix_cache`, only the tokens after the static prefix are prefilled.
+    """
+    stats = stats if stats is not None else GenerationStats()
+    tokenize_start = time.perf_counter()
+    inputs = _prepare_inputs(tokenizer, prompt, device)
+    stats.tokenize_seconds = time.perf_counter() - tokenize_start
+    prompt_len = inputs["input_ids"].shape[-1]
+    stats.prompt_tokens = int(prompt_len)
+
+    stopper = FirstSentenceStop(tokenizer, prompt_len)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    kwargs = dict(
+        **inputs,
+        max_new_tokens=max_new_tokens,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+        streamer=streamer,
+        **{**SAMPLING, **sampling},
+    )
+    cancel = threading.Event()   # set when the caller stops reading (see the finally below)
+    criteria = [StopOnEvent(cancel)]
+    if stop_at_first_sentence:
+        criteria.append(stopper)
+    kwargs["stopping_criteria"] = StoppingCriteriaList(criteria)
+    if prefix_cache is not None and prefix_cache.matches(inputs["input_ids"][0].tolist()):
+        kwargs["past_key_values"] = prefix_cache.fresh_cache()
+        stats.prefix_tokens = len(prefix_cache)
+
+    def _run():
+        with torch.no_grad():
+            out = model.generate(**kwargs)
+        stopper.generated_tokens = int(out.shape[-1] - prompt_len)
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+    try:
+        for piece in streamer:
+            if piece and stats.first_token_at is None:
+                stats.first_token_at = time.perf_counter()
+            yield piece
+    finally:
+        # closed early (client disconnected): stop model.generate at its next token instead of
+        # letting it run to max_new_tokens; a no-op once generation has finished
+        cancel.set()
+        thread.join()
+    stats.finished_at = time.perf_counter()
+    stats.generated_tokens = stopper.generated_tokens
+
+
+def generate_text(tokenizer, model, device: str, prompt: str, max_new_tokens: int = 200, **sampling):
+    """Blocking variant of stream_generate: returns (generated text, GenerationStats)."""
+    stats = GenerationStats()
+    text = "".join(stream_generate(tokenizer, model, device, prompt, max_new_tokens, stats, **sampling))
+    return text, stats
@@ -0,0 +1,79 @@
+# Generation backends for the Qwen model
+# ---------------------------------------------------------------------------
+# All backends return the same (tokenizer, model, device) triple that the
+# generation helpers use, so generate_final_answer does not change:
+#   cuda_fp16 - fp16 weights on GPU (device_map="auto"), the original setup
+#   cpu_fp32  - plain fp32 on CPU
+#   cpu_bf16  - bf16 weights on CPU (half the memory; fast on CPUs with AVX512-BF16 / AMX)
+#   cpu_int8  - fp32 model with nn.Linear layers dynamically quantised to int8
+# "auto" picks cuda_fp16 when a GPU is available, otherwise cpu_int8.
+# Select with ITI_LLM_BACKEND; ITI_LLM_THREADS sets torch's CPU thread count.
+
+import os
+import time
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+DEFAULT_MODEL = "Qwen/Qwen2.5-1.5B-Instruct"
+BACKENDS = ["cuda_fp16", "cpu_fp32", "cpu_bf16", "cpu_int8"]
+
+
+def resolve_backend(name: str = "auto") -> str:
+    if name in (None, "", "auto"):
+        return "cuda_fp16" if torch.cuda.is_available() else "cpu_int8"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r}, expected one of {BACKENDS} or 'auto'")
+    return name
+
+
+def configure_threads(num_threads: int = None) -> int:
+    """Use one thread per physical core unless told otherwise (hyper-threads don't help matmuls)."""
+    if num_threads is None:
+        try:
+            import psutil
+            num_threads = psutil.cpu_count(logical=False) or os.cpu_count()
+        except ImportError:
+            num_threads = os.cpu_count()
+    torch.set_num_threads(num_threads)
+    return num_threads
+
+
+class LLMBackend:
+    """Loaded tokenizer + model plus how long loading took."""
+
+    def __init__(self, name, tokenizer, model, device, load_seconds, num_threads=None):
+        self.name = name
+        self.tokenizer = tokenizer
+        self.model = model
+        self.device = device
+        self.load_seconds = load_seconds
+        self.num_threads = num_threads
+
+    def __repr__(self):
+        return f"LLMBackend({self.name}, device={self.device}, load={self.load_seconds:.1f}s)"
+
+
+def load_backend(name: str = "auto", model_name: str = DEFAULT_MODEL, num_threads: int = None) -> LLMBackend:
+    name = resolve_backend(name)
+    start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=False)
+
+    if name == "cuda_fp16":
+        model = AutoModelForCausalLM.from_pretrained(
+            model_name,
+            device_map="auto",
+            torch_dtype=torch.float16,
+            low_cpu_mem_usage=True
+        )
+        device, num_threads = "cuda" if torch.cuda.is_available() else "cpu", None
+    else:
+        num_threads = configure_threads(num_threads)
+        dtype = torch.bfloat16 if name == "cpu_bf16" else torch.float32
+        model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=dtype, low_cpu_mem_usage=True)
+        if name == "cpu_int8":
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        device = "cpu"
+
+    model.eval()
+    return LLMBackend(name, tokenizer, model, device, time.perf_counter() - start, num_threads)
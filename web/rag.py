@@ -0,0 +1,260 @@
+# RAG pipeline: retrieval + Qwen generation, independent of Streamlit
+# ---------------------------------------------------------------------------
+# Used in-process by web/st.py and by the headless API server (api_server.py).
+# Configuration comes from environment variables (see load_pipeline).
+#
+# torch / transformers / faiss / sentence-transformers are imported inside the
+# loaders, not at module level, so importing this module is instant. The
+# pipeline can run without the LLM (llm=None): answers are then retrieval-only
+# until attach_generation() is called (see warmup.py).
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraper"))
+from answer_cache import AnswerCache  # noqa: E402
+from context_packer import ContextPacker, tokenizer_counter  # noqa: E402
+from tracing import count, observe, span, tracer  # noqa: E402
+
+NO_CONTEXT_ANSWER = "Sorry, no information is available for this question."
+RETRIEVAL_ONLY_NOTE = "The language model is still loading, so here is the most relevant information found:"
+
+
+class RAGPipeline:
+    def __init__(self, retriever, llm=None, answer_cache: AnswerCache = None, scheduler=None, prefix_cache=None,
+                 packer: ContextPacker = None):
+        self.retriever = retriever
+        self.answer_cache = answer_cache
+        self.packer = packer or ContextPacker()   # approximate token counts until the LLM tokenizer is loaded
+        self.llm = None
+        self.attach_generation(llm, scheduler, prefix_cache)
+
+    def attach_generation(self, llm, scheduler=None, prefix_cache=None):
+        """Switch from retrieval-only answers to generated ones (llm=None keeps retrieval-only)."""
+        self.scheduler = scheduler  # continuous batching across concurrent requests (None: one generate() each)
+        self.prefix_cache = prefix_cache  # KV cache of the fixed instruction block
+        if llm is not None:
+            self.packer.count_tokens = tokenizer_counter(llm.tokenizer)   # budget in real Qwen tokens
+        self.llm = llm   # set last: requests check it to decide whether to generate
+
+    @property
+    def generation_ready(self) -> bool:
+        return self.llm is not None
+
+    @property
+    def max_concurrent_generations(self) -> int:
+        return self.scheduler.max_batch if self.scheduler is not None else 1
+
+    # -------------------------------------------------------
+    # Retrieval function
+    # -------------------------------------------------------
+    def pack_context(self, query: str, top_k: int = None, budget_tokens: int = None, query_embedding=None,
+                     mode: str = "hybrid", shards: list = None):
+        """
+        PackedContext of the best whole chunks that fit `budget_tokens` prompt tokens
+        (default: ITI_CONTEXT_TOKENS), out of the top_k ranked hits (default: ITI_CONTEXT_CANDIDATES).
+        `shards` restricts a sharded index to the named shards (default: routed by the query's language).
+        """
+        with span("rag.retrieve_context") as s:
+            # hybrid dense + BM25 ranking (reciprocal rank fusion), best first
+            extra = {}
+            if shards:
+                if not hasattr(self.retriever, "shards"):
+                    raise ValueError("this index is not sharded: 'shards' cannot be used")
+                extra["shards"] = shards
+            hits = self.retriever.search(query, top_k or self.packer.candidates, query_embedding, mode, **extra)
+            with span("rag.pack_context"):
+                packed = self.packer.pack(hits, budget_tokens)
+            s.set(**packed.stats())
+            return packed
+
+    def retrieve_context(self, query: str, top_k: int = None, budget_tokens: int = None, query_embedding=None,
+                         mode: str = "hybrid", shards: list = None):
+        """(context text, URL of the best passage)."""
+        packed = self.pack_context(query, top_k, budget_tokens, query_embedding, mode, shards)
+        return packed.text, packed.source_url
+
+    # -------------------------------------------------------
+    # Generation using Qwen model
+    # -------------------------------------------------------
+    def stream_final_answer(self, context: str, query: str, stats, max_new_tokens: int = 200):
+        """Yield answer text as Qwen produces it; generation stops after the first full sentence."""
+        if not context.strip():
+            yield NO_CONTEXT_ANSWER
+            return
+        from generation import build_prompt, stream_generate
+        prompt = build_prompt(context, query)
+        with span("rag.generate", batched=self.scheduler is not None) as s:
+            if self.scheduler is not None:
+                yield from self.scheduler.stream(prompt, max_new_tokens, stats)
+            else:
+                yield from stream_generate(self.llm.tokenizer, self.llm.model, self.llm.device,
+                                           prompt, max_new_tokens, stats, prefix_cache=self.prefix_cache)
+            record_generation(s, stats)
+
+    def generate_final_answer(self, context: str, query: str, max_new_tokens: int = 200):
+        if not context.strip():
+            return NO_CONTEXT_ANSWER
+        from generation import build_prompt, finalize_answer, generate_text
+        prompt = build_prompt(context, query)
+        with span("rag.generate", batched=self.scheduler is not None) as s:
+            if self.scheduler is not None:
+                generated, stats = self.scheduler.generate(prompt, max_new_tokens)
+            else:
+                generated, stats = generate_text(self.llm.tokenizer, self.llm.model, self.llm.device, prompt,
+                                                 max_new_tokens, prefix_cache=self.prefix_cache)
+            record_generation(s, stats)
+        with span("rag.postprocess"):
+            return finalize_answer(generated)
+
+    # -------------------------------------------------------
+    # Full question -> answer flow (answer cache + retrieval + streamed generation)
+    # -------------------------------------------------------
+    def stream_answer(self, query: str, top_k: int = None):
+        """
+        Yield events: {"type": "token", "text"} while generating, then one
+        {"type": "done", "answer", "context", "source", "sources", "cached", "metrics", "retrieval_only"}
+        ("sources": the URLs and chunk ids of each context passage).
+        While the LLM is not loaded, the answer is the retrieved context itself
+        ("retrieval_only": true) and it is not cached.
+        """
+        with span("rag.answer", top_k=top_k) as trace:
+            if not self.generation_ready:
+                trace.set(retrieval_only=True)
+                packed = self.pack_context(query, top_k)
+                ctx = packed.text
+                answer = f"{RETRIEVAL_ONLY_NOTE}\n\n{ctx}" if ctx else NO_CONTEXT_ANSWER
+                yield {"type": "done", "answer": answer, "context": ctx, "source": packed.source_url,
+                       "sources": packed.sources(), "cached": False, "metrics": {}, "retrieval_only": True}
+                return
+
+            from generation import GenerationStats, finalize_answer
+            query_vec = self.retriever.encode_query(query)
+            version = self.retriever.version
+            cached = None
+            if self.answer_cache is not None:
+                with span("rag.answer_cache") as s:
+                    cached = self.answer_cache.get(query, query_vec, version)
+                    s.set(hit=cached is not None)
+                count("iti_answer_cache_lookups_total", result="hit" if cached is not None else "miss")
+            trace.set(cached=cached is not None)
+            if cached is not None:
+                answer, ctx, src, sources = cached
+                yield {"type": "done", "answer": answer, "context": ctx, "source": src, "sources": sources,
+                       "cached": True, "metrics": {}, "retrieval_only": False}
+                return
+
+            start = time.perf_counter()
+            packed = self.pack_context(query, top_k, query_embedding=query_vec)
+            ctx, src, sources = packed.text, packed.source_url, packed.sources()
+            stats = GenerationStats()
+            streamed = ""
+            for piece in self.stream_final_answer(ctx, query, stats):
+                streamed += piece
+                yield {"type": "token", "text": piece}
+            with span("rag.postprocess"):
+                answer = finalize_answer(streamed) if ctx.strip() else streamed
+            trace.set(prompt_tokens=stats.prompt_tokens, generated_tokens=stats.generated_tokens)
+
+            if self.answer_cache is not None:
+                self.answer_cache.put(query, (answer, ctx, src, sources), query_vec, version,
+                                      seconds=time.perf_counter() - start)
+            yield {"type": "done", "answer": answer, "context": ctx, "source": src, "sources": sources,
+                   "cached": False, "metrics": {**stats.as_dict(), "context_tokens": packed.tokens},
+                   "retrieval_only": False}
+
+    def answer(self, query: str, top_k: int = None) -> dict:
+        """Blocking variant of stream_answer: returns the final "done" event."""
+        for event in self.stream_answer(query, top_k):
+            if event["type"] == "done":
+                return event
+
+    def reload_index(self) -> dict:
+        """Pick up index shards added / rebuilt / removed on disk (sharded index only)."""
+        if not hasattr(self.retriever, "reload"):
+            raise ValueError("the index is not sharded: restart the app to load a rebuilt index")
+        return self.retriever.reload()
+
+    def stats(self) -> dict:
+        out = {}
+        if hasattr(self.retriever, "shards"):
+            out["index_shards"] = self.retriever.stats()
+        if self.retriever.encoder is not None:
+            out["query_encoder"] = self.retriever.encoder.metrics.snapshot()
+        if self.answer_cache is not None:
+            out["answer_cache"] = self.answer_cache.stats()
+        if self.scheduler is not None:
+            out["generation_scheduler"] = self.scheduler.metrics.snapshot()
+        if self.prefix_cache is not None:
+            out["prefix_cache"] = self.prefix_cache.stats()
+        if tracer().enabled:
+            out["tracing"] = tracer().snapshot()
+        return out
+
+
+def record_generation(s, stats):
+    """Token counts, tokenisation time and time to first token of one generation: on its span and in the metrics."""
+    s.set(prompt_tokens=stats.prompt_tokens, prefix_tokens=stats.prefix_tokens,
+          generated_tokens=stats.generated_tokens, ttft_ms=None if stats.ttft is None else round(stats.ttft * 1000, 1),
+          tokenize_ms=None if stats.tokenize_seconds is None else round(stats.tokenize_seconds * 1000, 3))
+    observe("generate.tokenize", stats.tokenize_seconds)
+    observe("generate.first_token", stats.ttft)
+    count("iti_prompt_tokens_total", stats.prompt_tokens)
+    count("iti_prefix_cached_tokens_total", stats.prefix_tokens)
+    count("iti_generated_tokens_total", stats.generated_tokens)
+
+
+def load_retrieval_components():
+    """Embedding model + FAISS / BM25 indexes + answer cache, configured from ITI_* environment variables."""
+    from retrieval import load_retriever
+    from shards import list_shards, load_sharded_retriever
+    # Query encoder micro-batching: queries arriving within the window are encoded together
+    encoder_options = dict(batch_window_ms=float(os.environ.get("ITI_QUERY_BATCH_WINDOW_MS", 5)),
+                           max_batch=int(os.environ.get("ITI_QUERY_MAX_BATCH", 32)))
+    # Index shards (data/shards/<name>/, or ITI_SHARDS=name,name): searched in parallel and reloaded
+    # from disk every ITI_SHARD_RELOAD_S seconds; without shards, the single data/iti_* index
+    names = [n.strip() for n in os.environ.get("ITI_SHARDS", "").split(",") if n.strip()]
+    if names or list_shards():
+        retriever = load_sharded_retriever(
+            names=names or None,
+            routing=os.environ.get("ITI_SHARD_ROUTING", "language"),
+            reload_interval_s=float(os.environ.get("ITI_SHARD_RELOAD_S", 30)),
+            **encoder_options,
+        )
+    else:
+        retriever = load_retriever(**encoder_options)
+    answer_cache = AnswerCache(
+        max_entries=int(os.environ.get("ITI_ANSWER_CACHE_SIZE", 1000)),
+        ttl_seconds=float(os.environ.get("ITI_ANSWER_CACHE_TTL", 24 * 3600)),
+        similarity_threshold=float(os.environ.get("ITI_ANSWER_CACHE_SIMILARITY", 0.92)),
+    )
+    return retriever, answer_cache
+
+
+def generation_max_batch() -> int:
+    return int(os.environ.get("ITI_GEN_MAX_BATCH", 8))
+
+
+def load_generation_components(model_name: str = None):
+    """Qwen backend + prefix KV cache + continuous-batching scheduler: (llm, scheduler, prefix_cache)."""
+    from llm_backends import DEFAULT_MODEL, load_backend
+    from generation import PrefixCache
+    from gen_scheduler import GenerationScheduler
+    # Generation backend: auto | cuda_fp16 | cpu_fp32 | cpu_bf16 | cpu_int8
+    threads = os.environ.get("ITI_LLM_THREADS")
+    llm = load_backend(os.environ.get("ITI_LLM_BACKEND", "auto"), model_name or DEFAULT_MODEL,
+                       num_threads=int(threads) if threads else None)
+    # Prefill the fixed instruction block once and reuse its KV cache (ITI_PREFIX_CACHE=0 disables it)
+    prefix_cache = PrefixCache(llm.tokenizer, llm.model) if os.environ.get("ITI_PREFIX_CACHE", "1") != "0" else None
+    # Continuous batching: up to ITI_GEN_MAX_BATCH concurrent answers share each decode step (1 disables it)
+    max_batch = generation_max_batch()
+    scheduler = GenerationScheduler(llm.tokenizer, llm.model, max_batch, prefix_cache) if max_batch > 1 else None
+    return llm, scheduler, prefix_cache
+
+
+def load_pipeline(model_name: str = None) -> RAGPipeline:
+    """Load all components synchronously (warmup.AppLoader loads them in the background instead)."""
+    retriever, answer_cache = load_retrieval_components()
+    llm, scheduler, prefix_cache = load_generation_components(model_name)
+    return RAGPipeline(retriever, llm, answer_cache, scheduler, prefix_cache)
@@ -1,22 +1,23 @@
 # ITI Info Chatbot — Full Streamlit app (RAG + FAISS + Qwen2.5-Instruct local)
 # ---------------------------------------------------------------------------
 # Usage:
-# 1) Put `iti_metadata.pkl` and `iti_faiss_index.bin` in the data folder.
+# 1) Put `iti_metadata.arrow`, `iti_index_info.json` and `iti_faiss_index.bin` in the data folder.
 # 2) Install requirements (see below).
-# 3) Run: streamlit run ITI_RAG_Qwen_Streamlit.py
+# 3) Run: streamlit run web/st.py
+#    or, to share one loaded model between several UIs / clients:
+#      python web/api_server.py --port 8000
+#      ITI_API_URL=http://localhost:8000 streamlit run web/st.py
 #
 # Requirements (recommended):
 # pip install streamlit sentence-transformers transformers accelerate safetensors faiss-cpu pandas numpy torch
 # If you have CUDA GPU, install torch with the right CUDA version.
 
 import streamlit as st
-import pandas as pd
-import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import torch
-import re
+import os
+from warmup import NotReady
+
+# When set, this page is a thin client of web/api_server.py instead of loading the models itself
+API_URL = os.environ.get("ITI_API_URL")
 
 # -------------------------------------------------------
 # Page config
@@ -28,140 +29,65 @@ st.title("🎓 ITI Info Chatbot — (Open-Source Qwen2.5)")
 # Helper: cached resource loaders
 # -------------------------------------------------------
 @st.cache_resource
-def load_rag_components(metadata_path: str = "data/iti_metadata.pkl", faiss_path: str = "data/iti_faiss_index.bin"):
-    """Load embedding model, metadata dataframe and faiss index."""
-    embed_model = SentenceTransformer('all-MiniLM-L6-v2')
-    df = pd.read_pickle(metadata_path)
-    index = faiss.read_index(faiss_path)
-    return embed_model, index, df
-
-@st.cache_resource
-def load_qwen_model(model_name: str = "Qwen/Qwen2.5-1.5B-Instruct"):
-    """Load Qwen tokenizer + model. Use CPU if no GPU is available."""
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=False)
-
-    model = AutoModelForCausalLM.from_pretrained(
-        model_name,
-        device_map="auto",
-        torch_dtype=torch.float16,
-        low_cpu_mem_usage=True
-    )
-
-    # if device == "cpu":
-    #     model.to("cpu")
-
-    model.eval()
-    return tokenizer, model, device
-
-# -------------------------------------------------------
-# Load components
-# -------------------------------------------------------
-with st.spinner("Loading components (this may take a few seconds)..."):
-    try:
-        MODEL_EMBED, FAISS_INDEX, METADATA_DF = load_rag_components()
-        TOKENIZER, QWEN_MODEL, QWEN_DEVICE = load_qwen_model()
-        st.success("✅ All chatbot components loaded successfully.")
-    except Exception as e:
-        st.error(f"❌ Error loading components: {e}")
-        st.stop()
-
-# -------------------------------------------------------
-# Retrieval function
-# -------------------------------------------------------
-def retrieve_context(query: str, top_k: int = 2, max_context_chars: int = 450):
-    query_embedding = MODEL_EMBED.encode(query, convert_to_numpy=True).reshape(1, -1)
-    distances, indices = FAISS_INDEX.search(query_embedding, 20)
-    candidate_rows = METADATA_DF.iloc[indices[0]].copy()
-    candidate_rows['distance'] = distances[0]
-
-    news_keywords = ["news", "latest", "new", "update", "أخبار", "جديد", "أحدث"]
-    is_news_query = any(kw in query.lower() for kw in news_keywords)
-
-    if is_news_query:
-        candidate_rows['is_news'] = candidate_rows['chunk'].apply(
-            lambda x: 1 if any(kw in str(x).lower() for kw in news_keywords) else 0
-        )
-        final = candidate_rows.sort_values(by=['is_news', 'distance'], ascending=[False, True]).head(top_k)
-    else:
-        final = candidate_rows.sort_values(by='distance', ascending=True).head(top_k)
-
-    context_text = " ".join(final['chunk'].tolist())
-    if len(context_text) > max_context_chars:
-        context_text = context_text[:max_context_chars] + "..."
-
-    source_url = None
-    if 'url' in final.columns:
-        ulist = list(final['url'].dropna().unique())
-        source_url = ulist[0] if len(ulist) > 0 else ""
-
-    return context_text.strip(), source_url or ""
+def load_rag_backend():
+    """RAG pipeline loading in a background thread of this process, or an HTTP client of the shared
+    API server. Cached once per process, so all sessions share the models, encoder and answer cache."""
+    if API_URL:
+        from api_client import RAGClient
+        return RAGClient(API_URL)
+    from warmup import AppLoader
+    return AppLoader().start()   # returns at once: retrieval loads first, then Qwen
 
 # -------------------------------------------------------
-# Generation using Qwen model
+# Load components (in the background: the page renders right away)
 # -------------------------------------------------------
+RAG = load_rag_backend()
 
-def clean_generated_text(text: str, prompt_tail: str = "\n\n") -> str:
-    if "الإجابة:" in text:   # original Arabic marker
-        text = text.split("الإجابة:", 1)[-1]
-    if "Answer:" in text:
-        text = text.split("Answer:", 1)[-1]
-
-    text = text.replace(prompt_tail, " ").strip()
 
-    for sep in ["?", ".", "!", "\n"]:
-        if sep in text:
-            parts = text.split(sep)
-            candidate = parts[0].strip()
-            if len(candidate) > 2:
-                return candidate + sep
-    return text
-
-
-def generate_final_answer(context: str, query: str, max_new_tokens: int = 200):
-    if not context.strip():
-        return "Sorry, no information is available for this question."
-
-    prompt = f"""
-You are an intelligent assistant specialized in ITI information.
-Answer ONLY using the information provided in the (context).
-If the information is not available, say: "Information not available."
-
-Context:
-{context}
-
-Question:
-{query}
+def get_readiness():
+    try:
+        return RAG.readiness()
+    except Exception as e:   # API server not reachable yet
+        return {"ready": False, "loading": True, "retrieval_ready": False, "generation_ready": False,
+                "error": str(e)}
+
+
+def still_loading(readiness: dict) -> bool:
+    """True while a component may still become ready (a failed / disabled one is done loading)."""
+    return readiness.get("loading", not readiness["ready"])
+
+
+# Re-rendered every 2 seconds while components are still loading. run_every is only read when the
+# whole page runs, so once nothing is loading any more (ready, or failed) the page reruns once and
+# the polling stops.
+POLLING = still_loading(get_readiness())
+
+
+@st.fragment(run_every=2 if POLLING else None)
+def loading_status():
+    readiness = get_readiness()
+    if POLLING and not still_loading(readiness):
+        st.rerun()
+    where = f" (API server: {API_URL})" if API_URL else ""
+    components = readiness.get("components", {})
+    if readiness["ready"]:
+        st.success("✅ All chatbot components loaded successfully." + where)
+    elif readiness.get("error"):
+        st.warning(f"⏳ Waiting for the chatbot backend{where}: {readiness['error']}")
+    elif not readiness["retrieval_ready"]:
+        if still_loading(readiness):
+            st.info("⏳ Loading the search index... you can type your question in the meantime." + where)
+    elif still_loading(readiness):
+        st.info("⏳ The language model is still loading: answers show the most relevant retrieved text for now."
+                + where)
+    else:
+        st.info("ℹ️ The language model is unavailable: answers show the most relevant retrieved text." + where)
+    for name, c in components.items():
+        if c["status"] == "failed":
+            st.error(f"❌ Error loading {name}: {c['error']}")
 
-Answer:
-""".strip()
 
-    inputs = TOKENIZER(prompt, return_tensors="pt")
-
-    if QWEN_DEVICE == 'cuda' and torch.cuda.is_available():
-        inputs = {k: v.to('cuda') for k, v in inputs.items()}
-    else:
-        inputs = {k: v.to('cpu') for k, v in inputs.items()}
-
-    with torch.no_grad():
-        outputs = QWEN_MODEL.generate(
-            **inputs,
-            max_new_tokens=max_new_tokens,
-            do_sample=True,
-            temperature=0.7,
-            top_k=50,
-            top_p=0.95,
-            eos_token_id=TOKENIZER.eos_token_id,
-            pad_token_id=TOKENIZER.pad_token_id,
-            repetition_penalty=1.1
-        )
-
-    decoded = TOKENIZER.decode(outputs[0], skip_special_tokens=True)
-    answer = clean_generated_text(decoded, prompt_tail=prompt)
-
-    if len(answer) > 400:
-        answer = answer[:400].rsplit(' ', 1)[0] + '...'
-    return answer.strip()
+loading_status()
 
 # -------------------------------------------------------
 # Streamlit UI
@@ -174,23 +100,71 @@ with col2:
     show_ctx = st.checkbox("Show retrieved context", value=False)
 
 if user_query:
-    with st.spinner("Searching, retrieving context, and generating..."):
-        ctx, src = retrieve_context(user_query, top_k=2)
-        answer = generate_final_answer(ctx, user_query)
-
     st.subheader("💬 Final Answer:")
-    st.success(answer)
+    answer_box = st.empty()
+    streamed, result, error = "", None, None
+    try:
+        with st.spinner("Searching, retrieving context, and generating..."):
+            # stream tokens to the page as they are generated
+            for event in RAG.stream_answer(user_query):
+                if event["type"] == "token":
+                    streamed += event["text"]
+                    answer_box.info(streamed + " ▌")
+                elif event["type"] == "done":
+                    result = event
+                elif event["type"] == "error":
+                    error = event["error"]
+    except NotReady as e:
+        st.warning(f"⏳ {e}. Please try again in a few seconds.")
+        st.stop()
+    except Exception as e:
+        error = str(e)
+
+    if result is None:   # the stream failed or ended before its "done" event
+        if streamed:
+            answer_box.warning(streamed)
+            st.caption(f"⚠️ The answer was cut off: {error or 'the stream ended early'}.")
+        else:
+            answer_box.error(f"❌ {error or 'No answer was returned. Please try again.'}")
+        st.stop()
+
+    answer, ctx, src = result["answer"], result["context"], result["source"]
+    if result.get("retrieval_only"):
+        answer_box.info(answer)
+        st.caption("Retrieval-only answer: the language model is still loading.")
+    else:
+        answer_box.success(answer)
+
+    metrics = result.get("metrics") or {}
+    if result.get("cached"):
+        st.caption("Answered from cache.")
+    elif metrics.get("ttft_s") is not None:
+        st.session_state.setdefault("generation_metrics", []).append(metrics)
+        st.caption(f"Time to first token: {metrics['ttft_s']:.2f}s · "
+                   f"{metrics['generated_tokens']} tokens · "
+                   f"{(metrics['tokens_per_sec'] or 0):.1f} tokens/sec")
 
     if show_ctx:
         st.subheader("📚 Retrieved Context:")
         st.code(ctx)
 
     st.subheader("🔗 Source:")
-    if src:
-        st.markdown(f"[Click here to visit source]({src})")
+    # one line per context passage (best first); near-duplicate pages are listed with it
+    sources = result.get("sources") or ([{"urls": [src]}] if src else [])
+    if sources:
+        for i, source in enumerate(sources, 1):
+            links = " · ".join(f"[{'source' if j == 0 else 'also on'}]({u})" for j, u in enumerate(source["urls"]))
+            st.markdown(f"{i}. {links}")
     else:
         st.write("No source link available in the retrieved data.")
 
+# Sidebar: query encoder + answer cache metrics (shared by all sessions / by the API server)
+with st.sidebar.expander("Server metrics"):
+    try:
+        st.json(RAG.stats())
+    except Exception as e:
+        st.write(f"Unavailable: {e}")
+
 # Footer
 st.markdown("---")
 st.markdown(
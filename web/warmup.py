@@ -0,0 +1,191 @@
+# Background warm-up of the RAG components + readiness reporting
+# ---------------------------------------------------------------------------
+# Loading everything before the first request (MiniLM, FAISS + metadata +
+# BM25, then the 1.5B Qwen model) kept the UI / API down for the whole cold
+# start. AppLoader starts a daemon thread that loads the components in
+# dependency order:
+#   retrieval  - embedding model, indexes, answer cache -> retrieval-only answers
+#   generation - Qwen backend, prefix KV cache, batching scheduler -> full answers
+# and has the same interface as rag.RAGPipeline, so callers use it directly.
+# Until retrieval is ready, requests raise NotReady; while the LLM loads, they
+# get the retrieved context as the answer. readiness() reports each
+# component's status, load time and the process memory it added.
+
+import os
+import threading
+import time
+import traceback
+
+PENDING, LOADING, READY, FAILED, DISABLED = "pending", "loading", "ready", "failed", "disabled"
+
+
+class NotReady(RuntimeError):
+    """The component needed for this request is still loading (or failed to load)."""
+
+
+def current_rss_mb():
+    """Resident memory of this process in MB (None where it can't be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2 ** 20
+    except ImportError:
+        return None
+
+
+class ComponentStatus:
+    def __init__(self, name: str):
+        self.name = name
+        self.status = PENDING
+        self.seconds = None
+        self.rss_added_mb = None
+        self.error = None
+        self._start = None
+
+    def as_dict(self) -> dict:
+        seconds = self.seconds
+        if self.status == LOADING:
+            seconds = time.perf_counter() - self._start   # loading so far
+        return {"status": self.status,
+                "seconds": round(seconds, 2) if seconds is not None else None,
+                "rss_added_mb": round(self.rss_added_mb, 1) if self.rss_added_mb is not None else None,
+                "error": self.error}
+
+
+class AppLoader:
+    """Loads the RAG pipeline in a background thread; usable (partially) while it loads."""
+
+    COMPONENTS = ("retrieval", "generation")
+
+    def __init__(self, model_name: str = None, load_generation: bool = True):
+        self.model_name = model_name
+        self.load_generation = load_generation   # False: retrieval-only server
+        self.components = {name: ComponentStatus(name) for name in self.COMPONENTS}
+        self.pipeline = None
+        self.started = time.time()
+        self._thread = None
+
+    def start(self) -> "AppLoader":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._load_all, name="rag-warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, component: str = "generation", timeout: float = None) -> bool:
+        """Block until the component is ready or failed (or the timeout runs out); True if ready."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.components[component].status in (PENDING, LOADING):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(0.05)
+        return self.components[component].status == READY
+
+    # -------------------------------------------------------
+    # Loading (background thread)
+    # -------------------------------------------------------
+    def _load(self, name: str, fn):
+        """Run one loader and record its status, time and the RSS it added (requests served meanwhile count too)."""
+        component = self.components[name]
+        component.status, component._start = LOADING, time.perf_counter()
+        rss_before = current_rss_mb()
+        try:
+            result = fn()
+        except Exception as e:
+            component.status, component.error = FAILED, f"{type(e).__name__}: {e}"
+            print(f"❌ Loading {name} failed:\n{traceback.format_exc()}")
+            return None
+        finally:
+            component.seconds = time.perf_counter() - component._start
+            rss_after = current_rss_mb()
+            if rss_before is not None and rss_after is not None:
+                component.rss_added_mb = rss_after - rss_before
+        component.status = READY
+        print(f"✅ {name} ready in {component.seconds:.1f}s")
+        return result
+
+    def _load_all(self):
+        from rag import RAGPipeline, load_generation_components, load_retrieval_components
+
+        # 1. Retrieval first: enough to answer with the retrieved context
+        loaded = self._load("retrieval", load_retrieval_components)
+        if loaded is None:
+            self.components["generation"].status = FAILED
+            self.components["generation"].error = "retrieval failed to load"
+            return
+        retriever, answer_cache = loaded
+        self.pipeline = RAGPipeline(retriever, None, answer_cache)
+
+        # 2. Then the LLM; answers switch to generated ones once it is attached
+        if not self.load_generation:
+            self.components["generation"].status = DISABLED
+            return
+        loaded = self._load("generation", lambda: load_generation_components(self.model_name))
+        if loaded is not None:
+            self.pipeline.attach_generation(*loaded)
+
+    # -------------------------------------------------------
+    # Readiness
+    # -------------------------------------------------------
+    @property
+    def retrieval_ready(self) -> bool:
+        return self.pipeline is not None
+
+    @property
+    def generation_ready(self) -> bool:
+        return self.pipeline is not None and self.pipeline.generation_ready
+
+    def readiness(self) -> dict:
+        # ready = everything that will be loaded is loaded; loading = some component may still become ready
+        # (False once the rest failed or is disabled: pollers can stop)
+        done = self.generation_ready or (self.retrieval_ready and not self.load_generation)
+        loading = any(c.status in (PENDING, LOADING) for c in self.components.values())
+        return {
+            "ready": done,
+            "loading": loading and not done,
+            "retrieval_ready": self.retrieval_ready,
+            "generation_ready": self.generation_ready,
+            "uptime_s": round(time.time() - self.started, 1),
+            "rss_mb": round(current_rss_mb() or 0, 1),
+            "components": {name: c.as_dict() for name, c in self.components.items()},
+        }
+
+    # -------------------------------------------------------
+    # RAGPipeline interface
+    # -------------------------------------------------------
+    def _require_pipeline(self):
+        if self.pipeline is None:
+            retrieval = self.components["retrieval"]
+            if retrieval.status == FAILED:
+                raise NotReady(f"retrieval failed to load: {retrieval.error}")
+            raise NotReady("retrieval components are still loading")
+        return self.pipeline
+
+    @property
+    def max_concurrent_generations(self) -> int:
+        from rag import generation_max_batch
+        return max(1, generation_max_batch())
+
+    def pack_context(self, *args, **kwargs):
+        return self._require_pipeline().pack_context(*args, **kwargs)
+
+    def retrieve_context(self, *args, **kwargs):
+        return self._require_pipeline().retrieve_context(*args, **kwargs)
+
+    def stream_answer(self, *args, **kwargs):
+        return self._require_pipeline().stream_answer(*args, **kwargs)
+
+    def answer(self, *args, **kwargs) -> dict:
+        return self._require_pipeline().answer(*args, **kwargs)
+
+    def reload_index(self) -> dict:
+        return self._require_pipeline().reload_index()
+
+    def stats(self) -> dict:
+        out = {"readiness": self.readiness()}
+        if self.pipeline is not None:
+            out.update(self.pipeline.stats())
+        return out